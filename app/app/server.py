@@ -0,0 +1,171 @@
+"""
+Preforking production server support, used by gunicorn.conf.py.
+
+The master process imports Django, the apps, the URLconf and the views
+before forking (preload), so workers start with everything loaded and
+share those pages with the master copy-on-write. Following the gc module
+documentation, automatic garbage collection is disabled in the master
+while it loads, objects are frozen right before each fork so collections
+in the workers never write to the shared pages, and collection is enabled
+again in the workers.
+
+Before forking several workers, check_shared_state() makes sure they share
+the cache and the recipe events.
+
+Startup is timed: the master logs how long the preload took and each
+worker how long it took from fork to ready.
+
+Each worker keeps its own core.metrics, so with API_METRICS_DIR set,
+workers write them there every API_METRICS_EXPORT_INTERVAL seconds for
+core.views.MetricsView to export, and the master removes the file of a
+worker that exited.
+"""
+import gc
+import os
+import threading
+import time
+
+from core import metrics
+
+_loaded_at = time.perf_counter()
+_forked_at = None
+
+
+def disable_gc():
+    """Disable automatic garbage collection while the master loads."""
+    gc.disable()
+
+
+def preload():
+    """Import what requests would otherwise import lazily in each worker."""
+    from django.conf import settings
+    from django.db import connections
+    from django.urls import get_resolver
+    from django.utils import translation
+
+    from rest_framework.settings import api_settings
+
+    get_resolver().url_patterns
+    for name in (
+        'DEFAULT_RENDERER_CLASSES',
+        'DEFAULT_PARSER_CLASSES',
+        'DEFAULT_AUTHENTICATION_CLASSES',
+        'DEFAULT_PERMISSION_CLASSES',
+        'DEFAULT_THROTTLE_CLASSES',
+        'DEFAULT_CONTENT_NEGOTIATION_CLASS',
+        'EXCEPTION_HANDLER',
+    ):
+        getattr(api_settings, name)
+    translation.activate(settings.LANGUAGE_CODE)
+    translation.deactivate()
+    # Sockets must not be shared with the workers.
+    connections.close_all()
+    return (time.perf_counter() - _loaded_at) * 1000
+
+
+# Settings naming state kept in each process, with their defaults.
+_PROCESS_LOCAL = (
+    ('API_THROTTLE_STORE', 'core.throttling.LocalBucketStore'),
+    ('RECIPE_EVENTS_TRANSPORT', 'recipe.events.LocalTransport'),
+)
+# Cache backends not shared by processes or whose incr() is a read and a
+# write, so concurrent increments by several workers get the same value.
+_UNSHARED_CACHES = (
+    'django.core.cache.backends.db.DatabaseCache',
+    'django.core.cache.backends.dummy.DummyCache',
+    'django.core.cache.backends.filebased.FileBasedCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+def check_shared_state(workers):
+    """
+    Check several workers share the cache and the events, and create the
+    cache table of a single one caching in the database.
+
+    The per-user data versions, idempotent responses and throttling
+    buckets are in the default cache and recipe events go through the
+    events transport, so with state kept in each process, workers would
+    serve stale data, replay and throttle per worker and miss events.
+    Data versions are also bumped with incr(), which must be atomic for
+    each write to get a version of its own.
+    """
+    from django.conf import settings
+    from django.core.exceptions import ImproperlyConfigured
+    from django.core.management import call_command
+
+    if workers > 1:
+        local = [
+            name for name, default in _PROCESS_LOCAL
+            if getattr(settings, name, default) == default
+        ]
+        if settings.CACHES['default']['BACKEND'] in _UNSHARED_CACHES:
+            local.append('CACHES')
+        if local:
+            raise ImproperlyConfigured(
+                f'{workers} workers would not share {", ".join(local)}, '
+                f'configure shared ones (a cache with atomic increments, such as '
+                f'memcached) or run a single worker.'
+            )
+    call_command('createcachetable')
+
+
+def before_fork():
+    """Freeze the objects of the master so workers leave their pages shared."""
+    global _forked_at
+    gc.freeze()
+    _forked_at = time.perf_counter()
+
+
+def after_fork():
+    """Enable garbage collection in a worker and start exporting its metrics."""
+    from django.conf import settings
+
+    gc.enable()
+    directory = getattr(settings, 'API_METRICS_DIR', None)
+    if directory:
+        interval = getattr(settings, 'API_METRICS_EXPORT_INTERVAL', 5)
+        threading.Thread(
+            target=_export_metrics,
+            args=(_metrics_path(directory, os.getpid()), interval),
+            name='metrics-export',
+            daemon=True,
+        ).start()
+
+
+def _metrics_path(directory, pid):
+    return os.path.join(directory, f'{pid}.json')
+
+
+def _export_metrics(path, interval):
+    while True:
+        metrics.export(path)
+        time.sleep(interval)
+
+
+def clear_metrics():
+    """Remove the metrics left in API_METRICS_DIR by earlier workers."""
+    from django.conf import settings
+
+    directory = getattr(settings, 'API_METRICS_DIR', None)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+
+
+def worker_exited(pid):
+    """Remove the metrics of a worker that exited."""
+    from django.conf import settings
+
+    directory = getattr(settings, 'API_METRICS_DIR', None)
+    if directory:
+        try:
+            os.remove(_metrics_path(directory, pid))
+        except FileNotFoundError:
+            pass
+
+
+def spawn_time():
+    """Return the milliseconds since the worker was forked."""
+    return (time.perf_counter() - _forked_at) * 1000
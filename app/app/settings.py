@@ -46,16 +46,64 @@ INSTALLED_APPS = [
     'recipe',
 ]
 
+# Workers serving only the API (API_ONLY=1, see gunicorn.conf.py) leave
+# out the admin and the schema views, which are then never imported, nor
+# is drf-spectacular, see core.schema.
+API_ONLY = os.environ.get('API_ONLY') == '1'
+if API_ONLY:
+    INSTALLED_APPS.remove('django.contrib.admin')
+    INSTALLED_APPS.remove('drf_spectacular')
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.LoadSheddingMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'core.middleware.SingleFlightMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.IdentityMapMiddleware',
+    'core.middleware.PathMiddlewareDispatcher',
+]
+
+# Middleware run after MIDDLEWARE by path prefix, see
+# core.middleware.PathMiddlewareDispatcher. The API authenticates with
+# tokens, so sessions, CSRF protection and messages are only kept for the
+# admin.
+MIDDLEWARE_BY_PATH = [
+    ('/admin/', [
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+        'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    ]),
 ]
 
+# Requests a process serves at once: its threads under gunicorn, see
+# gunicorn.conf.py. Load shedding limits are shares of it.
+API_LOAD_SHEDDING_CONCURRENCY = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Directory worker processes export their metrics to, see app.server.
+API_METRICS_DIR = os.environ.get('METRICS_DIR')
+
+# The default cache holds the per-user data versions, idempotent responses
+# and, with CacheBucketStore, the throttling buckets, and the events
+# transport carries recipe events to the event streams. The defaults only
+# reach the current process, which suits a single one; gunicorn.conf.py
+# sends events through the database and refuses to fork several workers
+# without a cache shared by them, such as memcached.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    },
+}
+API_THROTTLE_STORE = os.environ.get('THROTTLE_STORE', 'core.throttling.LocalBucketStore')
+RECIPE_EVENTS_TRANSPORT = os.environ.get('EVENTS_TRANSPORT', 'recipe.events.LocalTransport')
+
+# The admin's middleware is in MIDDLEWARE_BY_PATH, where its checks do not
+# look for it.
+SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410']
+
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
@@ -136,8 +184,37 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'core.User'
 
+# Tests run with the throttling buckets emptied after each one.
+TEST_RUNNER = 'core.tests.runner.TestRunner'
+
 # Set default schema class for OpenAPI documentation in Django REST Framework
-# using 'AutoSchema' from 'drf_spectacular'.
+# using 'AutoSchema' from 'drf_spectacular'. JSON is rendered and parsed with
+# orjson when it is installed, falling back to the stdlib otherwise, and
+# clients can negotiate MessagePack through Accept and Content-Type.
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
-}
\ No newline at end of file
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'core.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.FastJSONParser',
+        'core.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.TokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'list': '1200/min',
+        'write': '300/min',
+        'login': '20/min',
+    },
+}
+
+if API_ONLY:
+    # Without schema views, DRF's default schema class saves importing
+    # drf-spectacular's, which DRF resolves when its token view is loaded.
+    REST_FRAMEWORK['DEFAULT_SCHEMA_CLASS'] = 'rest_framework.schemas.openapi.AutoSchema'
@@ -14,23 +14,34 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView,
-)
-
-
-from django.contrib import admin
+from django.conf import settings
 from django.urls import path, include
 
+from core.views import (
+    BatchView,
+    MetricsView,
+)
+
 urlpatterns = [
-    path('admin/', admin.site.urls),
-    path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'),
-    path(
-        'api/docs/',
-        SpectacularSwaggerView.as_view(url_name='api-schema'),
-        name='api-docs',
-    ),
+    path('api/batch/', BatchView.as_view(), name='api-batch'),
+    path('api/metrics/', MetricsView.as_view(), name='api-metrics'),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
 ]
+
+if not settings.API_ONLY:
+    from django.contrib import admin
+    from drf_spectacular.views import (
+        SpectacularAPIView,
+        SpectacularSwaggerView,
+    )
+
+    urlpatterns = [
+        path('admin/', admin.site.urls),
+        path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'),
+        path(
+            'api/docs/',
+            SpectacularSwaggerView.as_view(url_name='api-schema'),
+            name='api-docs',
+        ),
+    ] + urlpatterns
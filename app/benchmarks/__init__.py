@@ -0,0 +1,24 @@
+"""
+Performance benchmarks, run with `python manage.py benchmark [name ...]`.
+
+Each module listed in BENCHMARKS exposes run(stdout), which writes one
+result per line.
+"""
+import time
+
+BENCHMARKS = [
+    'similarity',
+    'serialization',
+    'wire_formats',
+    'throttling',
+    'middleware',
+    'startup',
+]
+
+
+def measure(func, repeat=1000):
+    """Return the mean duration of func() in microseconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
@@ -0,0 +1,94 @@
+"""
+Accuracy and latency of MinHash/LSH recipe similarity against brute force.
+"""
+import random
+from collections import defaultdict
+
+from benchmarks import measure
+from recipe import similarity
+
+RECIPES = 5000
+VOCABULARY = 400
+QUERIES = 50
+TOP_K = 10
+
+
+def _synthetic_recipes(rng):
+    """Return feature sets built from a few overlapping cuisines."""
+    cuisines = [
+        rng.sample(range(VOCABULARY), 40)
+        for _ in range(VOCABULARY // 20)
+    ]
+    recipes = []
+    for _ in range(RECIPES):
+        cuisine = rng.choice(cuisines)
+        size = rng.randint(5, 15)
+        chosen = set(rng.sample(cuisine, size - 2))
+        chosen.update(rng.sample(range(VOCABULARY), 2))
+        recipes.append(chosen)
+    return recipes
+
+
+def run(stdout):
+    """Run the benchmark."""
+    rng = random.Random(42)
+    recipes = _synthetic_recipes(rng)
+    signatures = [similarity.signature(recipe) for recipe in recipes]
+    buckets = defaultdict(set)
+    for index, minhash in enumerate(signatures):
+        for key in similarity.bands(minhash):
+            buckets[key].add(index)
+
+    pairs = [rng.sample(range(RECIPES), 2) for _ in range(2000)]
+    error = sum(
+        abs(similarity.estimate(signatures[a], signatures[b])
+            - similarity.exact(recipes[a], recipes[b]))
+        for a, b in pairs
+    ) / len(pairs)
+    stdout.write(f'mean absolute Jaccard error: {error:.3f}')
+
+    def brute_force(query):
+        scores = (
+            (similarity.exact(recipes[query], recipe), index)
+            for index, recipe in enumerate(recipes)
+            if index != query
+        )
+        return [index for _, index in sorted(scores, reverse=True)[:TOP_K]]
+
+    def lsh(query):
+        candidates = set()
+        for key in similarity.bands(signatures[query]):
+            candidates |= buckets[key]
+        candidates.discard(query)
+        estimates = (
+            (similarity.estimate(signatures[query], signatures[index]), index)
+            for index in candidates
+        )
+        shortlist = sorted(estimates, reverse=True)[:TOP_K * similarity.RERANK_FACTOR]
+        scores = (
+            (similarity.exact(recipes[query], recipes[index]), index)
+            for _, index in shortlist
+        )
+        return [index for _, index in sorted(scores, reverse=True)[:TOP_K]]
+
+    def recall(query):
+        # Exact scores have many ties, so any result scoring at least the
+        # K-th best exact similarity counts as a hit.
+        threshold = similarity.exact(recipes[query], recipes[brute_force(query)[-1]])
+        found = [
+            index for index in lsh(query)
+            if similarity.exact(recipes[query], recipes[index]) >= threshold
+        ]
+        return len(found) / TOP_K
+
+    queries = rng.sample(range(RECIPES), QUERIES)
+    mean_recall = sum(recall(query) for query in queries) / QUERIES
+    stdout.write(f'recall@{TOP_K} against exact brute force: {mean_recall:.2f}')
+
+    query = queries[0]
+    brute_us = measure(lambda: brute_force(query), repeat=20)
+    lsh_us = measure(lambda: lsh(query), repeat=200)
+    signature_us = measure(lambda: similarity.signature(recipes[query]))
+    stdout.write(f'brute force lookup over {RECIPES} recipes: {brute_us:.0f} us')
+    stdout.write(f'LSH lookup: {lsh_us:.0f} us')
+    stdout.write(f'signature computation: {signature_us:.0f} us')
@@ -0,0 +1,96 @@
+"""
+Startup cost of the production server: import and setup time of a fresh
+process, with all apps and with API_ONLY, and the spawn time and private
+memory of workers forked from a preloaded process, with and without
+gc.freeze() before the fork.
+"""
+import gc
+import json
+import os
+import subprocess
+import sys
+
+from app import server
+
+_SETUP = '''
+import json, sys, time
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from app import server
+server.preload()
+print(json.dumps([(time.perf_counter() - start) * 1000, len(sys.modules)]))
+'''
+
+
+def _cold_start(api_only):
+    env = dict(os.environ, API_ONLY='1' if api_only else '0')
+    output = subprocess.run(
+        [sys.executable, '-c', _SETUP],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def _private_dirty_kb():
+    """Return the private dirty memory of this process, or None if unknown."""
+    try:
+        with open('/proc/self/smaps_rollup') as smaps:
+            for line in smaps:
+                if line.startswith('Private_Dirty:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _fork_worker(freeze):
+    """Fork a worker collecting garbage, returning (spawn ms, private kB)."""
+    read_end, write_end = os.pipe()
+    server.before_fork()
+    if not freeze:
+        gc.unfreeze()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        server.after_fork()
+        spawn = server.spawn_time()
+        gc.collect()
+        os.write(write_end, json.dumps([spawn, _private_dirty_kb()]).encode())
+        os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end) as result:
+        spawn, private = json.loads(result.read())
+    os.waitpid(pid, 0)
+    return spawn, private
+
+
+def run(stdout):
+    """Run the benchmark."""
+    for api_only in (False, True):
+        runs = [_cold_start(api_only) for _ in range(3)]
+        best = min(duration for duration, _ in runs)
+        label = 'API only' if api_only else 'all apps'
+        stdout.write(f'cold start, {label}: {best:.0f} ms, {runs[0][1]} modules')
+
+    if not hasattr(os, 'fork'):
+        return
+    server.preload()
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for freeze in (False, True):
+            spawn, private = _fork_worker(freeze)
+            label = 'frozen' if freeze else 'not frozen'
+            memory = 'unknown' if private is None else f'{private} kB'
+            stdout.write(
+                f'worker spawn, gc {label}: {spawn:.1f} ms, '
+                f'private memory after a collection {memory}'
+            )
+    finally:
+        gc.unfreeze()
+        if enabled:
+            gc.enable()
@@ -0,0 +1,30 @@
+"""
+Cost of the token-bucket throttle check of a request, for each store.
+"""
+import itertools
+from types import SimpleNamespace
+
+from benchmarks import measure
+from core import throttling
+
+USERS = 1000
+
+
+def run(stdout):
+    """Run the benchmark."""
+    view = SimpleNamespace()
+    requests = [
+        SimpleNamespace(
+            method='GET',
+            user=SimpleNamespace(pk=pk, is_authenticated=True),
+            META={},
+        )
+        for pk in range(USERS)
+    ]
+    for store_class in (throttling.LocalBucketStore, throttling.CacheBucketStore):
+        throttling._store = store_class()
+        throttle = throttling.TokenBucketThrottle()
+        cycle = itertools.cycle(requests)
+        us = measure(lambda: throttle.allow_request(next(cycle), view), repeat=20000)
+        stdout.write(f'{store_class.__name__} check over {USERS} users: {us:.1f} us')
+    throttling._store = None
@@ -0,0 +1,66 @@
+"""
+Size, gzipped size and encode/decode time of a recipe list as JSON and
+MessagePack.
+
+Both formats render the same serializer output; MessagePack carries prices
+as Decimal (see MessagePackRenderer.native_decimals), JSON as strings.
+"""
+import gzip
+import io
+from decimal import Decimal
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from benchmarks import measure
+from core import msgpack
+from core.parsers import (
+    FastJSONParser,
+    MessagePackParser,
+)
+from core.renderers import (
+    FastJSONRenderer,
+    MessagePackRenderer,
+)
+
+ROWS = 500
+
+
+def _recipes(price):
+    tags = [{'id': i, 'name': f'Tag {i}'} for i in range(1, 4)]
+    ingredients = [{'id': i, 'name': f'Ingredient {i}'} for i in range(1, 6)]
+    return [
+        {
+            'id': i,
+            'title': f'Recipe {i}',
+            'time_minutes': i % 90,
+            'price': price(Decimal(i % 1000) / 100),
+            'link': 'https://example.com/recipe.pdf',
+            'tags': tags,
+            'ingredients': ingredients,
+        }
+        for i in range(1, ROWS + 1)
+    ]
+
+
+def run(stdout):
+    """Run the benchmark."""
+    as_string = '{:.2f}'.format
+    msgpack_name = 'MessagePack ({})'.format(
+        'in-tree' if msgpack._msgpack is None else 'msgpack package',
+    )
+    formats = [
+        ('JSON (stdlib)', JSONRenderer(), JSONParser(), _recipes(as_string)),
+        ('JSON (fast)', FastJSONRenderer(), FastJSONParser(), _recipes(as_string)),
+        (msgpack_name, MessagePackRenderer(), MessagePackParser(), _recipes(
+            lambda value: value.quantize(Decimal('0.01')),
+        )),
+    ]
+    for name, renderer, parser, data in formats:
+        body = renderer.render(data)
+        encode_us = measure(lambda: renderer.render(data), repeat=20)
+        decode_us = measure(lambda: parser.parse(io.BytesIO(body)), repeat=20)
+        stdout.write(
+            f'{name}: {len(body)} bytes ({len(gzip.compress(body))} gzipped), '
+            f'encode {encode_us / 1000:.2f} ms, decode {decode_us / 1000:.2f} ms',
+        )
@@ -0,0 +1,191 @@
+"""
+Content codings for response compression.
+
+gzip and deflate are always available. br and zstd are offered when the
+brotli and zstandard packages are installed; neither is in the
+requirements.
+"""
+import threading
+import zlib
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+# Smallest and largest zlib window sizes (log2 of the window in bytes).
+_MIN_WBITS = 10
+_MAX_WBITS = 15
+
+
+def _window_bits(size, maximum=_MAX_WBITS):
+    """
+    Return the smallest window covering a body of size bytes.
+
+    A window larger than the body compresses no better, and zlib allocates
+    its buffers per window size.
+    """
+    return max(_MIN_WBITS, min(maximum, (size - 1).bit_length()))
+
+
+class ZlibCoding:
+    """
+    gzip or deflate (zlib format, as used by HTTP).
+
+    Each response gets a new compressobj: Python's zlib objects cannot be
+    reset, and copy() of one set up beforehand takes longer than making
+    a new one.
+    """
+
+    def __init__(self, name, header_bits, level=6):
+        self.name = name
+        self.header_bits = header_bits
+        self.level = level
+
+    def compress(self, data):
+        wbits = self.header_bits + _window_bits(len(data))
+        # zlib.compress() only takes wbits from Python 3.11.
+        compressobj = zlib.compressobj(self.level, zlib.DEFLATED, wbits)
+        return compressobj.compress(data) + compressobj.flush()
+
+    def compressor(self):
+        return _ZlibStream(zlib.compressobj(
+            self.level,
+            zlib.DEFLATED,
+            self.header_bits + _MAX_WBITS,
+        ))
+
+
+class _ZlibStream:
+    def __init__(self, compressobj):
+        self._compressobj = compressobj
+
+    def compress(self, chunk):
+        """Return the compressed chunk, flushed so it can be sent right away."""
+        return self._compressobj.compress(chunk) + self._compressobj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressobj.flush()
+
+
+class BrotliCoding:
+    """br, with a quality suited to dynamic responses."""
+    name = 'br'
+
+    def __init__(self, quality=4):
+        self.quality = quality
+
+    def compress(self, data):
+        return brotli.compress(
+            data,
+            quality=self.quality,
+            lgwin=max(_MIN_WBITS, min(24, (len(data) - 1).bit_length())),
+        )
+
+    def compressor(self):
+        return _BrotliStream(brotli.Compressor(quality=self.quality))
+
+
+class _BrotliStream:
+    def __init__(self, compressor):
+        self._compressor = compressor
+
+    def compress(self, chunk):
+        return self._compressor.process(chunk) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdCoding:
+    """
+    zstd. Compression contexts are reusable, so one is kept per thread
+    instead of being allocated for every response.
+    """
+    name = 'zstd'
+
+    def __init__(self, level=3):
+        self.level = level
+        self._local = threading.local()
+
+    def _context(self):
+        context = getattr(self._local, 'context', None)
+        if context is None:
+            context = zstandard.ZstdCompressor(level=self.level)
+            self._local.context = context
+        return context
+
+    def compress(self, data):
+        return self._context().compress(data)
+
+    def compressor(self):
+        return _ZstdStream(self._context().compressobj())
+
+
+class _ZstdStream:
+    def __init__(self, compressobj):
+        self._compressobj = compressobj
+
+    def compress(self, chunk):
+        return self._compressobj.compress(chunk) + self._compressobj.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK,
+        )
+
+    def finish(self):
+        return self._compressobj.flush()
+
+
+def available_codings():
+    """Return the supported codings, most preferred first."""
+    codings = []
+    if zstandard is not None:
+        codings.append(ZstdCoding())
+    if brotli is not None:
+        codings.append(BrotliCoding())
+    codings.append(ZlibCoding('gzip', 16))
+    codings.append(ZlibCoding('deflate', 0))
+    return codings
+
+
+def parse_accept_encoding(header):
+    """Return {coding: quality} for an Accept-Encoding header."""
+    qualities = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    return qualities
+
+
+def negotiate(header, codings):
+    """
+    Return the coding to use for an Accept-Encoding header, or None.
+
+    The client's quality values come first; ties go to the earlier coding.
+    """
+    qualities = parse_accept_encoding(header)
+    default = qualities.get('*', 0.0)
+    best = None
+    best_quality = 0.0
+    for coding in codings:
+        quality = qualities.get(coding.name, default)
+        if coding.name == 'gzip' and 'gzip' not in qualities:
+            quality = qualities.get('x-gzip', quality)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
@@ -0,0 +1,206 @@
+"""
+Idempotency-Key support for create endpoints.
+
+The first response to a request carrying an Idempotency-Key header is
+stored in the cache for API_IDEMPOTENCY_TTL seconds, keyed by the user (or
+the client address of anonymous requests) and the key, together with a
+fingerprint of the request. The fingerprint is an HMAC keyed with
+SECRET_KEY, so the payloads it covers, signup passwords among them, cannot
+be recovered from the cache.
+Retries with the same key are answered from the store without running the
+view again. Reusing a key for a different request is an error.
+
+Concurrent duplicates are coalesced: requests in the same process wait for
+the first one to finish, and a cache lock keeps other processes from
+running it at the same time, which wait for the stored response.
+Server errors are not stored, so the request can be retried.
+"""
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.crypto import salted_hmac
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import status
+from rest_framework.exceptions import (
+    APIException,
+    ValidationError,
+)
+from rest_framework.response import Response
+from rest_framework.throttling import BaseThrottle
+
+from core.schema import (
+    OpenApiParameter,
+    OpenApiTypes,
+)
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+HEADER_PARAMETER = OpenApiParameter(
+    HEADER,
+    OpenApiTypes.STR,
+    location=OpenApiParameter.HEADER,
+    description='Unique key making retries of the request safe',
+)
+
+# Response headers kept with a stored response.
+_STORED_HEADERS = ('Location',)
+
+
+class RequestInProgress(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = _('A request with this idempotency key is in progress.')
+    default_code = 'request_in_progress'
+
+
+class KeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = _('This idempotency key was used for a different request.')
+    default_code = 'idempotency_key_reused'
+
+
+class IdempotencyStore:
+    """Stores first responses and coalesces concurrent duplicate requests."""
+
+    def __init__(self, ttl, lock_timeout, poll_interval=0.05):
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cache_key(scope, key):
+        digest = hashlib.sha256(f'{scope}:{key}'.encode()).hexdigest()
+        return f'idempotency:{digest}'
+
+    def execute(self, scope, key, fingerprint, func):
+        """
+        Return the stored (status, data, headers) for a key, or run func
+        to produce them.
+
+        func returns a DRF Response, of which the status, data and the
+        headers in _STORED_HEADERS are kept.
+        """
+        cache_key = self._cache_key(scope, key)
+        while True:
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return self._check(stored, fingerprint)
+
+            with self._lock:
+                running = self._inflight.get(cache_key)
+                if running is None:
+                    running = self._inflight[cache_key] = threading.Event()
+                    leader = True
+                else:
+                    leader = False
+            if not leader:
+                # Coalesce with the request running in this process, then
+                # read its stored response (or run it again after an error).
+                running.wait(self.lock_timeout)
+                if not running.is_set():
+                    raise RequestInProgress()
+                continue
+
+            try:
+                return self._run(cache_key, fingerprint, func)
+            finally:
+                with self._lock:
+                    self._inflight.pop(cache_key, None)
+                running.set()
+
+    def _run(self, cache_key, fingerprint, func):
+        lock_key = f'{cache_key}:lock'
+        if not cache.add(lock_key, 1, self.lock_timeout):
+            return self._wait(cache_key, lock_key, fingerprint)
+        try:
+            response = func()
+            result = (
+                response.status_code,
+                response.data,
+                {name: response[name] for name in _STORED_HEADERS if response.has_header(name)},
+            )
+            if response.status_code < 500:
+                cache.set(cache_key, (fingerprint, *result), self.ttl)
+            return result
+        finally:
+            cache.delete(lock_key)
+
+    def _wait(self, cache_key, lock_key, fingerprint):
+        """Wait for another process to store the response for a key."""
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return self._check(stored, fingerprint)
+            if cache.get(lock_key) is None:
+                break
+        raise RequestInProgress()
+
+    @staticmethod
+    def _check(stored, fingerprint):
+        stored_fingerprint, *result = stored
+        if stored_fingerprint != fingerprint:
+            raise KeyReused()
+        return tuple(result)
+
+
+store = IdempotencyStore(
+    ttl=getattr(settings, 'API_IDEMPOTENCY_TTL', 24 * 60 * 60),
+    lock_timeout=getattr(settings, 'API_IDEMPOTENCY_LOCK_TIMEOUT', 30),
+)
+
+
+def fingerprint(request):
+    """Return a digest identifying the method, path and payload of a request."""
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    payload = json.dumps(data, sort_keys=True, default=str)
+    return salted_hmac(
+        'core.idempotency.fingerprint',
+        f'{request.method} {request.path}\n{payload}',
+        algorithm='sha256',
+    ).hexdigest()
+
+
+def scope(request):
+    """Return the user id of a request, or the client address if anonymous."""
+    if request.user.is_authenticated:
+        return request.user.id
+    return f'ip:{BaseThrottle().get_ident(request)}'
+
+
+class IdempotentCreateMixin:
+    """
+    View mixin honouring the Idempotency-Key header on create().
+
+    Replayed responses carry an Idempotent-Replayed: true header.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return super().create(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise ValidationError({HEADER: _('Invalid idempotency key.')})
+
+        executed = []
+
+        def run():
+            executed.append(True)
+            return super(IdempotentCreateMixin, self).create(request, *args, **kwargs)
+
+        status_code, data, headers = store.execute(scope(request), key, fingerprint(request), run)
+        response = Response(data, status=status_code, headers=headers)
+        if not executed:
+            response[REPLAYED_HEADER] = 'true'
+        return response
@@ -0,0 +1,167 @@
+"""
+Request-scoped identity map of tags and ingredients.
+
+While IdentityMapMiddleware handles a request, rows loaded through get()
+and get_or_create() are kept in memory by primary key and by the lookup
+made, e.g. (user, name). Its use is the (user, name) lookups of the tags
+and ingredients of recipes written by RecipeSerializer: looking the same
+one up again in the request, mostly as the requests of a batch creating
+recipes with the same tags do, is answered without a query. Outside a
+request, lookups go to the database.
+
+Writes keep the map right: saving or deleting a row evicts it (see
+core.signals), QuerySet.update() on tags and ingredients makes the rows held
+reload the updated fields when next read, and rows created by
+get_or_create() are added to it. Code rolling back a transaction without
+ending the request must call clear(), as rows written in it are gone.
+Hits and misses are counted in core.metrics as `identity_map.hits` and
+`identity_map.misses`.
+"""
+from contextlib import contextmanager
+
+from asgiref.local import Local
+from django.db.models import Model
+
+from core import metrics
+
+_local = Local()
+
+
+class IdentityMap:
+    """Instances of rows by primary key and by the lookups that found them."""
+
+    def __init__(self):
+        self._objects = {}
+        # (model, pk) -> keys of the instance, to evict all of them at once.
+        self._keys = {}
+
+    @staticmethod
+    def key(model, lookup):
+        """Return the key of a lookup of exact field values."""
+        items = []
+        for name, value in lookup.items():
+            if name != 'pk':
+                field = model._meta.get_field(name)
+                if field.primary_key:
+                    name = 'pk'
+                elif field.is_relation:
+                    name = field.attname
+                    if isinstance(value, Model):
+                        value = value.pk
+            items.append((name, value))
+        return model, tuple(sorted(items))
+
+    def find(self, key):
+        """Return the instance held for a key, or None."""
+        instance = self._objects.get(key)
+        if instance is None:
+            return None
+        # The instance may have been changed in memory since it was found.
+        if any(getattr(instance, name) != value for name, value in key[1]):
+            return None
+        return instance
+
+    def add(self, instance, key=None):
+        """Hold an instance, also under key if given."""
+        model = type(instance)
+        keys = self._keys.setdefault((model, instance.pk), set())
+        keys.add(self.key(model, {'pk': instance.pk}))
+        if key is not None:
+            keys.add(key)
+        for each in keys:
+            self._objects[each] = instance
+
+    def evict(self, model, pk):
+        """Drop the instance held for a row."""
+        for key in self._keys.pop((model, pk), ()):
+            self._objects.pop(key, None)
+
+    def forget_fields(self, model, names):
+        """Make the instances held of a model reload fields when next read."""
+        attnames = [model._meta.get_field(name).attname for name in names]
+        for held_model, pk in self._keys:
+            if held_model is model:
+                instance = self._objects[self.key(model, {'pk': pk})]
+                for attname in attnames:
+                    instance.__dict__.pop(attname, None)
+
+    def clear(self):
+        self._objects.clear()
+        self._keys.clear()
+
+
+def current():
+    """Return the identity map of the current request, or None."""
+    return getattr(_local, 'identity_map', None)
+
+
+@contextmanager
+def activate():
+    """Use a new identity map within the block."""
+    previous = current()
+    _local.identity_map = identity_map = IdentityMap()
+    try:
+        yield identity_map
+    finally:
+        _local.identity_map = previous
+
+
+def _found(identity_map, key, instance, lookup):
+    # Related instances looked up with are reused rather than reloaded.
+    for name, value in lookup.items():
+        if isinstance(value, Model) and name != 'pk':
+            setattr(instance, name, value)
+    identity_map.add(instance, key)
+
+
+def get(model, **lookup):
+    """Return the row of model matching lookup, like model.objects.get()."""
+    identity_map = current()
+    if identity_map is None:
+        return model._default_manager.get(**lookup)
+    key = identity_map.key(model, lookup)
+    instance = identity_map.find(key)
+    if instance is not None:
+        metrics.increment('identity_map.hits')
+        return instance
+    metrics.increment('identity_map.misses')
+    instance = model._default_manager.get(**lookup)
+    _found(identity_map, key, instance, lookup)
+    return instance
+
+
+def get_or_create(model, defaults=None, **lookup):
+    """Return (instance, created) like model.objects.get_or_create()."""
+    identity_map = current()
+    if identity_map is None:
+        return model._default_manager.get_or_create(defaults=defaults, **lookup)
+    key = identity_map.key(model, lookup)
+    instance = identity_map.find(key)
+    if instance is not None:
+        metrics.increment('identity_map.hits')
+        return instance, False
+    metrics.increment('identity_map.misses')
+    instance, created = model._default_manager.get_or_create(defaults=defaults, **lookup)
+    _found(identity_map, key, instance, lookup)
+    return instance, created
+
+
+def evict(instance):
+    """Drop the instance held for a row written to."""
+    identity_map = current()
+    if identity_map is not None:
+        identity_map.evict(type(instance), instance.pk)
+
+
+def forget_fields(model, names):
+    """Make the instances held of a model reload fields updated in bulk."""
+    identity_map = current()
+    if identity_map is not None:
+        identity_map.forget_fields(model, names)
+
+
+def clear():
+    """Drop every instance held for the current request."""
+    identity_map = current()
+    if identity_map is not None:
+        identity_map.clear()
@@ -0,0 +1,88 @@
+"""
+Adaptive concurrency limits for load shedding.
+
+Each route class has an AdaptiveLimit on the number of requests it may
+have in flight in a process. The limit follows AIMD: it grows by one
+after a request completing within the latency target of the class while
+at least half the limit was in use, and shrinks by the backoff ratio after
+a request that was slower than the target or failed with a 503/504. Work
+over the limit is rejected at once rather than queueing until it times
+out.
+
+A preforking server queues requests before they reach a worker process,
+where in-flight counts cannot see them. When the proxy in front stamps
+requests with the time it received them, the time spent queueing is
+measured too: a request that queued longer than max_queue seconds is
+rejected, and the limit backs off as after a slow request.
+"""
+import math
+import threading
+
+from core import metrics
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit with in-flight and latency tracking."""
+
+    def __init__(self, name, initial, minimum, maximum, target, max_queue=None,
+                 backoff=0.9, smoothing=0.2):
+        self.name = name
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target = target
+        self.max_queue = max_queue
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.inflight = 0
+        self.latency = 0.0
+        self._lock = threading.Lock()
+        self._publish()
+
+    def acquire(self):
+        """Start a request if the limit allows, returning False if it does not."""
+        with self._lock:
+            if self.inflight >= int(self.limit):
+                metrics.increment(f'load_shedding.{self.name}.rejected')
+                return False
+            self.inflight += 1
+            self._publish()
+            return True
+
+    def admit_queued(self, queued):
+        """
+        Return whether a request that queued for queued seconds before
+        reaching the process may still be served, backing off if not.
+        """
+        metrics.set_gauge(f'load_shedding.{self.name}.queue_ms', round(queued * 1000, 1))
+        if self.max_queue is None or queued <= self.max_queue:
+            return True
+        with self._lock:
+            self.limit = max(self.minimum, self.limit * self.backoff)
+            metrics.increment(f'load_shedding.{self.name}.queue_rejected')
+            self._publish()
+        return False
+
+    def release(self, latency, dropped=False):
+        """Finish a request that took latency seconds and adapt the limit."""
+        with self._lock:
+            self.inflight -= 1
+            if self.latency:
+                self.latency += self.smoothing * (latency - self.latency)
+            else:
+                self.latency = latency
+            if dropped or latency > self.target:
+                self.limit = max(self.minimum, self.limit * self.backoff)
+            elif (self.inflight + 1) * 2 >= self.limit:
+                self.limit = min(self.maximum, self.limit + 1)
+            self._publish()
+
+    def retry_after(self):
+        """Return the seconds after which a rejected client should retry."""
+        return max(1, math.ceil(self.latency))
+
+    def _publish(self):
+        prefix = f'load_shedding.{self.name}'
+        metrics.set_gauge(f'{prefix}.limit', int(self.limit))
+        metrics.set_gauge(f'{prefix}.inflight', self.inflight)
+        metrics.set_gauge(f'{prefix}.latency_ms', round(self.latency * 1000, 1))
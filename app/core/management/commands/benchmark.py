@@ -0,0 +1,31 @@
+"""
+Django command to run the performance benchmarks.
+"""
+import importlib
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    """Django command to run benchmarks from the benchmarks package."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names',
+            nargs='*',
+            help=f'Benchmarks to run (default: all of {", ".join(BENCHMARKS)}).',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        names = options['names'] or BENCHMARKS
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f'Unknown benchmarks: {", ".join(sorted(unknown))}')
+
+        for name in names:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            module = importlib.import_module(f'benchmarks.{name}')
+            module.run(self.stdout)
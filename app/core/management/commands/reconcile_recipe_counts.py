@@ -0,0 +1,43 @@
+"""
+Django command to repair drift in the tag and ingredient recipe counters.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F
+
+from core.models import (
+    Tag,
+    Ingredient,
+)
+
+
+class Command(BaseCommand):
+    """Django command to recompute recipe_count from the through tables."""
+
+    batch_size = 1000
+
+    def reconcile(self, model):
+        """Fix rows whose recipe_count differs and return how many."""
+        rows = model.objects.annotate(
+            total=Count('recipe'),
+        ).exclude(recipe_count=F('total'))
+        updated = []
+        for obj in rows.iterator():
+            obj.recipe_count = obj.total
+            updated.append(obj)
+        model.objects.bulk_update(
+            updated,
+            ['recipe_count'],
+            batch_size=self.batch_size,
+        )
+        return len(updated)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        for model in (Tag, Ingredient):
+            with transaction.atomic():
+                fixed = self.reconcile(model)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {fixed} fixed')
+
+        self.stdout.write(self.style.SUCCESS('Recipe counts reconciled!'))
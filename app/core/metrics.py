@@ -0,0 +1,93 @@
+"""
+In-process metrics.
+
+Counters and gauges are kept per process under dotted names, for example
+`compression.gzip.bytes_in`. snapshot() returns the current values.
+
+Worker processes of a preforking server each keep their own, so workers
+write them to a shared directory with export() (see app.server), and
+core.views.MetricsView gathers them with collect() and renders them with
+render_prometheus(), labelled by worker.
+"""
+import json
+import os
+import re
+import threading
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+
+
+def increment(name, value=1):
+    """Add value to a counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name, value):
+    """Set a gauge to value."""
+    with _lock:
+        _gauges[name] = value
+
+
+def snapshot():
+    """Return {'counters': {...}, 'gauges': {...}} with the current values."""
+    with _lock:
+        return {
+            'counters': dict(_counters),
+            'gauges': dict(_gauges),
+        }
+
+
+def reset():
+    """Clear all metrics."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+
+
+def export(path):
+    """Write the current values to path as JSON, replacing it atomically."""
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as output:
+        json.dump(snapshot(), output)
+    os.replace(temporary, path)
+
+
+def collect(directory):
+    """Return {worker: snapshot} for the files export() wrote in directory."""
+    snapshots = {}
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return snapshots
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as source:
+                snapshots[name[:-len('.json')]] = json.load(source)
+        except (OSError, ValueError):
+            # Removed since listed, as its worker exited.
+            continue
+    return snapshots
+
+
+def _prometheus_name(name):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def render_prometheus(snapshots):
+    """Return {worker: snapshot} in the Prometheus text exposition format."""
+    series = {}
+    for worker, values in sorted(snapshots.items()):
+        for kind, group in (('counter', 'counters'), ('gauge', 'gauges')):
+            for name, value in values[group].items():
+                samples = series.setdefault(_prometheus_name(name), (kind, []))[1]
+                samples.append((worker, value))
+    lines = []
+    for name, (kind, samples) in sorted(series.items()):
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(f'{name}{{worker="{worker}"}} {value}' for worker, value in samples)
+    return ''.join(f'{line}\n' for line in lines)
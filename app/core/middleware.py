@@ -0,0 +1,512 @@
+"""
+Middleware shared by the API apps.
+"""
+import asyncio
+import hashlib
+import math
+import time
+from urllib.parse import (
+    parse_qsl,
+    urlencode,
+)
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import (
+    ImproperlyConfigured,
+    MiddlewareNotUsed,
+)
+from django.core.handlers.exception import convert_exception_to_response
+from django.db import connections
+from django.http import (
+    HttpResponse,
+    JsonResponse,
+)
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.module_loading import import_string
+
+from rest_framework.authtoken.models import Token
+
+from core import (
+    compression,
+    identity,
+    metrics,
+)
+from core.loadshedding import AdaptiveLimit
+from core.singleflight import SingleFlight
+
+_COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/json',
+    'application/msgpack',
+    'application/javascript',
+    'application/xml',
+    'application/vnd.oai.openapi',
+)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress API responses with the best coding the client accepts.
+
+    Applies to paths under API_COMPRESSION_PATHS (default `/api/`). Bodies
+    smaller than API_COMPRESSION_MIN_SIZE bytes are sent as they are, and
+    streaming responses are compressed chunk by chunk, flushing after each
+    chunk. Bytes in and out (their quotient being the compression ratio)
+    and the CPU time spent are counted per coding in core.metrics.
+    """
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.paths = tuple(getattr(settings, 'API_COMPRESSION_PATHS', ('/api/',)))
+        self.min_size = getattr(settings, 'API_COMPRESSION_MIN_SIZE', 512)
+        self.codings = compression.available_codings()
+
+    def process_response(self, request, response):
+        if not request.path.startswith(self.paths):
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '')
+        if not content_type.startswith(_COMPRESSIBLE_TYPES):
+            return response
+        if 'no-transform' in response.get('Cache-Control', ''):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            metrics.increment('compression.skipped')
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = compression.negotiate(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''),
+            self.codings,
+        )
+        if coding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = self._compress_stream(
+                coding,
+                response.streaming_content,
+            )
+            del response['Content-Length']
+        else:
+            content = response.content
+            start = time.thread_time()
+            compressed = coding.compress(content)
+            self._record(coding, len(content), len(compressed), time.thread_time() - start)
+            if len(compressed) >= len(content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # The compressed body differs from the uncompressed one, so a strong
+        # ETag no longer identifies it.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = coding.name
+        return response
+
+    def _compress_stream(self, coding, chunks):
+        compressor = coding.compressor()
+        size_in = size_out = 0
+        cpu = 0.0
+        for chunk in chunks:
+            start = time.thread_time()
+            data = compressor.compress(chunk)
+            cpu += time.thread_time() - start
+            size_in += len(chunk)
+            size_out += len(data)
+            if data:
+                yield data
+        start = time.thread_time()
+        data = compressor.finish()
+        cpu += time.thread_time() - start
+        size_out += len(data)
+        self._record(coding, size_in, size_out, cpu)
+        if data:
+            yield data
+
+    @staticmethod
+    def _record(coding, size_in, size_out, cpu):
+        prefix = f'compression.{coding.name}'
+        metrics.increment(f'{prefix}.responses')
+        metrics.increment(f'{prefix}.bytes_in', size_in)
+        metrics.increment(f'{prefix}.bytes_out', size_out)
+        metrics.increment(f'{prefix}.cpu_seconds', cpu)
+
+
+# Route classes of load shedding: the share of the worker concurrency they
+# may have in flight, their latency target and the longest a request of
+# theirs may have queued before reaching the process, in seconds. Reads may
+# use every thread; auth (password hashing) and writes, which are
+# expensive and can be retried, get a part of them and are shed first.
+LOAD_SHEDDING_CLASSES = {
+    'read': {'share': 1.0, 'target': 0.25, 'max_queue': 1.0},
+    'write': {'share': 0.5, 'target': 0.5, 'max_queue': 2.0},
+    'auth': {'share': 0.25, 'target': 1.0, 'max_queue': 2.0},
+}
+
+
+def _limit_config(config, concurrency):
+    """Return the AdaptiveLimit arguments of a route class."""
+    config = dict(config)
+    maximum = max(1, math.ceil(config.pop('share') * concurrency))
+    return {'initial': maximum, 'minimum': 1, 'maximum': maximum, **config}
+
+
+_SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class LoadSheddingMiddleware(MiddlewareMixin):
+    """
+    Reject API requests over the adaptive concurrency limit of their route.
+
+    API requests are classed as auth (API_LOAD_SHEDDING_AUTH_PATHS, the
+    token and signup endpoints by default), read or write by method, each
+    with an AdaptiveLimit configured by LOAD_SHEDDING_CLASSES, overridable
+    per class with API_LOAD_SHEDDING_CLASSES. Limits are shares of
+    API_LOAD_SHEDDING_CONCURRENCY, the number of requests a process serves
+    at once (its server threads), as a process never has more in flight.
+
+    Requests stamped by the proxy with the time it received them
+    (API_LOAD_SHEDDING_QUEUE_HEADER, `X-Request-Start: t=<epoch>` by
+    default, in seconds, milliseconds or microseconds) are also rejected
+    when they queued longer than the max_queue of their class.
+
+    Rejected requests get a 503 with Retry-After set from the recent
+    latency of the class. Limits, in-flight counts, latencies and queue
+    times are published as core.metrics gauges named
+    `load_shedding.<class>.*`, exported by core.views.MetricsView.
+    """
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.auth_paths = frozenset(getattr(
+            settings,
+            'API_LOAD_SHEDDING_AUTH_PATHS',
+            ('/api/user/token/', '/api/user/create/'),
+        ))
+        self.queue_header = getattr(settings, 'API_LOAD_SHEDDING_QUEUE_HEADER', 'HTTP_X_REQUEST_START')
+        concurrency = getattr(settings, 'API_LOAD_SHEDDING_CONCURRENCY', 4)
+        overrides = getattr(settings, 'API_LOAD_SHEDDING_CLASSES', {})
+        self.limits = {
+            name: AdaptiveLimit(name, **_limit_config({**config, **overrides.get(name, {})}, concurrency))
+            for name, config in LOAD_SHEDDING_CLASSES.items()
+        }
+
+    def route_class(self, request):
+        """Return the route class of a request, or None if it is not limited."""
+        if not request.path.startswith('/api/'):
+            return None
+        if request.path in self.auth_paths:
+            return 'auth'
+        return 'read' if request.method in _SAFE_METHODS else 'write'
+
+    def queue_time(self, request):
+        """Return the seconds a request queued before reaching the process, or None."""
+        value = request.META.get(self.queue_header, '').strip()
+        if value.startswith('t='):
+            value = value[2:]
+        try:
+            received = float(value)
+        except ValueError:
+            return None
+        # Down from milliseconds or microseconds to seconds.
+        while received > 1e11:
+            received /= 1000
+        return max(0.0, time.time() - received)
+
+    def _admit(self, request):
+        """
+        Return (limit, None) for a request admitted under a limit, or
+        (None, response) for a rejected one.
+        """
+        route_class = self.route_class(request)
+        if route_class is None:
+            return None, None
+        limit = self.limits[route_class]
+        queued = self.queue_time(request)
+        if (queued is None or limit.admit_queued(queued)) and limit.acquire():
+            return limit, None
+        response = JsonResponse(
+            {'detail': 'The server is overloaded, try again later.'},
+            status=503,
+        )
+        response['Retry-After'] = str(limit.retry_after())
+        return None, response
+
+    @staticmethod
+    def _finish(limit, start, response):
+        limit.release(
+            time.monotonic() - start,
+            dropped=response is None or response.status_code in (503, 504),
+        )
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        limit, rejected = self._admit(request)
+        if rejected is not None:
+            return rejected
+        if limit is None:
+            return self.get_response(request)
+        start = time.monotonic()
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            self._finish(limit, start, response)
+
+    async def __acall__(self, request):
+        limit, rejected = self._admit(request)
+        if rejected is not None:
+            return rejected
+        if limit is None:
+            return await self.get_response(request)
+        start = time.monotonic()
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            self._finish(limit, start, response)
+
+
+# Request headers that select the content of a response, beyond the path.
+_SINGLE_FLIGHT_HEADERS = (
+    'HTTP_AUTHORIZATION',
+    'HTTP_ACCEPT',
+    'HTTP_ACCEPT_LANGUAGE',
+    'HTTP_HOST',
+)
+
+# Token keys are mapped to user IDs in the cache for this many seconds.
+TOKEN_USER_TIMEOUT = 5 * 60
+
+
+def _token_user_id(key):
+    """Return the ID of the user owning an API token, or None."""
+    cache_key = 'singleflight:token:' + hashlib.sha256(key.encode()).hexdigest()
+    user_id = cache.get(cache_key)
+    if user_id is None:
+        user_id = Token.objects.filter(key=key).values_list('user_id', flat=True).first()
+        if user_id is None:
+            return None
+        cache.set(cache_key, user_id, TOKEN_USER_TIMEOUT)
+    return user_id
+
+
+class SingleFlightMiddleware(MiddlewareMixin):
+    """
+    Coalesce identical concurrent GET requests to the API.
+
+    Requests to paths under API_SINGLE_FLIGHT_PATHS (default
+    `/api/recipe/`) authenticated with a token are keyed by the user, the
+    path with its query parameters sorted, the headers the response depends
+    on and the user's data version (API_SINGLE_FLIGHT_VERSION, the recipe
+    data version by default). While such a request is being answered,
+    identical ones wait for it and get a copy of its rendered response,
+    which is only shared if it is a 200 without cookies. A write bumps the
+    data version, so requests made after it never join an older flight.
+
+    Under WSGI, waiting requests block their thread; under ASGI, they wait
+    on the event loop without holding a thread.
+    """
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.paths = tuple(getattr(settings, 'API_SINGLE_FLIGHT_PATHS', ('/api/recipe/',)))
+        self.get_version = import_string(getattr(
+            settings,
+            'API_SINGLE_FLIGHT_VERSION',
+            'recipe.cache.get_data_version',
+        ))
+        self.flights = SingleFlight(
+            'singleflight',
+            timeout=getattr(settings, 'API_SINGLE_FLIGHT_TIMEOUT', 10),
+        )
+
+    def _key(self, request):
+        """Return the flight key of a request, or None if it is not coalesced."""
+        if request.method != 'GET' or not request.path.startswith(self.paths):
+            return None
+        keyword, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+        if keyword.lower() != 'token' or not token.strip():
+            return None
+        user_id = _token_user_id(token.strip())
+        if user_id is None:
+            return None
+        query = urlencode(sorted(parse_qsl(request.META.get('QUERY_STRING', ''), keep_blank_values=True)))
+        return (
+            user_id,
+            request.path,
+            query,
+            request.scheme,
+            tuple(request.META.get(name, '') for name in _SINGLE_FLIGHT_HEADERS),
+            self.get_version(user_id),
+        )
+
+    def _key_in_worker(self, request):
+        """Run _key() on a worker thread, closing the connections it opened."""
+        try:
+            return self._key(request)
+        finally:
+            connections.close_all()
+
+    @staticmethod
+    def _snapshot(response):
+        """Return a copy of what is needed to rebuild a response, or None."""
+        if response.status_code != 200 or response.streaming or response.cookies:
+            return None
+        return response.status_code, list(response.items()), response.content
+
+    @staticmethod
+    def _rebuild(snapshot):
+        status, headers, content = snapshot
+        response = HttpResponse(content, status=status)
+        for name, value in headers:
+            response[name] = value
+        return response
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        key = self._key(request)
+        if key is None:
+            return self.get_response(request)
+
+        def respond():
+            response = self.get_response(request)
+            return response, self._snapshot(response)
+
+        (response, snapshot), shared = self.flights.do(key, respond)
+        if not shared:
+            return response
+        if snapshot is None:
+            return self.get_response(request)
+        return self._rebuild(snapshot)
+
+    async def __acall__(self, request):
+        # Worker threads of their own, as the thread running sync views is
+        # busy with the very request the others would wait for.
+        key = await sync_to_async(self._key_in_worker, thread_sensitive=False)(request)
+        if key is None:
+            return await self.get_response(request)
+
+        async def respond():
+            response = await self.get_response(request)
+            return response, self._snapshot(response)
+
+        (response, snapshot), shared = await self.flights.ado(key, respond)
+        if not shared:
+            return response
+        if snapshot is None:
+            return await self.get_response(request)
+        return self._rebuild(snapshot)
+
+
+class IdentityMapMiddleware(MiddlewareMixin):
+    """
+    Give each request an identity map of the rows it looks up.
+
+    See core.identity. Under ASGI, the map is also seen by the sync views,
+    which run on a thread with a copy of the request's context.
+    """
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        with identity.activate():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with identity.activate():
+            return await self.get_response(request)
+
+
+class _MiddlewareChain:
+    """
+    Middleware wrapped around a handler the way Django builds its stack.
+
+    Hooks are kept in the order Django calls them: process_view outermost
+    first, process_template_response and process_exception innermost first.
+    """
+
+    def __init__(self, paths, get_response):
+        is_async = asyncio.iscoroutinefunction(get_response)
+        self.view_hooks = []
+        self.template_response_hooks = []
+        self.exception_hooks = []
+        handler = get_response
+        for path in reversed(paths):
+            middleware = import_string(path)
+            capable = 'async_capable' if is_async else 'sync_capable'
+            if not getattr(middleware, capable, not is_async):
+                raise ImproperlyConfigured(f'Middleware {path} is not {capable}.')
+            try:
+                instance = middleware(handler)
+            except MiddlewareNotUsed:
+                continue
+            if hasattr(instance, 'process_view'):
+                self.view_hooks.insert(0, instance.process_view)
+            if hasattr(instance, 'process_template_response'):
+                self.template_response_hooks.append(instance.process_template_response)
+            if hasattr(instance, 'process_exception'):
+                self.exception_hooks.append(instance.process_exception)
+            handler = convert_exception_to_response(instance)
+        self.handler = handler
+
+
+class PathMiddlewareDispatcher(MiddlewareMixin):
+    """
+    Run further middleware chosen by the path of the request.
+
+    MIDDLEWARE_BY_PATH lists (path prefix, middleware) pairs; a request
+    goes through the middleware of the first prefix it starts with, and
+    straight to the view if none matches. The view, template response and
+    exception hooks of that middleware are called as if it was listed in
+    MIDDLEWARE in place of the dispatcher, so it should come last there.
+    """
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.chains = [
+            (prefix, _MiddlewareChain(paths, get_response))
+            for prefix, paths in getattr(settings, 'MIDDLEWARE_BY_PATH', ())
+        ]
+        self.default = _MiddlewareChain((), get_response)
+
+    def chain(self, request):
+        """Return the middleware chain of a request."""
+        for prefix, chain in self.chains:
+            if request.path.startswith(prefix):
+                return chain
+        return self.default
+
+    def __call__(self, request):
+        # A coroutine when running async, which the caller awaits.
+        return self.chain(request).handler(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        for hook in self.chain(request).view_hooks:
+            response = hook(request, view_func, view_args, view_kwargs)
+            if response:
+                return response
+        return None
+
+    def process_template_response(self, request, response):
+        for hook in self.chain(request).template_response_hooks:
+            response = hook(request, response)
+        return response
+
+    def process_exception(self, request, exception):
+        for hook in self.chain(request).exception_hooks:
+            response = hook(request, exception)
+            if response:
+                return response
+        return None
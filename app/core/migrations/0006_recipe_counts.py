@@ -0,0 +1,50 @@
+# Generated by Django 3.2.25 on 2026-10-19 01:12
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_recipe_counts(apps, schema_editor):
+    """Set recipe_count for existing tags and ingredients."""
+    for model_name in ('Tag', 'Ingredient'):
+        model = apps.get_model('core', model_name)
+        rows = model.objects.annotate(
+            total=Count('recipe'),
+        ).filter(total__gt=0)
+        updated = []
+        for obj in rows.iterator():
+            obj.recipe_count = obj.total
+            updated.append(obj)
+        model.objects.bulk_update(updated, ['recipe_count'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipe_ingredients'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'recipe_count'], name='core_ingr_user_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'recipe_count'], name='core_tag_user_count_idx'),
+        ),
+        migrations.RunPython(
+            populate_recipe_counts,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-19 01:40
+
+from django.db import migrations
+
+PREFIX_INDEXES = (
+    ('core_tag', 'core_tag_user_lower_name_idx'),
+    ('core_ingredient', 'core_ingr_user_lower_name_idx'),
+)
+
+
+def create_prefix_indexes(apps, schema_editor):
+    """Create case-insensitive name prefix indexes on PostgreSQL."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, index in PREFIX_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {index} ON {table} '
+            f'(user_id, lower(name) text_pattern_ops)'
+        )
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    """Drop the name prefix indexes."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for _, index in PREFIX_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recipe_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
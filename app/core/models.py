@@ -2,13 +2,21 @@
 Database models.
 """
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import (
+    connections,
+    models,
+)
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin,
 )
 
+from core import identity
+
 # AbstractBaseUser has the functionality for the authentication
 
 
@@ -61,12 +69,59 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
+    # Weighted title/description document, maintained by a database
+    # trigger on PostgreSQL (see migration 0008) and unused elsewhere.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Last modification, including changes to tags and ingredients, and
+    # the user's SyncCounter value at that time (see core.signals).
+    updated_at = models.DateTimeField(auto_now=True)
+    change_seq = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        # Composite indexes serving the per-user range filters and orderings
+        # of the recipe API, including keyset pagination on (column, id).
+        indexes = [
+            models.Index(
+                fields=['user', 'id'],
+                name='core_recipe_user_id_idx',
+            ),
+            models.Index(
+                fields=['user', 'price', 'id'],
+                name='core_recipe_user_price_idx',
+            ),
+            models.Index(
+                fields=['user', 'time_minutes', 'id'],
+                name='core_recipe_user_time_idx',
+            ),
+            models.Index(
+                fields=['user', 'title', 'id'],
+                name='core_recipe_user_title_idx',
+            ),
+            models.Index(
+                fields=['user', 'change_seq'],
+                name='core_recipe_user_change_idx',
+            ),
+        ]
 
     # This is displayed in Django admin
     def __str__(self):
         return self.title
 
 
+class RecipeAttrQuerySet(models.QuerySet):
+    """QuerySet for tags and ingredients."""
+
+    def update(self, **kwargs):
+        identity.forget_fields(self.model, kwargs)
+        return super().update(**kwargs)
+
+    def adjust_recipe_count(self, delta):
+        """Add delta to the recipe_count of every row, never going below 0."""
+        return self.update(
+            recipe_count=Greatest(F('recipe_count') + delta, Value(0)),
+        )
+
+
 class Tag(models.Model):
     """Tag for filtering recipes."""
     name = models.CharField(max_length=255)
@@ -74,6 +129,25 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    # Number of recipes using the tag, maintained by core.signals.
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    updated_at = models.DateTimeField(auto_now=True)
+    change_seq = models.BigIntegerField(default=0, editable=False)
+
+    objects = RecipeAttrQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'recipe_count'],
+                name='core_tag_user_count_idx',
+            ),
+            models.Index(
+                fields=['user', 'change_seq'],
+                name='core_tag_user_change_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -86,6 +160,127 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    # Number of recipes using the ingredient, maintained by core.signals.
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    updated_at = models.DateTimeField(auto_now=True)
+    change_seq = models.BigIntegerField(default=0, editable=False)
+
+    objects = RecipeAttrQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'recipe_count'],
+                name='core_ingr_user_count_idx',
+            ),
+            models.Index(
+                fields=['user', 'change_seq'],
+                name='core_ingr_user_change_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class RecipeSignature(models.Model):
+    """MinHash signature of the tags and ingredients of a recipe."""
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature',
+    )
+    # Packed array of unsigned 32-bit MinHash values.
+    minhash = models.BinaryField()
+
+
+class RecipeBucket(models.Model):
+    """LSH bucket of a recipe signature band, used to find similar recipes."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='buckets',
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'band', 'bucket'],
+                name='core_bucket_lookup_idx',
+            ),
+        ]
+
+
+class SyncCounterManager(models.Manager):
+    """Manager for sync counters."""
+
+    def next_value(self, user_id):
+        """
+        Increment the counter of a user and return the new value.
+
+        The counter row stays locked until the surrounding transaction ends,
+        so a user's changes commit in counter order.
+        """
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET value = value + 1 WHERE user_id = %s RETURNING value',
+                [user_id],
+            )
+            row = cursor.fetchone()
+        if row is None:
+            # The first change of the user.
+            self.get_or_create(user_id=user_id)
+            return self.next_value(user_id)
+        return row[0]
+
+
+class SyncCounter(models.Model):
+    """Per-user counter ordering changes to recipes, tags and ingredients."""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='sync_counter',
+    )
+    value = models.BigIntegerField(default=0)
+
+    objects = SyncCounterManager()
+
+
+class Tombstone(models.Model):
+    """Record of a deleted recipe, tag or ingredient, for delta sync."""
+    RECIPE = 'recipe'
+    TAG = 'tag'
+    INGREDIENT = 'ingredient'
+    KIND_CHOICES = [
+        (RECIPE, 'Recipe'),
+        (TAG, 'Tag'),
+        (INGREDIENT, 'Ingredient'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    change_seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'change_seq'],
+                name='core_tombstone_user_change_idx',
+            ),
+        ]
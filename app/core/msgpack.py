@@ -0,0 +1,356 @@
+"""
+MessagePack encoding and decoding.
+
+Uses the msgpack package of the requirements, which is several times
+faster, and falls back to a minimal in-tree implementation where it is
+not installed. Both cover the types produced by the API
+serializers: None, booleans, integers up to 64 bits, floats, strings,
+bytes, lists, tuples and dicts. Anything else is passed to a default
+function, which returns a supported value or an ExtType.
+See https://github.com/msgpack/msgpack/blob/master/spec.md.
+"""
+import struct
+from collections import namedtuple
+from decimal import Decimal
+
+try:
+    import msgpack as _msgpack
+except ImportError:  # pragma: no cover - depends on the environment
+    _msgpack = None
+
+ExtType = namedtuple('ExtType', ['code', 'data'])
+
+
+class PackError(TypeError):
+    """Raised for values that cannot be encoded."""
+
+
+class UnpackError(ValueError):
+    """Raised for malformed or truncated input."""
+
+
+_FLOAT = struct.Struct('>Bd')
+_INTS = (
+    (0xcc, struct.Struct('>BB'), 0, 0xFF),
+    (0xcd, struct.Struct('>BH'), 0, 0xFFFF),
+    (0xce, struct.Struct('>BI'), 0, 0xFFFFFFFF),
+    (0xcf, struct.Struct('>BQ'), 0, 0xFFFFFFFFFFFFFFFF),
+    (0xd0, struct.Struct('>Bb'), -0x80, 0x7F),
+    (0xd1, struct.Struct('>Bh'), -0x8000, 0x7FFF),
+    (0xd2, struct.Struct('>Bi'), -0x80000000, 0x7FFFFFFF),
+    (0xd3, struct.Struct('>Bq'), -0x8000000000000000, 0x7FFFFFFFFFFFFFFF),
+)
+_UINT8 = struct.Struct('>BB')
+_UINT16 = struct.Struct('>BH')
+_UINT32 = struct.Struct('>BI')
+_FIXEXT = {1: 0xd4, 2: 0xd5, 4: 0xd6, 8: 0xd7, 16: 0xd8}
+_STR_CODES = (0xd9, 0xda, 0xdb)
+_BIN_CODES = (0xc4, 0xc5, 0xc6)
+_EXT_CODES = (0xc7, 0xc8, 0xc9)
+_ARRAY_CODES = (None, 0xdc, 0xdd)
+_MAP_CODES = (None, 0xde, 0xdf)
+
+# Encoded strings up to this length are reused within one packb() call, as
+# API payloads repeat the same keys and names in every row.
+_CACHED_STR_LENGTH = 64
+
+
+def _header(size, fix_base, fix_max, codes):
+    """Return the header of a string, binary, array or map of given size."""
+    if fix_base is not None and size <= fix_max:
+        return bytes((fix_base | size,))
+    if codes[0] is not None and size <= 0xFF:
+        return _UINT8.pack(codes[0], size)
+    if size <= 0xFFFF:
+        return _UINT16.pack(codes[1], size)
+    if size <= 0xFFFFFFFF:
+        return _UINT32.pack(codes[2], size)
+    raise PackError('Object too large to encode')
+
+
+def _pack_int(value):
+    if 0 <= value <= 0x7F:
+        return bytes((value,))
+    if -32 <= value < 0:
+        return bytes((value & 0xFF,))
+    for code, packer, low, high in _INTS:
+        if low <= value <= high:
+            return packer.pack(code, value)
+    raise PackError('Integer out of range')
+
+
+def _pack_str(value):
+    data = value.encode('utf-8')
+    return _header(len(data), 0xa0, 31, _STR_CODES) + data
+
+
+def packb(obj, default=None, max_depth=512):
+    """
+    Return obj encoded as MessagePack.
+
+    default is called with values of unsupported types and must return a
+    supported value.
+    """
+    if _msgpack is not None:
+        return _library_packb(obj, default)
+
+    buffer = bytearray()
+    strings = {}
+
+    def pack(obj, depth):
+        if depth < 0:
+            raise PackError('Object nested too deeply')
+        # Exact type checks first, as they cover nearly every value.
+        kind = type(obj)
+        if kind is str:
+            data = strings.get(obj)
+            if data is None:
+                data = _pack_str(obj)
+                if len(obj) <= _CACHED_STR_LENGTH:
+                    strings[obj] = data
+            buffer.extend(data)
+        elif kind is int:
+            if 0 <= obj <= 0x7F:
+                buffer.append(obj)
+            else:
+                buffer.extend(_pack_int(obj))
+        elif kind is dict:
+            buffer.extend(_header(len(obj), 0x80, 15, _MAP_CODES))
+            for key, value in obj.items():
+                pack(key, depth - 1)
+                pack(value, depth - 1)
+        elif kind is list:
+            buffer.extend(_header(len(obj), 0x90, 15, _ARRAY_CODES))
+            for value in obj:
+                pack(value, depth - 1)
+        elif obj is None:
+            buffer.append(0xc0)
+        elif obj is True:
+            buffer.append(0xc3)
+        elif obj is False:
+            buffer.append(0xc2)
+        elif kind is float:
+            buffer.extend(_FLOAT.pack(0xcb, obj))
+        elif isinstance(obj, ExtType):
+            code, data = obj
+            if len(data) in _FIXEXT:
+                buffer.append(_FIXEXT[len(data)])
+            else:
+                buffer.extend(_header(len(data), None, None, _EXT_CODES))
+            buffer.extend(struct.pack('>b', code))
+            buffer.extend(data)
+        elif isinstance(obj, dict):
+            pack(dict(obj), depth)
+        elif isinstance(obj, (list, tuple)):
+            pack(list(obj), depth)
+        elif isinstance(obj, str):
+            pack(str(obj), depth)
+        elif isinstance(obj, int):
+            pack(int(obj), depth)
+        elif isinstance(obj, float):
+            pack(float(obj), depth)
+        elif isinstance(obj, (bytes, bytearray, memoryview)):
+            data = bytes(obj)
+            buffer.extend(_header(len(data), None, None, _BIN_CODES))
+            buffer.extend(data)
+        elif default is not None:
+            pack(default(obj), depth - 1)
+        else:
+            raise PackError(f'Cannot encode {kind.__name__} as MessagePack')
+
+    pack(obj, max_depth)
+    return bytes(buffer)
+
+
+_FORMATS = {
+    0xca: struct.Struct('>f'),
+    0xcb: struct.Struct('>d'),
+    0xcc: struct.Struct('>B'),
+    0xcd: struct.Struct('>H'),
+    0xce: struct.Struct('>I'),
+    0xcf: struct.Struct('>Q'),
+    0xd0: struct.Struct('>b'),
+    0xd1: struct.Struct('>h'),
+    0xd2: struct.Struct('>i'),
+    0xd3: struct.Struct('>q'),
+}
+# Type code -> (kind, length format) for values with an explicit length.
+_SIZED = {
+    0xc4: ('bin', struct.Struct('>B')),
+    0xc5: ('bin', struct.Struct('>H')),
+    0xc6: ('bin', struct.Struct('>I')),
+    0xc7: ('ext', struct.Struct('>B')),
+    0xc8: ('ext', struct.Struct('>H')),
+    0xc9: ('ext', struct.Struct('>I')),
+    0xd9: ('str', struct.Struct('>B')),
+    0xda: ('str', struct.Struct('>H')),
+    0xdb: ('str', struct.Struct('>I')),
+    0xdc: ('array', struct.Struct('>H')),
+    0xdd: ('array', struct.Struct('>I')),
+    0xde: ('map', struct.Struct('>H')),
+    0xdf: ('map', struct.Struct('>I')),
+}
+_FIXEXT_SIZES = {code: size for size, code in _FIXEXT.items()}
+_EXT_CODE = struct.Struct('>b')
+
+
+def unpackb(data, ext_hook=None, max_depth=512):
+    """
+    Return the object encoded in data.
+
+    ext_hook is called with the code and payload of extension types;
+    without it they are returned as ExtType.
+    """
+    if _msgpack is not None:
+        return _library_unpackb(data, ext_hook)
+
+    data = bytes(data)
+    end = len(data)
+    pos = 0
+
+    def take(size):
+        nonlocal pos
+        start = pos
+        pos += size
+        if pos > end:
+            raise UnpackError('Unexpected end of data')
+        return start
+
+    def text(size):
+        start = take(size)
+        try:
+            return data[start:pos].decode('utf-8')
+        except UnicodeDecodeError:
+            raise UnpackError('Invalid UTF-8 string')
+
+    def array(size, depth):
+        return [read(depth - 1) for _ in range(size)]
+
+    def mapping(size, depth):
+        result = {}
+        for _ in range(size):
+            key = read(depth - 1)
+            try:
+                result[key] = read(depth - 1)
+            except TypeError:
+                raise UnpackError('Unhashable map key')
+        return result
+
+    def ext(size):
+        code = _EXT_CODE.unpack_from(data, take(1))[0]
+        start = take(size)
+        payload = data[start:pos]
+        if ext_hook is None:
+            return ExtType(code, payload)
+        return ext_hook(code, payload)
+
+    def read(depth):
+        if depth < 0:
+            raise UnpackError('Object nested too deeply')
+        code = data[take(1)]
+        if code <= 0x7f:
+            return code
+        if code >= 0xe0:
+            return code - 0x100
+        if code <= 0x8f:
+            return mapping(code & 0x0f, depth)
+        if code <= 0x9f:
+            return array(code & 0x0f, depth)
+        if code <= 0xbf:
+            return text(code & 0x1f)
+        if code == 0xc0:
+            return None
+        if code == 0xc2:
+            return False
+        if code == 0xc3:
+            return True
+        fmt = _FORMATS.get(code)
+        if fmt is not None:
+            return fmt.unpack_from(data, take(fmt.size))[0]
+        if code in _SIZED:
+            kind, fmt = _SIZED[code]
+            length = fmt.unpack_from(data, take(fmt.size))[0]
+            if kind == 'str':
+                return text(length)
+            if kind == 'array':
+                return array(length, depth)
+            if kind == 'map':
+                return mapping(length, depth)
+            if kind == 'bin':
+                return data[take(length):pos]
+            return ext(length)
+        if code in _FIXEXT_SIZES:
+            return ext(_FIXEXT_SIZES[code])
+        raise UnpackError(f'Invalid type code 0x{code:02x}')
+
+    try:
+        result = read(max_depth)
+    except struct.error:
+        raise UnpackError('Unexpected end of data')
+    if pos != end:
+        raise UnpackError('Extra data after object')
+    return result
+
+
+def _library_packb(obj, default):
+    """Encode with the msgpack package."""
+    def convert(value):
+        if default is None:
+            raise PackError(f'Cannot encode {type(value).__name__} as MessagePack')
+        result = default(value)
+        if isinstance(result, ExtType):
+            return _msgpack.ExtType(*result)
+        return result
+
+    try:
+        return _msgpack.packb(obj, default=convert, use_bin_type=True)
+    except (OverflowError, ValueError) as exc:
+        raise PackError(str(exc))
+
+
+def _library_unpackb(data, ext_hook):
+    """Decode with the msgpack package."""
+    try:
+        return _msgpack.unpackb(
+            data,
+            ext_hook=ext_hook or ExtType,
+            raw=False,
+            strict_map_key=False,
+        )
+    except UnpackError:
+        raise
+    except (ValueError, TypeError) as exc:
+        raise UnpackError(str(exc) or 'Invalid MessagePack data')
+
+
+# Extension type carrying a Decimal as a scale byte (the number of decimal
+# places) followed by the unscaled value as a big-endian signed integer, so
+# Decimal('5.50') travels as scale 2 and 550 integer cents.
+DECIMAL_EXT = 1
+
+
+def pack_decimal(value):
+    """Return a finite Decimal as a DECIMAL_EXT ExtType."""
+    if not value.is_finite():
+        raise PackError('Cannot encode a non-finite Decimal')
+    sign, digits, exponent = value.as_tuple()
+    unscaled = int(''.join(map(str, digits)) or '0')
+    if sign:
+        unscaled = -unscaled
+    scale = -exponent
+    if not -0x80 <= scale <= 0x7F:
+        raise PackError('Decimal exponent out of range')
+    size = unscaled.bit_length() // 8 + 1
+    return ExtType(
+        DECIMAL_EXT,
+        struct.pack('>b', scale) + unscaled.to_bytes(size, 'big', signed=True),
+    )
+
+
+def unpack_decimal(data):
+    """Return the Decimal held in a DECIMAL_EXT payload."""
+    if len(data) < 2:
+        raise UnpackError('Invalid decimal')
+    scale = struct.unpack_from('>b', data)[0]
+    unscaled = int.from_bytes(data[1:], 'big', signed=True)
+    return Decimal(unscaled).scaleb(-scale)
@@ -0,0 +1,61 @@
+"""
+Parsers shared by the API apps.
+"""
+from django.conf import settings
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import (
+    BaseParser,
+    JSONParser,
+)
+
+from core import msgpack
+from core.renderers import (
+    FastJSONRenderer,
+    MessagePackRenderer,
+    orjson,
+)
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSON parser using orjson when it is installed.
+
+    orjson parses the UTF-8 request body directly from bytes and rejects
+    NaN and Infinity like the strict stdlib parser. Bodies in any other
+    encoding and environments without orjson use the stdlib parser.
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class MessagePackParser(BaseParser):
+    """
+    Parser for MessagePack request bodies (Content-Type: application/msgpack).
+
+    msgpack.DECIMAL_EXT extensions are decoded to Decimal.
+    """
+    media_type = 'application/msgpack'
+    renderer_class = MessagePackRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), ext_hook=self._ext_hook)
+        except (msgpack.UnpackError, msgpack.PackError) as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
+
+    @staticmethod
+    def _ext_hook(code, data):
+        if code == msgpack.DECIMAL_EXT:
+            return msgpack.unpack_decimal(data)
+        raise msgpack.UnpackError(f'Unknown extension type {code}')
@@ -0,0 +1,117 @@
+"""
+Renderers shared by the API apps.
+"""
+import json
+from decimal import Decimal
+
+from rest_framework.renderers import (
+    BaseRenderer,
+    JSONRenderer,
+)
+from rest_framework.utils import encoders
+
+from core import msgpack
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+# Line and paragraph separators are valid JSON but not valid JavaScript, so
+# the stdlib renderer escapes them. orjson writes them as UTF-8.
+_LINE_SEPARATOR = '\u2028'.encode()
+_PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+# Converts the types JSON has no native form for, like JSONRenderer does.
+_json_default = encoders.JSONEncoder().default
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON renderer using orjson when it is installed.
+
+    orjson encodes straight to UTF-8 bytes, which become the response body
+    without an intermediate str. Output matches JSONRenderer with the
+    default UNICODE_JSON, COMPACT_JSON and STRICT_JSON settings. Types orjson
+    does not handle natively (Decimal, lazy translation strings, dates and
+    times) are converted by the DRF encoder, so they render the same way.
+    Requests for indented output and environments without orjson use the
+    stdlib renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or not self._is_default_style():
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(
+            data,
+            default=self._default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+        if _LINE_SEPARATOR in ret:
+            ret = ret.replace(_LINE_SEPARATOR, b'\\u2028')
+        if _PARAGRAPH_SEPARATOR in ret:
+            ret = ret.replace(_PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
+
+    def _is_default_style(self):
+        """Return whether the output style is the one orjson produces."""
+        return (
+            not self.ensure_ascii
+            and self.compact
+            and self.strict
+            and self.encoder_class is encoders.JSONEncoder
+        )
+
+    _default = staticmethod(_json_default)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Compact binary renderer, negotiated with Accept: application/msgpack.
+
+    Integers are passed through unchanged. Decimals are encoded losslessly
+    as a msgpack.DECIMAL_EXT extension holding the unscaled integer, and
+    serializers render them as Decimal instead of strings for this format
+    (see native_decimals). Other types are converted like in JSON.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    native_decimals = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=self._default)
+
+    @staticmethod
+    def _default(obj):
+        if isinstance(obj, Decimal):
+            return msgpack.pack_decimal(obj)
+        return _json_default(obj)
+
+
+class PrometheusRenderer(BaseRenderer):
+    """
+    Renderer for metrics in the Prometheus text exposition format.
+
+    Responses should be sent with CONTENT_TYPE, which names the format
+    version; as a media type to negotiate, it would only match clients
+    asking for that very version.
+    """
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, str):
+            # Errors, such as a failed authentication.
+            data = json.dumps(data, default=str)
+        return data.encode(self.charset)
@@ -0,0 +1,54 @@
+"""
+OpenAPI annotations of the API views.
+
+Views are annotated with extend_schema() and the other helpers of
+drf_spectacular.utils imported from here. Applying extend_schema() loads
+the schema class, hence drf-spectacular's schema generation and through
+it the admin, so processes serving only the API (API_ONLY), which have no
+schema views, get stand-ins leaving the views as they are and never
+import drf-spectacular.
+"""
+from django.conf import settings
+
+if not settings.API_ONLY:
+    from drf_spectacular.types import OpenApiTypes
+    from drf_spectacular.utils import (
+        OpenApiParameter,
+        extend_schema,
+        extend_schema_view,
+    )
+else:
+    class _OpenApiTypes:
+        """Names of the OpenAPI types, standing for OpenApiTypes."""
+
+        def __getattr__(self, name):
+            return name
+
+    OpenApiTypes = _OpenApiTypes()
+
+    class OpenApiParameter:
+        """Parameter of an operation, standing for OpenApiParameter."""
+        QUERY = 'query'
+        PATH = 'path'
+        HEADER = 'header'
+        COOKIE = 'cookie'
+
+        def __init__(self, name, type=str, location=QUERY, **kwargs):
+            self.name = name
+            self.type = type
+            self.location = location
+
+    def extend_schema(**kwargs):
+        """Return a decorator leaving the view as it is."""
+        return lambda view: view
+
+    def extend_schema_view(**kwargs):
+        """Return a decorator leaving the view as it is."""
+        return lambda view: view
+
+__all__ = [
+    'OpenApiParameter',
+    'OpenApiTypes',
+    'extend_schema',
+    'extend_schema_view',
+]
@@ -0,0 +1,35 @@
+"""
+Serializers for the shared API views.
+"""
+from django.conf import settings
+
+from rest_framework import serializers
+
+BATCH_METHODS = ['GET', 'POST', 'PUT', 'PATCH', 'DELETE']
+
+
+class SubRequestSerializer(serializers.Serializer):
+    """Serializer for one request of a batch."""
+    method = serializers.ChoiceField(choices=BATCH_METHODS, default='GET')
+    path = serializers.RegexField(r'^/api/', max_length=2048)
+    body = serializers.JSONField(required=False)
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    """Serializer for a batch of requests."""
+    requests = serializers.ListField(
+        child=SubRequestSerializer(),
+        min_length=1,
+        max_length=getattr(settings, 'API_BATCH_MAX_REQUESTS', 20),
+    )
+
+
+class SubResponseSerializer(serializers.Serializer):
+    """Serializer documenting the response to one request of a batch."""
+    status = serializers.IntegerField()
+    body = serializers.JSONField(allow_null=True)
+
+
+class BatchResponseSerializer(serializers.Serializer):
+    """Serializer documenting the batch response."""
+    responses = SubResponseSerializer(many=True)
@@ -0,0 +1,279 @@
+"""
+Signal handlers keeping denormalised recipe counters, the change sequence
+used by delta sync and the request's identity map up to date.
+
+Changes to the tags or ingredients of recipes, including deleting a tag or
+ingredient, are also sent as recipe_attrs_changed with the IDs of the
+recipes affected, found here once for every handler depending on them.
+Within deferred_recipe_attrs_changed(), it is sent once when the block
+ends, for all the changes made within it.
+"""
+import threading
+from contextlib import contextmanager
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import (
+    Signal,
+    receiver,
+)
+from django.utils import timezone
+
+from core import identity
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    SyncCounter,
+    Tombstone,
+)
+
+RECIPE_ATTR_FIELDS = {
+    Recipe.tags.through: 'tags',
+    Recipe.ingredients.through: 'ingredients',
+}
+
+
+def _recipe_side_changed(action, recipe, field, model, pk_set):
+    """Adjust counters for changes made through recipe.tags/ingredients."""
+    related = getattr(recipe, field)
+    if action == 'post_add':
+        model.objects.filter(pk__in=pk_set).adjust_recipe_count(1)
+    elif action == 'pre_remove':
+        related.filter(pk__in=pk_set).adjust_recipe_count(-1)
+    elif action == 'pre_clear':
+        related.all().adjust_recipe_count(-1)
+
+
+def _attr_side_changed(action, attr, pk_set):
+    """Adjust counters for changes made through tag/ingredient.recipe_set."""
+    attrs = type(attr).objects.filter(pk=attr.pk)
+    if action == 'post_add':
+        attrs.adjust_recipe_count(len(pk_set))
+    elif action == 'pre_remove':
+        removed = attr.recipe_set.filter(pk__in=pk_set).count()
+        attrs.adjust_recipe_count(-removed)
+    elif action == 'pre_clear':
+        attrs.update(recipe_count=0)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def count_recipe_attrs_changed(sender, instance, action, reverse, model, pk_set,
+                               **kwargs):
+    """Update recipe_count when recipe tags or ingredients change."""
+    if reverse:
+        _attr_side_changed(action, instance, pk_set)
+    else:
+        field = RECIPE_ATTR_FIELDS[sender]
+        _recipe_side_changed(action, instance, field, model, pk_set)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Release the tags and ingredients of a deleted recipe."""
+    Tag.objects.filter(recipe=instance).adjust_recipe_count(-1)
+    Ingredient.objects.filter(recipe=instance).adjust_recipe_count(-1)
+
+
+# IDs of users being deleted by the current thread. Their data is removed
+# along with them, so no change is recorded for it.
+_deleting = threading.local()
+
+
+def user_deleted(user_id):
+    """Return whether a user is being deleted by the current thread."""
+    return user_id in getattr(_deleting, 'user_ids', ())
+
+
+@receiver(pre_delete, sender=get_user_model())
+def sync_user_deleting(sender, instance, **kwargs):
+    """Stop recording changes for a user being deleted."""
+    if not hasattr(_deleting, 'user_ids'):
+        _deleting.user_ids = set()
+    _deleting.user_ids.add(instance.pk)
+
+
+@receiver(post_delete, sender=get_user_model())
+def sync_user_deleted(sender, instance, **kwargs):
+    """Forget a deleted user."""
+    _deleting.user_ids.discard(instance.pk)
+
+
+# Sent with user_id and recipe_ids when the tags or ingredients of recipes
+# change.
+recipe_attrs_changed = Signal()
+
+# {user ID: recipe IDs} changed within the deferred_recipe_attrs_changed()
+# block of the current thread.
+_deferred = threading.local()
+
+
+@contextmanager
+def deferred_recipe_attrs_changed():
+    """Send recipe_attrs_changed for the changes within the block at its end."""
+    if getattr(_deferred, 'changes', None) is not None:
+        yield
+        return
+    _deferred.changes = {}
+    try:
+        yield
+        changes = _deferred.changes
+    finally:
+        _deferred.changes = None
+    for user_id, recipe_ids in changes.items():
+        recipe_attrs_changed.send(sender=Recipe, user_id=user_id, recipe_ids=recipe_ids)
+
+
+def _attrs_changed(user_id, recipe_ids):
+    """Send recipe_attrs_changed, or defer it to the end of the block."""
+    pending = getattr(_deferred, 'changes', None)
+    if pending is not None:
+        pending.setdefault(user_id, set()).update(recipe_ids)
+    elif recipe_ids:
+        recipe_attrs_changed.send(sender=Recipe, user_id=user_id, recipe_ids=set(recipe_ids))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_memberships_changed(sender, instance, action, reverse, pk_set,
+                               **kwargs):
+    """Find the recipes whose tags or ingredients changed."""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _attrs_changed(instance.user_id, [instance.pk])
+    elif action == 'pre_clear':
+        instance._cleared_recipes = list(instance.recipe_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if action == 'post_clear':
+            pk_set = instance.__dict__.pop('_cleared_recipes', ())
+        _attrs_changed(instance.user_id, pk_set)
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def recipe_attr_deleting(sender, instance, **kwargs):
+    """Remember the recipes losing a tag or ingredient being deleted."""
+    instance._deleted_from_recipes = list(instance.recipe_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def recipe_attr_deleted(sender, instance, **kwargs):
+    """Find the recipes that lost a deleted tag or ingredient."""
+    recipe_ids = instance.__dict__.pop('_deleted_from_recipes', ())
+    # The recipes of a user being deleted go along with the user.
+    if not user_deleted(instance.user_id):
+        _attrs_changed(instance.user_id, recipe_ids)
+
+
+TOMBSTONE_KINDS = {
+    Recipe: Tombstone.RECIPE,
+    Tag: Tombstone.TAG,
+    Ingredient: Tombstone.INGREDIENT,
+}
+
+
+class _Changes:
+    """Change sequence of a user in a transaction, and the recipes stamped."""
+
+    def __init__(self, value):
+        self.value = value
+        self.recipe_ids = set()
+
+
+def _pending(connection, callback):
+    # Django drops the commit callbacks of transactions and savepoints
+    # rolled back, and runs them on commit.
+    return any(entry[1] is callback for entry in connection.run_on_commit)
+
+
+def _changes(user_id):
+    """
+    Return the changes of a user in the current transaction.
+
+    All changes of a transaction share the change sequence taken by the
+    first one, with the counter row locked until the transaction ends, so
+    they are synced together. It is held on the connection until the
+    transaction commits or rolls back, including the rollback of the
+    savepoint it was taken in. In autocommit mode, each change takes one.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        return _Changes(SyncCounter.objects.next_value(user_id))
+    if not hasattr(connection, 'sync_changes') or not connection.run_on_commit:
+        connection.sync_changes = {}
+    changes = connection.sync_changes.get(user_id)
+    if changes is None or not _pending(connection, changes.forget):
+        changes = _Changes(SyncCounter.objects.next_value(user_id))
+        changes.forget = partial(connection.sync_changes.pop, user_id, None)
+        transaction.on_commit(changes.forget)
+        connection.sync_changes[user_id] = changes
+    return changes
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=Tag)
+@receiver(pre_save, sender=Ingredient)
+def sync_object_saved(sender, instance, raw=False, **kwargs):
+    """Stamp a saved recipe, tag or ingredient with the change sequence."""
+    if not raw:
+        changes = _changes(instance.user_id)
+        instance.change_seq = changes.value
+        if sender is Recipe:
+            instance._sync_changes = changes
+
+
+@receiver(post_save, sender=Recipe)
+def sync_recipe_saved(sender, instance, **kwargs):
+    """Remember a recipe was stamped in the transaction."""
+    changes = instance.__dict__.pop('_sync_changes', None)
+    if changes is not None:
+        changes.recipe_ids.add(instance.pk)
+
+
+@receiver(recipe_attrs_changed)
+def sync_recipe_attrs_changed(sender, user_id, recipe_ids, **kwargs):
+    """Mark recipes whose tags or ingredients changed."""
+    changes = _changes(user_id)
+    recipe_ids = set(recipe_ids) - changes.recipe_ids
+    if recipe_ids:
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            change_seq=changes.value,
+            updated_at=timezone.now(),
+        )
+        changes.recipe_ids.update(recipe_ids)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def sync_object_deleted(sender, instance, **kwargs):
+    """Record a tombstone for a deleted recipe, tag or ingredient."""
+    # Changes are recorded after the delete, when the signals of a user
+    # deleted along with the object have been sent.
+    if user_deleted(instance.user_id):
+        return
+    Tombstone.objects.create(
+        user_id=instance.user_id,
+        kind=TOMBSTONE_KINDS[sender],
+        object_id=instance.pk,
+        change_seq=_changes(instance.user_id).value,
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def identity_object_written(sender, instance, **kwargs):
+    """Evict a saved or deleted row from the request's identity map."""
+    identity.evict(instance)
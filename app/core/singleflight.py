@@ -0,0 +1,140 @@
+"""
+Coalescing of identical concurrent computations within a process.
+
+SingleFlight runs at most one computation per key at a time. Callers
+arriving while it is in flight wait for it and share its result instead of
+running it again. Waiting works from threads (do) and from coroutines on
+an event loop (ado), which do not block the loop while they wait; both
+kinds of callers join the same flights.
+"""
+import asyncio
+import threading
+
+from core import metrics
+
+
+class _Call:
+    """A computation in flight and the callers waiting for it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.ok = False
+        self.result = None
+        self._waiters = []
+        self._lock = threading.Lock()
+
+    def finish(self, ok, result):
+        with self._lock:
+            self.ok = ok
+            self.result = result
+            self.done.set()
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # The loop of the waiter is closed.
+                pass
+
+    def future(self):
+        """Return an asyncio future resolved when the call finishes."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if not self.done.is_set():
+                self._waiters.append((loop, future))
+                return future
+        future.set_result(None)
+        return future
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class SingleFlight:
+    """
+    Run one computation per key at a time, sharing its result.
+
+    do() and ado() return (result, shared): shared is True for callers
+    that got the result of another caller's computation. A caller whose
+    wait times out, or whose leader raised, runs the computation itself.
+    Counts of computations run and shared are kept in core.metrics under
+    the given name.
+    """
+
+    def __init__(self, name='singleflight', timeout=None):
+        self.name = name
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._calls)
+
+    def _join(self, key):
+        """Return the call in flight for a key and whether the caller leads it."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    def _leave(self, key, call, ok, result):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.finish(ok, result)
+
+    def _shared(self, call):
+        if call.ok:
+            metrics.increment(f'{self.name}.shared')
+            return call.result, True
+        return None
+
+    def do(self, key, func):
+        """Return func() or the result of the identical call in flight."""
+        call, leader = self._join(key)
+        if not leader:
+            if call.done.wait(self.timeout):
+                shared = self._shared(call)
+                if shared is not None:
+                    return shared
+            metrics.increment(f'{self.name}.fallback')
+            return func(), False
+
+        ok, result = False, None
+        try:
+            result = func()
+            ok = True
+        finally:
+            metrics.increment(f'{self.name}.leaders')
+            self._leave(key, call, ok, result)
+        return result, False
+
+    async def ado(self, key, func):
+        """Return await func() or the result of the identical call in flight."""
+        call, leader = self._join(key)
+        if not leader:
+            try:
+                await asyncio.wait_for(call.future(), self.timeout)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                shared = self._shared(call)
+                if shared is not None:
+                    return shared
+            metrics.increment(f'{self.name}.fallback')
+            return await func(), False
+
+        ok, result = False, None
+        try:
+            result = await func()
+            ok = True
+        finally:
+            metrics.increment(f'{self.name}.leaders')
+            self._leave(key, call, ok, result)
+        return result, False
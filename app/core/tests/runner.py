@@ -0,0 +1,33 @@
+"""
+Test runner of the project.
+
+Throttling is active in every test with the rates of REST_FRAMEWORK, and
+its buckets live in process memory, so each test starts with empty ones
+rather than those left by earlier tests, possibly of a user with the same
+id.
+"""
+from django.test.runner import DiscoverRunner
+
+from core import throttling
+
+
+def _reset_throttling():
+    throttling.get_store().clear()
+
+
+def _tests(suite):
+    for test in suite:
+        if hasattr(test, '__iter__'):
+            yield from _tests(test)
+        else:
+            yield test
+
+
+class TestRunner(DiscoverRunner):
+    """Run each test with the throttling buckets emptied."""
+
+    def build_suite(self, *args, **kwargs):
+        suite = super().build_suite(*args, **kwargs)
+        for test in _tests(suite):
+            test.addCleanup(_reset_throttling)
+        return suite
@@ -0,0 +1,173 @@
+"""
+Tests for the batch API.
+"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.signals import got_request_exception
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+)
+from core.serializers import BatchRequestSerializer
+
+BATCH_URL = reverse('api-batch')
+
+
+def create_user(email='user@example.com', password='testpass123'):
+    """Create and return a user."""
+    return get_user_model().objects.create_user(email=email, password=password, name='Test')
+
+
+class PublicBatchApiTests(TestCase):
+    """Test unauthenticated API requests."""
+
+    def test_auth_required(self):
+        """Test auth is required for batches."""
+        res = APIClient().post(BATCH_URL, {'requests': []}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateBatchApiTests(TestCase):
+    """Test authenticated API requests."""
+
+    def setUp(self):
+        self.user = create_user()
+        # Errors of requests of a batch are signalled as request errors,
+        # which the test client would raise.
+        self.client = APIClient(raise_request_exception=False)
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def batch(self, *requests):
+        res = self.client.post(BATCH_URL, {'requests': list(requests)}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.json()['responses']
+
+    def test_batch(self):
+        """Test running several reads in one request."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=create_user('other@example.com'), name='Other')
+
+        responses = self.batch(
+            {'path': '/api/recipe/tags/'},
+            {'path': '/api/recipe/recipes/?fields=id'},
+            {'path': '/api/user/me/'},
+        )
+
+        self.assertEqual(responses, [
+            {'status': 200, 'body': [{'id': tag.id, 'name': 'Vegan'}]},
+            {'status': 200, 'body': []},
+            {'status': 200, 'body': {'email': 'user@example.com', 'name': 'Test'}},
+        ])
+
+    def test_authenticates_once(self):
+        """Test the token is checked once for the whole batch."""
+        with patch(
+            'rest_framework.authentication.TokenAuthentication.authenticate_credentials',
+            side_effect=lambda key: (self.user, None),
+        ) as authenticate:
+            self.batch(
+                {'path': '/api/recipe/tags/'},
+                {'path': '/api/recipe/ingredients/'},
+            )
+
+        self.assertEqual(authenticate.call_count, 1)
+
+    def test_writes(self):
+        """Test requests with a method and body."""
+        payload = {'title': 'Curry', 'time_minutes': 30, 'price': '7.50'}
+        responses = self.batch(
+            {'method': 'POST', 'path': '/api/recipe/recipes/', 'body': payload},
+            {'method': 'PATCH', 'path': '/api/user/me/', 'body': {'name': 'New'}},
+        )
+
+        self.assertEqual(responses[0]['status'], status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=responses[0]['body']['id'])
+        self.assertEqual(recipe.price, Decimal('7.50'))
+        self.assertEqual(recipe.user, self.user)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'New')
+
+    def test_error_isolation(self):
+        """Test failing requests do not affect the others."""
+        recipe_path = '/api/recipe/recipes/'
+        with patch('recipe.views.RecipeViewSet.list', side_effect=RuntimeError), \
+                self.assertLogs('django.request', 'ERROR'):
+            responses = self.batch(
+                {'path': '/api/unknown/'},
+                {'method': 'POST', 'path': recipe_path, 'body': {'title': ''}},
+                {'path': recipe_path},
+                {'path': '/api/batch/', 'method': 'POST', 'body': {'requests': []}},
+                {'path': '/api/recipe/tags/'},
+            )
+
+        self.assertEqual(
+            [response['status'] for response in responses],
+            [404, 400, 500, 400, 200],
+        )
+        self.assertIn('title', responses[1]['body'])
+
+    def test_failed_request_rolled_back(self):
+        """Test a server error rolls back the changes of its request."""
+        def fail(serializer):
+            serializer.save(user=self.user)
+            raise RuntimeError
+
+        payload = {'title': 'Curry', 'time_minutes': 30, 'price': '7.50'}
+        with patch('recipe.views.RecipeViewSet.perform_create', side_effect=fail), \
+                self.assertLogs('django.request', 'ERROR'):
+            responses = self.batch(
+                {'method': 'POST', 'path': '/api/recipe/recipes/', 'body': payload},
+            )
+
+        self.assertEqual(responses[0]['status'], 500)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_failed_request_reported(self):
+        """Test a server error is logged and signalled like a request's."""
+        received = []
+
+        def receiver(sender, request, **kwargs):
+            received.append(request.path)
+
+        got_request_exception.connect(receiver)
+        self.addCleanup(got_request_exception.disconnect, receiver)
+        with patch('recipe.views.TagViewSet.list', side_effect=RuntimeError('boom')), \
+                self.assertLogs('django.request', 'ERROR') as logs:
+            responses = self.batch({'path': '/api/recipe/tags/'})
+
+        self.assertEqual(responses[0]['status'], 500)
+        self.assertEqual(received, ['/api/recipe/tags/'])
+        self.assertIn('/api/recipe/tags/', logs.output[0])
+        self.assertIn('RuntimeError: boom', logs.output[0])
+
+    def test_batch_size_limit(self):
+        """Test batches larger than the limit are rejected."""
+        limit = BatchRequestSerializer().fields['requests'].max_length
+        res = self.client.post(
+            BATCH_URL,
+            {'requests': [{'path': '/api/recipe/tags/'}] * (limit + 1)},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_only_api_paths(self):
+        """Test requests outside of the API are rejected."""
+        res = self.client.post(
+            BATCH_URL,
+            {'requests': [{'path': '/admin/'}]},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,13 +1,21 @@
 """
 Test custom Django management commands.
 """
+from decimal import Decimal
+from io import StringIO
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2OpError
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
+
+from core.models import (
+    Recipe,
+    Tag,
+)
 
 
 # Decorator that allows us to patch for all test methods that fall within
@@ -37,3 +45,31 @@ class CommandTests(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 7)
         patched_check.assert_called_with(databases=['default'])
+
+
+class ReconcileRecipeCountsTests(TestCase):
+    """Test the reconcile_recipe_counts command."""
+
+    def test_reconcile_fixes_drift(self):
+        """Test drifted recipe counts are recomputed."""
+        user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        tag = Tag.objects.create(user=user, name='Vegan')
+        unused = Tag.objects.create(user=user, name='Unused')
+        recipe = Recipe.objects.create(
+            user=user,
+            title='Salad',
+            time_minutes=5,
+            price=Decimal('3.00'),
+        )
+        recipe.tags.add(tag)
+        Tag.objects.update(recipe_count=7)
+
+        call_command('reconcile_recipe_counts', stdout=StringIO())
+
+        tag.refresh_from_db()
+        unused.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
+        self.assertEqual(unused.recipe_count, 0)
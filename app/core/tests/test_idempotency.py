@@ -0,0 +1,110 @@
+"""
+Tests for the idempotency store.
+"""
+import threading
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.idempotency import (
+    IdempotencyStore,
+    KeyReused,
+    RequestInProgress,
+)
+
+
+class IdempotencyStoreTests(SimpleTestCase):
+    """Test storing and replaying responses."""
+
+    def setUp(self):
+        cache.clear()
+        self.store = IdempotencyStore(ttl=60, lock_timeout=1, poll_interval=0.01)
+        self.calls = 0
+
+    def create(self, status_code=status.HTTP_201_CREATED):
+        self.calls += 1
+        return Response({'id': self.calls}, status=status_code, headers={'Location': '/1/'})
+
+    def test_replay(self):
+        """Test a stored response is returned without running again."""
+        first = self.store.execute(1, 'key', 'print', self.create)
+        second = self.store.execute(1, 'key', 'print', self.create)
+
+        self.assertEqual(first, (201, {'id': 1}, {'Location': '/1/'}))
+        self.assertEqual(second, first)
+        self.assertEqual(self.calls, 1)
+
+    def test_keys_scoped(self):
+        """Test the same key of different users does not collide."""
+        self.store.execute(1, 'key', 'print', self.create)
+        self.store.execute(2, 'key', 'print', self.create)
+
+        self.assertEqual(self.calls, 2)
+
+    def test_key_reused(self):
+        """Test reusing a key for a different request is rejected."""
+        self.store.execute(1, 'key', 'print', self.create)
+
+        with self.assertRaises(KeyReused):
+            self.store.execute(1, 'key', 'other', self.create)
+
+    def test_server_error_not_stored(self):
+        """Test server errors can be retried."""
+        self.store.execute(1, 'key', 'print', lambda: self.create(500))
+        self.store.execute(1, 'key', 'print', self.create)
+
+        self.assertEqual(self.calls, 2)
+
+    def test_concurrent_coalesced(self):
+        """Test concurrent duplicates in one process run once."""
+        started = threading.Event()
+        release = threading.Event()
+        results = []
+
+        def slow_create():
+            started.set()
+            release.wait(5)
+            return self.create()
+
+        def run():
+            results.append(self.store.execute(1, 'key', 'print', slow_create))
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len(results), 4)
+        self.assertEqual(len(set(map(repr, results))), 1)
+
+    def test_waits_for_other_process(self):
+        """Test a request locked by another process waits for its response."""
+        cache_key = self.store._cache_key(1, 'key')
+        cache.add(f'{cache_key}:lock', 1)
+        timer = threading.Timer(
+            0.05,
+            cache.set,
+            [cache_key, ('print', 201, {'id': 7}, {})],
+        )
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        result = self.store.execute(1, 'key', 'print', self.create)
+
+        self.assertEqual(result, (201, {'id': 7}, {}))
+        self.assertEqual(self.calls, 0)
+
+    def test_other_process_timeout(self):
+        """Test a conflict is raised while another process holds the key."""
+        cache.add(f'{self.store._cache_key(1, "key")}:lock', 1)
+
+        with self.assertRaises(RequestInProgress):
+            self.store.execute(1, 'key', 'print', self.create)
@@ -0,0 +1,185 @@
+"""
+Tests for the request-scoped identity map.
+"""
+import asyncio
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    TestCase,
+)
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import (
+    identity,
+    metrics,
+)
+from core.middleware import IdentityMapMiddleware
+from core.models import (
+    Recipe,
+    Tag,
+)
+
+BATCH_URL = reverse('api-batch')
+RECIPES_PATH = '/api/recipe/recipes/'
+
+
+def create_user(email='user@example.com', password='testpass123'):
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+class IdentityMapTests(TestCase):
+    """Test lookups through the identity map."""
+
+    def setUp(self):
+        metrics.reset()
+        self.user = create_user()
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+
+    def test_lookups_without_map(self):
+        """Test lookups go to the database outside a request."""
+        with self.assertNumQueries(2):
+            identity.get(Tag, pk=self.tag.pk)
+            identity.get(Tag, pk=self.tag.pk)
+
+    def test_repeated_lookups_served_from_memory(self):
+        """Test primary key and (user, name) lookups are made once."""
+        with identity.activate():
+            with self.assertNumQueries(1):
+                tag, created = identity.get_or_create(Tag, user=self.user, name='Vegan')
+                again, _ = identity.get_or_create(Tag, user=self.user, name='Vegan')
+                by_pk = identity.get(Tag, pk=self.tag.pk)
+                tag.user
+
+        self.assertFalse(created)
+        self.assertIs(again, tag)
+        self.assertIs(by_pk, tag)
+        self.assertEqual(metrics.snapshot()['counters']['identity_map.hits'], 2)
+
+    def test_created_rows_held(self):
+        """Test rows created through the map are found again."""
+        with identity.activate():
+            tag, created = identity.get_or_create(Tag, user=self.user, name='Dessert')
+            with self.assertNumQueries(0):
+                again, created_again = identity.get_or_create(Tag, user=self.user, name='Dessert')
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertIs(again, tag)
+
+    def test_saved_and_deleted_rows_evicted(self):
+        """Test saving or deleting a row drops it from the map."""
+        with identity.activate():
+            tag = identity.get(Tag, pk=self.tag.pk)
+            tag.name = 'Vegetarian'
+            tag.save()
+            with self.assertNumQueries(1):
+                reloaded = identity.get(Tag, pk=self.tag.pk)
+            self.assertIsNot(reloaded, tag)
+
+            reloaded.delete()
+            with self.assertRaises(Tag.DoesNotExist):
+                identity.get(Tag, pk=self.tag.pk)
+
+    def test_changed_lookup_fields_not_matched(self):
+        """Test a row renamed in memory no longer matches its old name."""
+        with identity.activate():
+            tag, _ = identity.get_or_create(Tag, user=self.user, name='Vegan')
+            tag.name = 'Vegetarian'
+            other, created = identity.get_or_create(Tag, user=self.user, name='Vegan')
+
+        self.assertIsNot(other, tag)
+        self.assertFalse(created)
+
+    def test_bulk_updates_reloaded(self):
+        """Test fields updated in bulk are reloaded when read."""
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Salad',
+            time_minutes=5,
+            price='2.00',
+        )
+        with identity.activate():
+            tag = identity.get(Tag, pk=self.tag.pk)
+            self.assertEqual(tag.recipe_count, 0)
+            recipe.tags.add(tag)
+
+            self.assertEqual(tag.recipe_count, 1)
+
+
+class IdentityMapMiddlewareTests(TestCase):
+    """Test the identity map is scoped to requests."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_map_per_request(self):
+        """Test each request gets a map of its own."""
+        maps = []
+
+        def view(request):
+            maps.append(identity.current())
+            return HttpResponse()
+
+        middleware = IdentityMapMiddleware(view)
+        middleware(self.factory.get('/'))
+        middleware(self.factory.get('/'))
+
+        self.assertIsNotNone(maps[0])
+        self.assertIsNot(maps[0], maps[1])
+        self.assertIsNone(identity.current())
+
+    def test_async(self):
+        """Test the map is active for async requests."""
+        maps = []
+
+        async def view(request):
+            maps.append(identity.current())
+            return HttpResponse()
+
+        middleware = IdentityMapMiddleware(view)
+        asyncio.run(middleware(self.factory.get('/')))
+
+        self.assertIsNotNone(maps[0])
+        self.assertIsNone(identity.current())
+
+
+class BatchIdentityMapTests(TestCase):
+    """Test requests of a batch share the identity map."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _create(self, title):
+        return {
+            'method': 'POST',
+            'path': RECIPES_PATH,
+            'body': {
+                'title': title,
+                'time_minutes': 5,
+                'price': '2.00',
+                'tags': [{'name': 'Quick'}],
+            },
+        }
+
+    def test_tag_looked_up_once(self):
+        """Test recipes of a batch reuse the tag found by the first one."""
+        metrics.reset()
+        res = self.client.post(
+            BATCH_URL,
+            {'requests': [self._create('Salad'), self._create('Soup')]},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        statuses = [response['status'] for response in res.data['responses']]
+        self.assertEqual(statuses, [status.HTTP_201_CREATED] * 2)
+        tag = Tag.objects.get(user=self.user, name='Quick')
+        self.assertEqual(tag.recipe_count, 2)
+        self.assertEqual(metrics.snapshot()['counters']['identity_map.hits'], 1)
@@ -0,0 +1,72 @@
+"""
+Tests for adaptive concurrency limits.
+"""
+from django.test import SimpleTestCase
+
+from core import metrics
+from core.loadshedding import AdaptiveLimit
+
+
+class AdaptiveLimitTests(SimpleTestCase):
+    """Test the AdaptiveLimit class."""
+
+    def setUp(self):
+        metrics.reset()
+        self.limit = AdaptiveLimit('read', initial=2, minimum=1, maximum=4, target=0.1)
+
+    def test_rejects_over_limit(self):
+        """Test requests over the limit are rejected and counted."""
+        self.assertTrue(self.limit.acquire())
+        self.assertTrue(self.limit.acquire())
+        self.assertFalse(self.limit.acquire())
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['counters']['load_shedding.read.rejected'], 1)
+        self.assertEqual(snapshot['gauges']['load_shedding.read.inflight'], 2)
+        self.assertEqual(snapshot['gauges']['load_shedding.read.limit'], 2)
+
+    def test_grows_when_fast_and_busy(self):
+        """Test the limit grows while busy requests meet the latency target."""
+        for _ in range(5):
+            self.limit.acquire()
+            self.limit.release(0.01)
+        self.assertEqual(self.limit.limit, 3)
+
+        self.limit.acquire()
+        for _ in range(5):
+            self.limit.acquire()
+            self.limit.release(0.01)
+        self.assertEqual(self.limit.limit, 4)
+
+    def test_shrinks_when_slow(self):
+        """Test the limit shrinks after slow or failed requests."""
+        self.limit.acquire()
+        self.limit.release(0.5)
+        self.assertLess(self.limit.limit, 2)
+        self.assertEqual(metrics.snapshot()['gauges']['load_shedding.read.limit'], 1)
+
+        for _ in range(20):
+            self.limit.acquire()
+            self.limit.release(0.01, dropped=True)
+
+        self.assertEqual(self.limit.limit, 1)
+
+    def test_retry_after(self):
+        """Test Retry-After follows the recent latency."""
+        self.assertEqual(self.limit.retry_after(), 1)
+        self.limit.acquire()
+        self.limit.release(2.5)
+
+        self.assertEqual(self.limit.retry_after(), 3)
+
+    def test_queued_too_long(self):
+        """Test requests that queued too long are rejected and back off."""
+        limit = AdaptiveLimit('read', initial=4, minimum=1, maximum=4, target=0.1, max_queue=1.0)
+
+        self.assertTrue(limit.admit_queued(0.5))
+        self.assertFalse(limit.admit_queued(1.5))
+
+        self.assertLess(limit.limit, 4)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['counters']['load_shedding.read.queue_rejected'], 1)
+        self.assertEqual(snapshot['gauges']['load_shedding.read.queue_ms'], 1500)
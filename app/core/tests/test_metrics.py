@@ -0,0 +1,96 @@
+"""
+Tests for exporting metrics.
+"""
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import metrics
+
+METRICS_URL = reverse('api-metrics')
+
+
+class MetricsExportTests(SimpleTestCase):
+    """Test exporting the metrics of several processes."""
+
+    def setUp(self):
+        metrics.reset()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_export_and_collect(self):
+        """Test exported metrics are collected by worker."""
+        metrics.increment('compression.gzip.responses', 2)
+        metrics.export(os.path.join(self.directory, '101.json'))
+        with open(os.path.join(self.directory, '102.json'), 'w') as output:
+            json.dump({'counters': {}, 'gauges': {'load_shedding.read.limit': 4}}, output)
+
+        snapshots = metrics.collect(self.directory)
+
+        self.assertEqual(set(snapshots), {'101', '102'})
+        self.assertEqual(snapshots['101']['counters'], {'compression.gzip.responses': 2})
+        self.assertEqual(metrics.collect(os.path.join(self.directory, 'missing')), {})
+
+    def test_render_prometheus(self):
+        """Test metrics are rendered in the Prometheus text format."""
+        text = metrics.render_prometheus({
+            '101': {'counters': {'compression.gzip.responses': 2}, 'gauges': {}},
+            '102': {'counters': {'compression.gzip.responses': 1}, 'gauges': {'load_shedding.read.limit': 4}},
+        })
+
+        self.assertEqual(text, (
+            '# TYPE compression_gzip_responses counter\n'
+            'compression_gzip_responses{worker="101"} 2\n'
+            'compression_gzip_responses{worker="102"} 1\n'
+            '# TYPE load_shedding_read_limit gauge\n'
+            'load_shedding_read_limit{worker="102"} 4\n'
+        ))
+
+
+class MetricsApiTests(TestCase):
+    """Test the metrics endpoint."""
+
+    def setUp(self):
+        metrics.reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='admin@example.com',
+            password='testpass123',
+        )
+
+    def test_staff_only(self):
+        """Test metrics are not exported to other users."""
+        self.client.force_authenticate(self.user)
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_metrics_of_workers(self):
+        """Test the metrics of every worker are exported."""
+        self.user.is_staff = True
+        self.client.force_authenticate(self.user)
+        metrics.increment('identity_map.hits')
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, '101.json'), 'w') as output:
+                json.dump({'counters': {'identity_map.hits': 5}, 'gauges': {}}, output)
+            with override_settings(API_METRICS_DIR=directory):
+                res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = res.content.decode()
+        self.assertIn('identity_map_hits{worker="101"} 5\n', text)
+        self.assertIn(f'identity_map_hits{{worker="{os.getpid()}"}} 1\n', text)
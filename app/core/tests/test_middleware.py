@@ -0,0 +1,463 @@
+"""
+Tests for middleware.
+"""
+import asyncio
+import gzip
+import threading
+import time
+import zlib
+from unittest import skipIf
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import (
+    HttpResponse,
+    StreamingHttpResponse,
+)
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+
+from rest_framework.authtoken.models import Token
+
+from core import (
+    compression,
+    metrics,
+)
+from core.middleware import (
+    CompressionMiddleware,
+    LoadSheddingMiddleware,
+    PathMiddlewareDispatcher,
+    SingleFlightMiddleware,
+)
+from recipe.cache import bump_data_version
+
+BODY = b'{"id":1,"name":"Tomato"},' * 100
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    """Test the compression middleware."""
+
+    def setUp(self):
+        metrics.reset()
+        self.factory = RequestFactory()
+
+    def respond(self, response, path='/api/recipe/recipes/', encoding='gzip, deflate'):
+        request = self.factory.get(path, HTTP_ACCEPT_ENCODING=encoding)
+        with patch.object(compression, 'brotli', None), \
+                patch.object(compression, 'zstandard', None):
+            middleware = CompressionMiddleware(lambda request: response)
+        return middleware(request)
+
+    def test_gzip(self):
+        """Test large API responses are compressed with gzip."""
+        res = self.respond(HttpResponse(BODY, content_type='application/json'))
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(res['Vary'], 'Accept-Encoding')
+        self.assertEqual(int(res['Content-Length']), len(res.content))
+        self.assertEqual(gzip.decompress(res.content), BODY)
+
+        counters = metrics.snapshot()['counters']
+        self.assertEqual(counters['compression.gzip.responses'], 1)
+        self.assertEqual(counters['compression.gzip.bytes_in'], len(BODY))
+        self.assertEqual(counters['compression.gzip.bytes_out'], len(res.content))
+        self.assertIn('compression.gzip.cpu_seconds', counters)
+
+    def test_zlib_codings(self):
+        """Test gzip and deflate bodies of any size decompress to the original."""
+        for size in (1, 511, 4096, 100000):
+            data = BODY * (size // len(BODY) + 1)
+            data = data[:size]
+            gzipped = compression.ZlibCoding('gzip', 16).compress(data)
+            deflated = compression.ZlibCoding('deflate', 0).compress(data)
+
+            self.assertEqual(gzip.decompress(gzipped), data)
+            self.assertEqual(zlib.decompress(deflated), data)
+
+    def test_deflate(self):
+        """Test deflate is used when preferred by the client."""
+        res = self.respond(
+            HttpResponse(BODY, content_type='application/json'),
+            encoding='gzip;q=0.5, deflate',
+        )
+
+        self.assertEqual(res['Content-Encoding'], 'deflate')
+        self.assertEqual(zlib.decompress(res.content), BODY)
+
+    def test_skipped(self):
+        """Test responses which are left uncompressed."""
+        cases = [
+            ('small body', b'{}', 'application/json', {}),
+            ('not an API path', BODY, 'application/json', {'path': '/admin/'}),
+            ('not accepted', BODY, 'application/json', {'encoding': 'identity, gzip;q=0'}),
+            ('binary content', BODY, 'image/png', {}),
+        ]
+        for name, body, content_type, kwargs in cases:
+            with self.subTest(name):
+                res = self.respond(HttpResponse(body, content_type=content_type), **kwargs)
+                self.assertFalse(res.has_header('Content-Encoding'))
+                self.assertEqual(res.content, body)
+
+    def test_streaming(self):
+        """Test streaming responses are compressed chunk by chunk."""
+        chunks = [BODY] * 5
+        response = StreamingHttpResponse(iter(chunks), content_type='application/json')
+        res = self.respond(response)
+
+        parts = list(res.streaming_content)
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertFalse(res.has_header('Content-Length'))
+        self.assertEqual(len(parts), len(chunks) + 1)
+        decompressor = zlib.decompressobj(31)
+        # Each chunk can be decompressed as soon as it arrives.
+        self.assertEqual(decompressor.decompress(parts[0]), BODY)
+        self.assertEqual(gzip.decompress(b''.join(parts)), BODY * 5)
+
+    @override_settings(API_COMPRESSION_MIN_SIZE=10000)
+    def test_min_size_setting(self):
+        """Test the size threshold is configurable."""
+        res = self.respond(HttpResponse(BODY, content_type='application/json'))
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+
+    def test_schema_endpoint(self):
+        """Test the middleware is installed for API responses."""
+        res = self.client.get('/api/schema/', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertIn(b'openapi', gzip.decompress(res.content))
+
+
+class CodingTests(SimpleTestCase):
+    """Test the optional codings."""
+
+    @skipIf(compression.brotli is None, 'brotli is not installed')
+    def test_brotli(self):
+        """Test br one-shot and streaming compression."""
+        coding = compression.BrotliCoding()
+        stream = coding.compressor()
+        streamed = stream.compress(BODY) + stream.finish()
+
+        self.assertEqual(compression.brotli.decompress(coding.compress(BODY)), BODY)
+        self.assertEqual(compression.brotli.decompress(streamed), BODY)
+
+    @skipIf(compression.zstandard is None, 'zstandard is not installed')
+    def test_zstd(self):
+        """Test zstd one-shot and streaming compression."""
+        coding = compression.ZstdCoding()
+        stream = coding.compressor()
+        streamed = stream.compress(BODY) + stream.finish()
+        decompressor = compression.zstandard.ZstdDecompressor()
+
+        self.assertEqual(decompressor.decompress(coding.compress(BODY)), BODY)
+        self.assertEqual(decompressor.decompressobj().decompress(streamed), BODY)
+
+
+class NegotiateTests(SimpleTestCase):
+    """Test Accept-Encoding negotiation."""
+
+    def negotiate(self, header):
+        coding = compression.negotiate(header, [
+            compression.ZlibCoding('gzip', 16),
+            compression.ZlibCoding('deflate', 0),
+        ])
+        return coding and coding.name
+
+    def test_negotiate(self):
+        """Test the coding picked for Accept-Encoding headers."""
+        cases = {
+            '': None,
+            'gzip': 'gzip',
+            'deflate, gzip': 'gzip',
+            'gzip;q=0.2, deflate;q=0.8': 'deflate',
+            '*': 'gzip',
+            '*;q=0.5, gzip;q=0': 'deflate',
+            'x-gzip': 'gzip',
+            'br': None,
+            'gzip;q=bad': None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(self.negotiate(header), expected)
+
+
+class SingleFlightMiddlewareTests(TestCase):
+    """Test coalescing identical concurrent requests."""
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.factory = RequestFactory()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.calls = 0
+        self.release = threading.Event()
+
+    def get(self, path='/api/recipe/recipes/?tags=1,2&page_size=5', token=None):
+        token = token or self.token.key
+        return self.factory.get(path, HTTP_AUTHORIZATION=f'Token {token}')
+
+    def view(self, request):
+        self.calls += 1
+        self.release.wait(5)
+        response = HttpResponse(f'{{"call":{self.calls}}}', content_type='application/json')
+        response['X-Call'] = str(self.calls)
+        return response
+
+    def run_concurrently(self, middleware, requests):
+        responses = []
+        threads = [
+            threading.Thread(target=lambda request=request: responses.append(middleware(request)))
+            for request in requests
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return responses
+
+    def test_threads_share_response(self):
+        """Test identical concurrent requests run the view once."""
+        middleware = SingleFlightMiddleware(self.view)
+        self.release.set()
+        middleware(self.get())
+        self.release.clear()
+
+        responses = self.run_concurrently(middleware, [
+            self.get(),
+            self.get(),
+            self.get('/api/recipe/recipes/?page_size=5&tags=1,2'),
+        ])
+
+        self.assertEqual(self.calls, 2)
+        self.assertEqual([response.content for response in responses], [b'{"call":2}'] * 3)
+        self.assertEqual({response['X-Call'] for response in responses}, {'2'})
+        self.assertEqual({response['Content-Type'] for response in responses}, {'application/json'})
+        self.assertEqual(len({id(response) for response in responses}), 3)
+
+    def test_different_requests_not_shared(self):
+        """Test requests of other users or for other data are not coalesced."""
+        other = get_user_model().objects.create_user(email='other@example.com', password='testpass123')
+        other_token = Token.objects.create(user=other)
+        middleware = SingleFlightMiddleware(self.view)
+        self.release.set()
+        for token in (self.token.key, other_token.key):
+            middleware(self.get(token=token))
+        self.release.clear()
+
+        self.run_concurrently(middleware, [
+            self.get(),
+            self.get(token=other_token.key),
+            self.get('/api/recipe/recipes/?tags=3'),
+        ])
+
+        self.assertEqual(self.calls, 5)
+
+    def test_new_data_version_not_shared(self):
+        """Test a request made after a write does not join an older flight."""
+        middleware = SingleFlightMiddleware(self.view)
+        self.release.set()
+        middleware(self.get())
+        self.release.clear()
+        started = threading.Event()
+
+        def view(request):
+            started.set()
+            return self.view(request)
+
+        middleware.get_response = view
+        first = threading.Thread(target=middleware, args=[self.get()])
+        first.start()
+        started.wait(5)
+        bump_data_version(self.user.id)
+        responses = self.run_concurrently(middleware, [self.get()])
+        first.join(5)
+
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(responses[0].content, b'{"call":3}')
+
+    def test_not_coalesced(self):
+        """Test writes, anonymous requests and errors are not coalesced."""
+        middleware = SingleFlightMiddleware(self.view)
+        self.release.set()
+        middleware(self.factory.post('/api/recipe/recipes/', HTTP_AUTHORIZATION=f'Token {self.token.key}'))
+        middleware(self.factory.get('/api/recipe/recipes/'))
+        middleware(self.get(token='invalid'))
+
+        self.assertNotIn('singleflight.leaders', metrics.snapshot()['counters'])
+
+        errors = SingleFlightMiddleware(lambda request: HttpResponse(status=500))
+        self.assertIsNone(errors._snapshot(errors.get_response(self.get())))
+
+    def test_coroutines_share_response(self):
+        """Test identical concurrent requests are coalesced on the event loop."""
+        middleware = SingleFlightMiddleware(self.view)
+        self.release.set()
+        middleware(self.get())
+
+        async def view(request):
+            self.calls += 1
+            await asyncio.sleep(0.1)
+            return HttpResponse(f'{{"call":{self.calls}}}', content_type='application/json')
+
+        async def run():
+            middleware = SingleFlightMiddleware(view)
+            return await asyncio.gather(*(middleware(self.get()) for _ in range(3)))
+
+        responses = asyncio.run(run())
+
+        self.assertEqual(self.calls, 2)
+        self.assertEqual([response.content for response in responses], [b'{"call":2}'] * 3)
+
+
+class LoadSheddingMiddlewareTests(SimpleTestCase):
+    """Test rejecting requests over the adaptive limits."""
+
+    def setUp(self):
+        metrics.reset()
+        self.factory = RequestFactory()
+        self.inner = None
+
+    def view(self, request):
+        if self.inner is not None:
+            request, self.inner = self.inner, None
+            return self.middleware(request)
+        return HttpResponse('{}', content_type='application/json')
+
+    @override_settings(API_LOAD_SHEDDING_CLASSES={'auth': {'initial': 1, 'maximum': 1}})
+    def test_rejects_over_limit(self):
+        """Test a request over the limit of its class gets a 503."""
+        self.middleware = LoadSheddingMiddleware(self.view)
+        self.inner = self.factory.post('/api/user/token/')
+
+        res = self.middleware(self.factory.post('/api/user/token/'))
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res['Retry-After'], '1')
+        counters = metrics.snapshot()['counters']
+        self.assertEqual(counters['load_shedding.auth.rejected'], 1)
+
+    @override_settings(API_LOAD_SHEDDING_CLASSES={'write': {'initial': 1, 'maximum': 1}})
+    def test_classes_limited_separately(self):
+        """Test reads are admitted while writes are at their limit."""
+        self.middleware = LoadSheddingMiddleware(self.view)
+        self.inner = self.factory.get('/api/recipe/tags/')
+
+        res = self.middleware(self.factory.post('/api/recipe/recipes/'))
+
+        self.assertEqual(res.status_code, 200)
+        gauges = metrics.snapshot()['gauges']
+        self.assertEqual(gauges['load_shedding.write.inflight'], 0)
+        self.assertEqual(gauges['load_shedding.read.inflight'], 0)
+
+    @override_settings(API_LOAD_SHEDDING_CONCURRENCY=8)
+    def test_limits_shares_of_concurrency(self):
+        """Test class limits are shares of the requests a process serves at once."""
+        middleware = LoadSheddingMiddleware(self.view)
+
+        maximums = {name: limit.maximum for name, limit in middleware.limits.items()}
+
+        self.assertEqual(maximums, {'read': 8, 'write': 4, 'auth': 2})
+        self.assertEqual(middleware.limits['read'].minimum, 1)
+
+    def test_queued_too_long(self):
+        """Test requests stamped by the proxy long ago are rejected."""
+        middleware = LoadSheddingMiddleware(self.view)
+
+        for stamp in (time.time() - 5, (time.time() - 5) * 1000, (time.time() - 5) * 1e6):
+            res = middleware(self.factory.get('/api/recipe/tags/', HTTP_X_REQUEST_START=f't={stamp}'))
+            self.assertEqual(res.status_code, 503)
+
+        res = middleware(self.factory.get('/api/recipe/tags/', HTTP_X_REQUEST_START=f't={time.time()}'))
+        self.assertEqual(res.status_code, 200)
+        counters = metrics.snapshot()['counters']
+        self.assertEqual(counters['load_shedding.read.queue_rejected'], 3)
+
+    def test_route_classes(self):
+        """Test requests are classed by path and method."""
+        middleware = LoadSheddingMiddleware(self.view)
+
+        self.assertEqual(middleware.route_class(self.factory.post('/api/user/create/')), 'auth')
+        self.assertEqual(middleware.route_class(self.factory.get('/api/recipe/tags/')), 'read')
+        self.assertEqual(middleware.route_class(self.factory.post('/api/batch/')), 'write')
+        self.assertIsNone(middleware.route_class(self.factory.get('/admin/')))
+
+    def test_async(self):
+        """Test requests are limited under ASGI."""
+        async def view(request):
+            return HttpResponse(status=504)
+
+        middleware = LoadSheddingMiddleware(view)
+        limit = middleware.limits['read'].limit
+
+        res = asyncio.run(middleware(self.factory.get('/api/recipe/tags/')))
+
+        self.assertEqual(res.status_code, 504)
+        self.assertLess(middleware.limits['read'].limit, limit)
+
+
+@override_settings(MIDDLEWARE_BY_PATH=[
+    ('/admin/', [
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    ]),
+])
+class PathMiddlewareDispatcherTests(SimpleTestCase):
+    """Test running middleware by path."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def view(self, request):
+        return HttpResponse(str(hasattr(request, 'session')))
+
+    def test_api_minimal_chain(self):
+        """Test API requests skip the session middleware."""
+        dispatcher = PathMiddlewareDispatcher(self.view)
+
+        res = dispatcher(self.factory.get('/api/recipe/recipes/'))
+
+        self.assertEqual(res.content, b'False')
+        self.assertFalse(res.has_header('X-Frame-Options'))
+        self.assertIsNone(dispatcher.process_view(self.factory.post('/api/batch/'), self.view, (), {}))
+
+    def test_admin_full_chain(self):
+        """Test admin requests keep the session middleware and its hooks."""
+        dispatcher = PathMiddlewareDispatcher(self.view)
+
+        res = dispatcher(self.factory.get('/admin/'))
+
+        self.assertEqual(res.content, b'True')
+        self.assertEqual(res['X-Frame-Options'], 'DENY')
+        request = self.factory.post('/admin/login/')
+        request._dont_enforce_csrf_checks = False
+        res = dispatcher.process_view(request, self.view, (), {})
+        self.assertEqual(res.status_code, 403)
+
+    def test_async(self):
+        """Test the chains run under ASGI."""
+        async def view(request):
+            return HttpResponse(str(hasattr(request, 'session')))
+
+        dispatcher = PathMiddlewareDispatcher(view)
+
+        async def run():
+            return [
+                await dispatcher(self.factory.get('/admin/')),
+                await dispatcher(self.factory.get('/api/user/me/')),
+            ]
+
+        admin, api = asyncio.run(run())
+
+        self.assertEqual((admin.content, api.content), (b'True', b'False'))
@@ -3,10 +3,17 @@ Tests for models.
 """
 from decimal import Decimal
 
-from django.test import TestCase
+from django.db import transaction
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+)
 from django.contrib.auth import get_user_model
 
-from core import models
+from core import (
+    models,
+    signals,
+)
 
 
 def create_user(email='user@example.com', password='testpass123'):
@@ -87,3 +94,155 @@ class ModelTests(TestCase):
         )
 
         self.assertEqual(str(ingredient), ingredient.name)
+
+    def test_recipe_count_follows_memberships(self):
+        """Test recipe_count tracks tag and ingredient assignments."""
+        user = create_user()
+        tag = models.Tag.objects.create(user=user, name='Tag1')
+        ingredient = models.Ingredient.objects.create(user=user, name='Salt')
+        recipes = [
+            models.Recipe.objects.create(
+                user=user,
+                title=f'Recipe {i}',
+                time_minutes=5,
+                price=Decimal('1.00'),
+            )
+            for i in range(3)
+        ]
+        for recipe in recipes:
+            recipe.tags.add(tag)
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+        recipes[0].tags.remove(tag)
+        recipes[1].ingredients.clear()
+        recipes[2].delete()
+
+        tag.refresh_from_db()
+        ingredient.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
+        self.assertEqual(ingredient.recipe_count, 1)
+
+    def test_recipe_count_reverse_memberships(self):
+        """Test recipe_count tracks assignments made from the tag side."""
+        user = create_user()
+        tag = models.Tag.objects.create(user=user, name='Tag1')
+        recipe = models.Recipe.objects.create(
+            user=user,
+            title='Recipe',
+            time_minutes=5,
+            price=Decimal('1.00'),
+        )
+
+        tag.recipe_set.add(recipe)
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
+
+        tag.recipe_set.clear()
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 0)
+
+    def test_recipe_attrs_changed(self):
+        """Test recipes losing tags are sent once, deferred to the block end."""
+        user = create_user()
+        tag = models.Tag.objects.create(user=user, name='Tag1')
+        recipes = [
+            models.Recipe.objects.create(user=user, title=title, time_minutes=5, price=Decimal('1.00'))
+            for title in ('Soup', 'Salad')
+        ]
+        sent = []
+
+        def handler(sender, user_id, recipe_ids, **kwargs):
+            sent.append((user_id, set(recipe_ids)))
+
+        signals.recipe_attrs_changed.connect(handler)
+        self.addCleanup(signals.recipe_attrs_changed.disconnect, handler)
+        with signals.deferred_recipe_attrs_changed():
+            for recipe in recipes:
+                recipe.tags.add(tag)
+            self.assertEqual(sent, [])
+        tag.delete()
+
+        recipe_ids = {recipe.id for recipe in recipes}
+        self.assertEqual(sent, [(user.id, recipe_ids), (user.id, recipe_ids)])
+
+    def test_delete_user_with_recipes(self):
+        """Test deleting a user removes their data without tombstones."""
+        user = create_user()
+        tag = models.Tag.objects.create(user=user, name='Tag1')
+        recipe = models.Recipe.objects.create(
+            user=user,
+            title='Recipe',
+            time_minutes=5,
+            price=Decimal('1.00'),
+        )
+        recipe.tags.add(tag)
+        models.SyncCounter.objects.all().delete()
+
+        user.delete()
+
+        self.assertFalse(models.Tombstone.objects.exists())
+        self.assertFalse(models.SyncCounter.objects.exists())
+        self.assertFalse(models.Recipe.objects.exists())
+
+
+class ChangeSeqTests(TransactionTestCase):
+    """Test the change sequences stamped for delta sync."""
+
+    def test_change_seq_increases(self):
+        """Test every change committed is stamped with a new change sequence."""
+        user = create_user()
+        tag = models.Tag.objects.create(user=user, name='Tag1')
+        recipe = models.Recipe.objects.create(
+            user=user,
+            title='Recipe',
+            time_minutes=5,
+            price=Decimal('1.00'),
+        )
+        self.assertLess(tag.change_seq, recipe.change_seq)
+
+        recipe.tags.add(tag)
+        recipe_seq = models.Recipe.objects.get(id=recipe.id).change_seq
+        self.assertGreater(recipe_seq, recipe.change_seq)
+
+        tag.delete()
+        tombstone = models.Tombstone.objects.get()
+        self.assertEqual(tombstone.kind, models.Tombstone.TAG)
+        self.assertGreater(
+            models.Recipe.objects.get(id=recipe.id).change_seq,
+            recipe_seq,
+        )
+        self.assertGreater(tombstone.change_seq, recipe_seq)
+
+    def test_transaction_shares_change_seq(self):
+        """Test the changes of a transaction share one change sequence."""
+        user = create_user()
+        with transaction.atomic():
+            tag = models.Tag.objects.create(user=user, name='Tag1')
+            recipe = models.Recipe.objects.create(
+                user=user,
+                title='Recipe',
+                time_minutes=5,
+                price=Decimal('1.00'),
+            )
+            recipe.tags.add(tag)
+        later = models.Tag.objects.create(user=user, name='Tag2')
+
+        self.assertEqual(tag.change_seq, recipe.change_seq)
+        self.assertEqual(models.Recipe.objects.get(id=recipe.id).change_seq, recipe.change_seq)
+        self.assertEqual(models.SyncCounter.objects.get(user=user).value, later.change_seq)
+        self.assertGreater(later.change_seq, recipe.change_seq)
+
+    def test_savepoint_rolled_back(self):
+        """Test a change sequence taken in a savepoint rolled back is not reused."""
+        user = create_user()
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    models.Tag.objects.create(user=user, name='Tag1')
+                    raise ValueError
+            except ValueError:
+                pass
+            tag = models.Tag.objects.create(user=user, name='Tag2')
+
+        self.assertEqual(models.SyncCounter.objects.get(user=user).value, tag.change_seq)
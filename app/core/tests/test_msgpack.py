@@ -0,0 +1,60 @@
+"""
+Tests for the MessagePack encoder and decoder.
+"""
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+
+from core import msgpack
+
+
+class MessagePackTests(SimpleTestCase):
+    """Test MessagePack encoding."""
+
+    def test_round_trip(self):
+        """Test values survive encoding and decoding unchanged."""
+        values = [
+            0, 127, 128, -1, -32, -33, 255, 256, 65536, -129, -32769,
+            2 ** 32, 2 ** 64 - 1, -2 ** 63, 1.5, None, True, False,
+            '', 'x' * 31, 'x' * 32, 'é' * 300, 'y' * 70000,
+            b'', b'\x00' * 300, [], list(range(20)), {}, {'a': {'b': [1]}},
+            {str(i): i for i in range(20)},
+        ]
+        for value in values:
+            with self.subTest(value=repr(value)[:40]):
+                self.assertEqual(msgpack.unpackb(msgpack.packb(value)), value)
+
+    def test_spec_encoding(self):
+        """Test small values use the compact encodings of the spec."""
+        self.assertEqual(msgpack.packb({'id': 1}), b'\x81\xa2id\x01')
+        self.assertEqual(msgpack.packb(-1), b'\xff')
+        self.assertEqual(msgpack.packb(300), b'\xcd\x01\x2c')
+
+    def test_decimal(self):
+        """Test decimals are encoded losslessly as unscaled integers."""
+        for value in ('5.50', '-0.01', '0.00', '1E+2', '99999999999999999999.99'):
+            with self.subTest(value=value):
+                packed = msgpack.packb(
+                    Decimal(value),
+                    default=msgpack.pack_decimal,
+                )
+                res = msgpack.unpackb(
+                    packed,
+                    ext_hook=lambda code, data: msgpack.unpack_decimal(data),
+                )
+                self.assertEqual(str(res), value)
+
+        ext = msgpack.pack_decimal(Decimal('5.50'))
+        self.assertEqual(ext, msgpack.ExtType(msgpack.DECIMAL_EXT, b'\x02\x02\x26'))
+
+    def test_unsupported_type(self):
+        """Test values without an encoding raise an error."""
+        with self.assertRaises(msgpack.PackError):
+            msgpack.packb(object())
+
+    def test_invalid_data(self):
+        """Test malformed input raises an error."""
+        for data in (b'\x92\x01', b'\xc1', b'\x01\x02', b'\xa2\xff\xff'):
+            with self.subTest(data=data):
+                with self.assertRaises(msgpack.UnpackError):
+                    msgpack.unpackb(data)
@@ -0,0 +1,88 @@
+"""
+Tests for the JSON renderer and parser.
+"""
+import io
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from core import parsers, renderers
+
+
+SAMPLE = {
+    'id': 1,
+    'title': 'Crème brûlée\u2028\u2029',
+    'price': Decimal('5.50'),
+    'label': gettext_lazy('Invalid cursor'),
+    'created': datetime(2021, 6, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+    'ratio': 0.1,
+    'tags': [{'id': 2, 'name': 'Dessert'}],
+    3: None,
+}
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    """Test the JSON renderer."""
+
+    def test_matches_stdlib_renderer(self):
+        """Test output is byte-for-byte the same as JSONRenderer."""
+        expected = JSONRenderer().render(SAMPLE)
+        res = renderers.FastJSONRenderer().render(SAMPLE)
+
+        self.assertIsInstance(res, bytes)
+        self.assertEqual(res, expected)
+        self.assertIn(b'\\u2028', res)
+
+    def test_indent_uses_stdlib_renderer(self):
+        """Test indented output is requested through the media type."""
+        media_type = 'application/json; indent=4'
+        expected = JSONRenderer().render(SAMPLE, media_type)
+        res = renderers.FastJSONRenderer().render(SAMPLE, media_type)
+
+        self.assertEqual(res, expected)
+
+    def test_without_orjson(self):
+        """Test the stdlib fallback when orjson is unavailable."""
+        with patch.object(renderers, 'orjson', None):
+            res = renderers.FastJSONRenderer().render(SAMPLE)
+
+        self.assertEqual(res, JSONRenderer().render(SAMPLE))
+
+    def test_none(self):
+        """Test rendering no data returns an empty body."""
+        self.assertEqual(renderers.FastJSONRenderer().render(None), b'')
+
+
+class FastJSONParserTests(SimpleTestCase):
+    """Test the JSON parser."""
+
+    def parse(self, body):
+        return parsers.FastJSONParser().parse(io.BytesIO(body))
+
+    def test_parse(self):
+        """Test parsing a UTF-8 body."""
+        res = self.parse('{"title":"Crème","tags":[1,2]}'.encode())
+
+        self.assertEqual(res, {'title': 'Crème', 'tags': [1, 2]})
+
+    def test_invalid(self):
+        """Test invalid JSON raises a parse error."""
+        for body in (b'{"title":', b'{"price":NaN}'):
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError):
+                    self.parse(body)
+
+    def test_without_orjson(self):
+        """Test the stdlib fallback when orjson is unavailable."""
+        with patch.object(parsers, 'orjson', None):
+            res = self.parse(b'{"title":"Soup"}')
+            with self.assertRaises(ParseError):
+                self.parse(b'{"title":')
+
+        self.assertEqual(res, {'title': 'Soup'})
@@ -0,0 +1,101 @@
+"""
+Tests for coalescing concurrent computations.
+"""
+import asyncio
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from core import metrics
+from core.singleflight import SingleFlight
+
+
+class SingleFlightTests(SimpleTestCase):
+    """Test the SingleFlight class."""
+
+    def setUp(self):
+        metrics.reset()
+        self.flights = SingleFlight(timeout=5)
+        self.calls = 0
+
+    def test_threads_coalesced(self):
+        """Test concurrent threads share one computation."""
+        release = threading.Event()
+        results = []
+
+        def compute():
+            self.calls += 1
+            release.wait(5)
+            return self.calls
+
+        def run():
+            results.append(self.flights.do('key', compute))
+
+        threads = [threading.Thread(target=run) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(sorted(results), [(1, False)] + [(1, True)] * 4)
+        self.assertEqual(len(self.flights), 0)
+        counters = metrics.snapshot()['counters']
+        self.assertEqual(counters['singleflight.leaders'], 1)
+        self.assertEqual(counters['singleflight.shared'], 4)
+
+    def test_coroutines_coalesced(self):
+        """Test concurrent coroutines share one computation."""
+        async def compute():
+            self.calls += 1
+            await asyncio.sleep(0.05)
+            return self.calls
+
+        async def run():
+            return await asyncio.gather(*(self.flights.ado('key', compute) for _ in range(5)))
+
+        results = asyncio.run(run())
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [(1, False)] + [(1, True)] * 4)
+
+    def test_sequential_not_shared(self):
+        """Test a computation is not reused once it has finished."""
+        def compute():
+            self.calls += 1
+            return self.calls
+
+        self.assertEqual(self.flights.do('key', compute), (1, False))
+        self.assertEqual(self.flights.do('key', compute), (2, False))
+
+    def test_leader_error(self):
+        """Test waiting callers compute themselves when the leader fails."""
+        started = threading.Event()
+        release = threading.Event()
+        results = []
+
+        def fail():
+            started.set()
+            release.wait(5)
+            raise ValueError
+
+        def leader():
+            with self.assertRaises(ValueError):
+                self.flights.do('key', fail)
+
+        def follower():
+            results.append(self.flights.do('key', lambda: 'own'))
+
+        threads = [threading.Thread(target=leader), threading.Thread(target=follower)]
+        threads[0].start()
+        started.wait(5)
+        threads[1].start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(results, [('own', False)])
@@ -0,0 +1,126 @@
+"""
+Tests for token-bucket throttling.
+"""
+import unittest
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.test.runner import DiscoverRunner
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import throttling
+from core.tests.runner import TestRunner
+
+
+class TokenBucketTests(SimpleTestCase):
+    """Test the bucket arithmetic and stores."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_parse_rate(self):
+        """Test rates are parsed to capacity and refill per second."""
+        self.assertEqual(throttling.parse_rate('120/min'), (120, 2.0))
+        self.assertEqual(throttling.parse_rate('10/s'), (10, 10.0))
+
+    def test_take(self):
+        """Test tokens are taken until empty, then refilled over time."""
+        wait, bucket = throttling.take(None, 2, 1.0, 100.0)
+        self.assertEqual((wait, bucket), (0, (1, 100.0)))
+        wait, bucket = throttling.take(bucket, 2, 1.0, 100.0)
+        self.assertEqual((wait, bucket), (0, (0, 100.0)))
+        wait, bucket = throttling.take(bucket, 2, 1.0, 100.25)
+        self.assertEqual(wait, 0.75)
+        wait, bucket = throttling.take(bucket, 2, 1.0, 110.0)
+        self.assertEqual((wait, bucket), (0, (1, 110.0)))
+
+    def test_stores(self):
+        """Test each store allows a burst up to the capacity."""
+        for store in (throttling.LocalBucketStore(), throttling.CacheBucketStore()):
+            with self.subTest(store=type(store).__name__):
+                waits = [store.consume('write:user:1', 3, 0.01) for _ in range(4)]
+                self.assertEqual(waits[:3], [0, 0, 0])
+                self.assertGreater(waits[3], 90)
+                self.assertEqual(store.consume('write:user:2', 3, 0.01), 0)
+
+    def test_local_store_bounded(self):
+        """Test the local store evicts the least recently used buckets."""
+        store = throttling.LocalBucketStore(maxsize=2)
+        for key in ('a', 'b', 'a', 'c'):
+            store.consume(key, 1, 0.01)
+
+        self.assertEqual(list(store._buckets), ['a', 'c'])
+
+
+@override_settings(REST_FRAMEWORK={
+    'DEFAULT_THROTTLE_CLASSES': ['core.throttling.TokenBucketThrottle'],
+    'DEFAULT_THROTTLE_RATES': {'list': '2/min', 'write': '1/min', 'login': '1/min'},
+})
+class ThrottleApiTests(TestCase):
+    """Test throttling API requests."""
+
+    def setUp(self):
+        throttling.get_store().clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_throttled_per_endpoint_class(self):
+        """Test each endpoint class has a bucket of its own."""
+        url = reverse('recipe:tag-list')
+        statuses = [self.client.get(url).status_code for _ in range(3)]
+        res = self.client.post(url, {'name': 'Vegan'})
+
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertIn('Retry-After', self.client.get(url))
+        self.assertNotEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_throttled_per_user(self):
+        """Test users do not share buckets."""
+        other = get_user_model().objects.create_user(email='other@example.com', password='testpass123')
+        url = reverse('recipe:tag-list')
+        for _ in range(2):
+            self.client.get(url)
+        self.client.force_authenticate(other)
+
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_login_throttled(self):
+        """Test token requests are throttled by client address."""
+        client = APIClient()
+        url = reverse('user:token')
+        payload = {'email': 'user@example.com', 'password': 'wrong'}
+        statuses = [client.post(url, payload).status_code for _ in range(2)]
+
+        self.assertEqual(statuses, [status.HTTP_400_BAD_REQUEST, status.HTTP_429_TOO_MANY_REQUESTS])
+
+
+class TestRunnerTests(SimpleTestCase):
+    """Test tests do not share throttling buckets."""
+
+    def test_buckets_emptied_after_each_test(self):
+        """Test the buckets taken from in a test are emptied after it."""
+        store = throttling.get_store()
+        waits = []
+
+        class ConsumingTests(SimpleTestCase):
+            def test_consume(self):
+                waits.append(store.consume('write:user:1', 1, 0.01))
+
+        suite = unittest.TestSuite([ConsumingTests('test_consume'), ConsumingTests('test_consume')])
+        with patch.object(DiscoverRunner, 'build_suite', return_value=suite):
+            TestRunner(verbosity=0).build_suite().run(unittest.TestResult())
+
+        self.assertEqual(waits, [0, 0])
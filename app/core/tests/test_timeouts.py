@@ -0,0 +1,108 @@
+"""
+Tests for per-endpoint statement timeouts.
+"""
+from unittest.mock import patch
+
+from django.db import (
+    OperationalError,
+    connection,
+)
+from django.test import (
+    SimpleTestCase,
+    override_settings,
+)
+
+from rest_framework import viewsets
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+
+from core import (
+    metrics,
+    timeouts,
+)
+
+
+def query_canceled():
+    """Return the error raised for a statement cancelled by its timeout."""
+    cause = Exception('canceling statement due to statement timeout')
+    cause.pgcode = timeouts.QUERY_CANCELED
+    error = OperationalError(*cause.args)
+    error.__cause__ = cause
+    return error
+
+
+class SlowViewSet(timeouts.StatementTimeoutMixin, viewsets.ViewSet):
+    authentication_classes = []
+    permission_classes = []
+    statement_timeout = 3000
+    statement_timeouts = {'retrieve': 1000}
+
+    def list(self, request):
+        raise query_canceled()
+
+    def retrieve(self, request, pk=None):
+        return Response({'timeout': self.get_statement_timeout()})
+
+
+class StatementTimeoutTests(SimpleTestCase):
+    """Test the StatementTimeoutMixin."""
+
+    def setUp(self):
+        metrics.reset()
+        self.factory = APIRequestFactory()
+        patcher = patch.object(timeouts, '_set_statement_timeout')
+        self.set_statement_timeout = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def call(self, action, **headers):
+        view = SlowViewSet.as_view({'get': action})
+        request = self.factory.get('/api/slow/', **headers)
+        with patch.object(connection, 'vendor', 'postgresql'):
+            if action == 'retrieve':
+                return view(request, pk=1)
+            return view(request)
+
+    def test_budget(self):
+        """Test the budget of the action is set and reset around the request."""
+        res = self.call('retrieve')
+
+        self.assertEqual(res.data, {'timeout': 1000})
+        self.assertEqual(
+            [call.args for call in self.set_statement_timeout.call_args_list],
+            [(1000,), (None,)],
+        )
+
+    @override_settings(API_STATEMENT_TIMEOUTS={'SlowViewSet': 200, 'SlowViewSet.retrieve': 100})
+    def test_budget_from_settings(self):
+        """Test settings override the budgets of the view."""
+        self.assertEqual(self.call('retrieve').data, {'timeout': 100})
+
+    def test_client_deadline(self):
+        """Test a shorter client deadline lowers the budget."""
+        res = self.call('retrieve', HTTP_X_REQUEST_TIMEOUT='250')
+        self.assertEqual(res.data, {'timeout': 250})
+
+        res = self.call('retrieve', HTTP_X_REQUEST_TIMEOUT='5000')
+        self.assertEqual(res.data, {'timeout': 1000})
+
+    def test_timeout_503(self):
+        """Test a query cancelled by the server budget answers 503."""
+        res = self.call('list')
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res['Retry-After'], '1')
+        counters = metrics.snapshot()['counters']
+        self.assertEqual(counters['statement_timeout.SlowViewSet.list'], 1)
+        self.assertEqual(self.set_statement_timeout.call_args.args, (None,))
+
+    def test_deadline_504(self):
+        """Test a query cancelled by the client deadline answers 504."""
+        res = self.call('list', HTTP_X_REQUEST_TIMEOUT='100')
+
+        self.assertEqual(res.status_code, 504)
+
+    def test_not_postgresql(self):
+        """Test no timeout is set on other databases."""
+        SlowViewSet.as_view({'get': 'retrieve'})(self.factory.get('/api/slow/'), pk=1)
+
+        self.set_statement_timeout.assert_not_called()
@@ -0,0 +1,145 @@
+"""
+Token-bucket throttling of API requests.
+
+Each user (or client address, for anonymous requests) has a bucket per
+endpoint class: `list` for reads, `write` for other methods and `login`
+for views setting throttle_scope = 'login'. A bucket holds up to N tokens
+for a rate of 'N/period' in DEFAULT_THROTTLE_RATES and refills
+continuously, so clients may burst up to N requests and then proceed at
+the sustained rate.
+
+A bucket is two floats (tokens, timestamp), kept in the store named by
+API_THROTTLE_STORE: LocalBucketStore keeps them in process memory, for a
+single worker; CacheBucketStore keeps them in the default cache, shared by
+all workers. Checking a request costs no database query.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+_PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+_SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def parse_rate(rate):
+    """Return (capacity, tokens per second) for a rate such as '100/min'."""
+    num, period = rate.split('/')
+    capacity = int(num)
+    return capacity, capacity / _PERIODS[period[0]]
+
+
+def take(bucket, capacity, refill, now):
+    """
+    Take a token from a bucket, returning (wait, bucket).
+
+    bucket is (tokens, timestamp), or None for a full bucket. wait is 0
+    if a token was taken, else the seconds until one is available.
+    """
+    if bucket is None:
+        tokens = capacity
+    else:
+        tokens = min(capacity, bucket[0] + (now - bucket[1]) * refill)
+    if tokens >= 1:
+        return 0, (tokens - 1, now)
+    return (1 - tokens) / refill, (tokens, now)
+
+
+class LocalBucketStore:
+    """Buckets in process memory, evicting the least recently used."""
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize or getattr(settings, 'API_THROTTLE_LOCAL_MAXSIZE', 10000)
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill):
+        """Take a token for key, returning the wait as take() does."""
+        now = time.monotonic()
+        with self._lock:
+            wait, bucket = take(self._buckets.get(key), capacity, refill, now)
+            self._buckets[key] = bucket
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        """Forget all buckets."""
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketStore:
+    """
+    Buckets in the default cache, shared between processes.
+
+    A bucket expires once it would be full again, as a missing bucket is
+    a full one. Reading and writing a bucket is not atomic, so concurrent
+    requests of one client in different processes may both take the same
+    token; the limit is approximate by that much.
+    """
+
+    def consume(self, key, capacity, refill):
+        """Take a token for key, returning the wait as take() does."""
+        now = time.time()
+        cache_key = f'throttle:{key}'
+        wait, bucket = take(cache.get(cache_key), capacity, refill, now)
+        cache.set(cache_key, bucket, (capacity - bucket[0]) / refill + 1)
+        return wait
+
+    def clear(self):
+        """Buckets expire from the cache on their own."""
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the bucket store configured with API_THROTTLE_STORE."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = import_string(getattr(
+                    settings,
+                    'API_THROTTLE_STORE',
+                    'core.throttling.LocalBucketStore',
+                ))()
+    return _store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle requests per user and endpoint class with token buckets."""
+
+    def __init__(self):
+        self._wait = None
+
+    def get_scope(self, request, view):
+        """Return the endpoint class of a request."""
+        scope = getattr(view, 'throttle_scope', None)
+        if scope:
+            return scope
+        return 'list' if request.method in _SAFE_METHODS else 'write'
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request, view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        self._wait = get_store().consume(f'{scope}:{ident}', *parse_rate(rate))
+        return not self._wait
+
+    def wait(self):
+        return self._wait
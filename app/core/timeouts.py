@@ -0,0 +1,127 @@
+"""
+Per-endpoint PostgreSQL statement timeouts.
+
+Views using StatementTimeoutMixin run their queries under a
+statement_timeout budget, set on the connection once the request is
+authenticated and reset when the response is finalized. The budget is, in
+milliseconds, the first found of:
+
+- API_STATEMENT_TIMEOUTS['<View>.<action>'] and ['<View>'] in settings,
+- the view's statement_timeouts[action] and statement_timeout attributes,
+- API_STATEMENT_TIMEOUT (5000).
+
+A client may ask for less with the X-Request-Timeout header (milliseconds
+it is willing to wait). Queries cancelled by the timeout answer 504 if the
+client's deadline set the budget, else 503 with Retry-After, and are
+counted in core.metrics as `statement_timeout.<View>.<action>`.
+"""
+from django.conf import settings
+from django.db import (
+    DatabaseError,
+    OperationalError,
+    connection,
+)
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from core import metrics
+
+DEADLINE_HEADER = 'X-Request-Timeout'
+
+# SQLSTATE of a statement cancelled by statement_timeout.
+QUERY_CANCELED = '57014'
+
+
+class QueryTimeout(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('The request took too long, try again later.')
+    default_code = 'query_timeout'
+
+
+class DeadlineExceeded(APIException):
+    status_code = status.HTTP_504_GATEWAY_TIMEOUT
+    default_detail = _('The request could not complete within its deadline.')
+    default_code = 'deadline_exceeded'
+
+
+def is_query_timeout(exc):
+    """Return whether an exception is a statement cancelled by its timeout."""
+    return (
+        isinstance(exc, OperationalError)
+        and getattr(exc.__cause__, 'pgcode', None) == QUERY_CANCELED
+    )
+
+
+def _set_statement_timeout(milliseconds):
+    """Set (or with None, reset) the statement timeout of the connection."""
+    with connection.cursor() as cursor:
+        if milliseconds is None:
+            cursor.execute('RESET statement_timeout')
+        else:
+            cursor.execute('SET statement_timeout = %s', [milliseconds])
+
+
+class StatementTimeoutMixin:
+    """View mixin running the queries of each request under a timeout."""
+    statement_timeout = None
+    statement_timeouts = {}
+
+    _statement_timeout_set = False
+    _deadline_applied = False
+
+    def get_client_deadline(self):
+        """Return the milliseconds the client is willing to wait, or None."""
+        value = self.request.headers.get(DEADLINE_HEADER)
+        try:
+            deadline = int(value)
+        except (TypeError, ValueError):
+            return None
+        return max(deadline, 1)
+
+    def get_statement_timeout(self):
+        """Return the statement timeout budget of the request in milliseconds."""
+        name = type(self).__name__
+        action = getattr(self, 'action', None)
+        configured = getattr(settings, 'API_STATEMENT_TIMEOUTS', {})
+        for timeout in (
+            configured.get(f'{name}.{action}'),
+            configured.get(name),
+            self.statement_timeouts.get(action),
+            self.statement_timeout,
+            getattr(settings, 'API_STATEMENT_TIMEOUT', 5000),
+        ):
+            if timeout is not None:
+                break
+        deadline = self.get_client_deadline()
+        self._deadline_applied = deadline is not None and deadline < timeout
+        return deadline if self._deadline_applied else timeout
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if connection.vendor == 'postgresql':
+            _set_statement_timeout(self.get_statement_timeout())
+            self._statement_timeout_set = True
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self._statement_timeout_set:
+            self._statement_timeout_set = False
+            # Rolling back the failed transaction undoes the SET anyway.
+            if not connection.needs_rollback:
+                try:
+                    _set_statement_timeout(None)
+                except DatabaseError:
+                    pass
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def handle_exception(self, exc):
+        if is_query_timeout(exc):
+            action = getattr(self, 'action', None) or self.request.method.lower()
+            metrics.increment(f'statement_timeout.{type(self).__name__}.{action}')
+            if self._deadline_applied:
+                exc = DeadlineExceeded()
+            else:
+                exc = QueryTimeout()
+                self.headers['Retry-After'] = '1'
+        return super().handle_exception(exc)
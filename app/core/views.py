@@ -0,0 +1,175 @@
+"""
+Views shared by the API apps.
+"""
+import io
+import json
+import logging
+import os
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.signals import got_request_exception
+from django.db import transaction
+from django.urls import (
+    Resolver404,
+    resolve,
+)
+
+from rest_framework import (
+    status,
+    views,
+)
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import (
+    IsAdminUser,
+    IsAuthenticated,
+)
+from rest_framework.response import Response
+
+from core import (
+    identity,
+    metrics,
+    serializers,
+)
+from core.renderers import PrometheusRenderer
+from core.schema import (
+    OpenApiTypes,
+    extend_schema,
+)
+
+# Errors of the requests of a batch are reported like those of requests.
+logger = logging.getLogger('django.request')
+
+# Request headers passed on to the requests of a batch. Authentication is
+# done once for the whole batch, so the credentials are not among them.
+_FORWARDED_META = (
+    'SERVER_NAME',
+    'SERVER_PORT',
+    'REMOTE_ADDR',
+    'HTTP_HOST',
+    'HTTP_ACCEPT_LANGUAGE',
+    'HTTP_USER_AGENT',
+    'HTTP_X_FORWARDED_FOR',
+    'HTTP_X_FORWARDED_PROTO',
+    'wsgi.url_scheme',
+)
+
+
+class BatchView(views.APIView):
+    """
+    Run several API requests in one.
+
+    Requests run in order, in-process, as the user authenticated for the
+    batch, and each gets its own response. A request failing, even with a
+    server error, does not affect the others: its database changes are
+    rolled back and its response reports the error.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        request=serializers.BatchRequestSerializer,
+        responses=serializers.BatchResponseSerializer,
+    )
+    def post(self, request):
+        serializer = serializers.BatchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({
+            'responses': [
+                self._run(sub_request)
+                for sub_request in serializer.validated_data['requests']
+            ],
+        })
+
+    def _build_request(self, method, path, body):
+        """Return a Django request for a request of the batch."""
+        url = urlsplit(path)
+        content = b'' if body is None else json.dumps(body).encode()
+        meta = {
+            name: self.request.META[name]
+            for name in _FORWARDED_META if name in self.request.META
+        }
+        meta.update({
+            'REQUEST_METHOD': method,
+            'PATH_INFO': url.path,
+            'QUERY_STRING': url.query,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(content)),
+            'HTTP_ACCEPT': 'application/json',
+            'wsgi.input': io.BytesIO(content),
+        })
+        meta.setdefault('wsgi.url_scheme', self.request.scheme)
+        sub_request = WSGIRequest(meta)
+        # Picked up by DRF in place of the authentication classes.
+        sub_request._force_auth_user = self.request.user
+        sub_request._force_auth_token = self.request.auth
+        return sub_request
+
+    def _run(self, sub_request):
+        """Run a request of the batch and return its status and body."""
+        sub_request = self._build_request(
+            sub_request['method'],
+            sub_request['path'],
+            sub_request.get('body'),
+        )
+        try:
+            match = resolve(sub_request.path_info)
+        except Resolver404:
+            return {'status': status.HTTP_404_NOT_FOUND, 'body': {'detail': 'Not found.'}}
+        if getattr(match.func, 'view_class', None) is type(self):
+            return {
+                'status': status.HTTP_400_BAD_REQUEST,
+                'body': {'detail': 'Batches cannot be nested.'},
+            }
+
+        try:
+            with transaction.atomic():
+                response = match.func(sub_request, *match.args, **match.kwargs)
+                if response.status_code >= 500:
+                    transaction.set_rollback(True)
+                    identity.clear()
+        except Exception:
+            identity.clear()
+            got_request_exception.send(sender=type(self), request=sub_request)
+            logger.exception(
+                'Internal Server Error in batch: %s', sub_request.path,
+                extra={'status_code': 500, 'request': sub_request},
+            )
+            return {
+                'status': status.HTTP_500_INTERNAL_SERVER_ERROR,
+                'body': {'detail': 'Internal server error.'},
+            }
+
+        if hasattr(response, 'data'):
+            body = response.data
+        elif response.content and response.get('Content-Type', '').startswith('application/json'):
+            body = json.loads(response.content)
+        else:
+            body = None
+        return {'status': response.status_code, 'body': body}
+
+
+class MetricsView(views.APIView):
+    """
+    Export core.metrics for Prometheus, to staff users.
+
+    Worker processes write their metrics to API_METRICS_DIR (see
+    app.server), from where the metrics of every worker are exported, with
+    the current ones of the process answering. Samples are labelled with
+    the process ID of their worker. Without API_METRICS_DIR, only those of
+    the process answering are.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAdminUser]
+    renderer_classes = [PrometheusRenderer]
+
+    @extend_schema(responses=OpenApiTypes.STR)
+    def get(self, request):
+        directory = getattr(settings, 'API_METRICS_DIR', None)
+        snapshots = metrics.collect(directory) if directory else {}
+        snapshots[str(os.getpid())] = metrics.snapshot()
+        return Response(
+            metrics.render_prometheus(snapshots),
+            content_type=PrometheusRenderer.CONTENT_TYPE,
+        )
@@ -0,0 +1,89 @@
+"""
+Gunicorn configuration of the production server.
+
+Run `gunicorn` from this directory, which picks up this file. It serves
+app.wsgi with threaded workers, or app.asgi (needed for the recipe event
+stream) with uvicorn workers when SERVER_INTERFACE=asgi. The app is
+preloaded in the master before workers are forked, see app.server.
+
+Set API_ONLY=1 on deployments serving only the API, so workers never
+import the admin and the schema views.
+
+Workers write their metrics to METRICS_DIR (a new temporary directory by
+default), from where /api/metrics/ exports those of all of them. Load
+shedding limits are shares of GUNICORN_THREADS, the requests a worker
+serves at once; have the proxy in front set `X-Request-Start: t=<epoch>`
+so requests that queued too long are shed as well.
+
+Several workers need a shared cache with atomic increments, such as
+memcached (CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache
+and CACHE_LOCATION=host:port), which then also holds the throttling
+buckets. Without one, a single worker is started, and several are refused.
+Recipe events go through PostgreSQL LISTEN/NOTIFY.
+
+Environment: PORT (8000), WEB_CONCURRENCY (workers, 2 per CPU + 1 with a
+shared cache, else 1),
+GUNICORN_THREADS (4, WSGI only), SERVER_INTERFACE (wsgi or asgi),
+METRICS_DIR, CACHE_BACKEND, CACHE_LOCATION, THROTTLE_STORE,
+EVENTS_TRANSPORT.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+_own_metrics_dir = 'METRICS_DIR' not in os.environ
+if _own_metrics_dir:
+    os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='recipe-metrics-')
+
+# State requests share across workers, see app.server.check_shared_state.
+_shared_cache = 'CACHE_BACKEND' in os.environ
+if _shared_cache:
+    os.environ.setdefault('THROTTLE_STORE', 'core.throttling.CacheBucketStore')
+os.environ.setdefault('EVENTS_TRANSPORT', 'recipe.events.PostgresTransport')
+
+from app import server  # noqa: E402
+
+server.disable_gc()
+
+bind = f'0.0.0.0:{os.environ.get("PORT", "8000")}'
+workers = int(os.environ.get(
+    'WEB_CONCURRENCY',
+    multiprocessing.cpu_count() * 2 + 1 if _shared_cache else 1,
+))
+preload_app = True
+
+if os.environ.get('SERVER_INTERFACE', 'wsgi') == 'asgi':
+    wsgi_app = 'app.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'app.wsgi:application'
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+
+def on_starting(arbiter):
+    server.check_shared_state(arbiter.num_workers)
+    arbiter.log.info('Application preloaded in %.0f ms', server.preload())
+    server.clear_metrics()
+
+
+def pre_fork(arbiter, worker):
+    server.before_fork()
+
+
+def post_fork(arbiter, worker):
+    server.after_fork()
+
+
+def post_worker_init(worker):
+    worker.log.info('Worker %s ready in %.0f ms', worker.pid, server.spawn_time())
+
+
+def child_exit(arbiter, worker):
+    server.worker_exited(worker.pid)
+
+
+def on_exit(arbiter):
+    if _own_metrics_dir:
+        shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
@@ -0,0 +1,100 @@
+"""
+Prefix search for tag and ingredient autocomplete.
+
+Each user's names are kept in a per-process prefix index: names are sorted
+case-insensitively so every prefix maps to one contiguous slice found with
+two binary searches. Indexes are cached per (model, user) together with the
+user's data version, so any write makes the cached index stale.
+"""
+import heapq
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.models.functions import Lower
+
+from recipe.cache import (
+    LocalVersionedCache,
+    get_data_version,
+)
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+# Sorts after any character that can follow a prefix.
+_PREFIX_END = chr(0x10FFFF)
+
+
+def _rank(row):
+    """Sort key for matches: most used first, then alphabetically."""
+    return (-row[2], row[3])
+
+
+class PrefixIndex:
+    """Case-insensitive prefix index over (id, name, recipe_count) rows."""
+
+    __slots__ = ('keys', 'rows')
+
+    def __init__(self, rows):
+        entries = sorted(
+            (name.lower(), pk, name, recipe_count)
+            for pk, name, recipe_count in rows
+        )
+        self.keys = [entry[0] for entry in entries]
+        self.rows = [
+            (pk, name, recipe_count, key)
+            for key, pk, name, recipe_count in entries
+        ]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def search(self, prefix, limit):
+        """Return up to limit (id, name) pairs whose name starts with prefix."""
+        prefix = prefix.lower()
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + _PREFIX_END, lo=start)
+        matches = heapq.nsmallest(
+            limit,
+            (self.rows[i] for i in range(start, end)),
+            key=_rank,
+        )
+        return [(pk, name) for pk, name, _, _ in matches]
+
+
+index_cache = LocalVersionedCache(
+    getattr(settings, 'RECIPE_AUTOCOMPLETE_CACHE_SIZE', 256),
+)
+
+
+def search_database(queryset, prefix, limit):
+    """
+    Return up to limit (id, name) pairs matching prefix from the database.
+
+    The lower(name) prefix filter is served by the functional
+    text_pattern_ops index on PostgreSQL.
+    """
+    rows = queryset.annotate(
+        name_lower=Lower('name'),
+    ).filter(
+        name_lower__startswith=prefix.lower(),
+    ).order_by('-recipe_count', 'name_lower').values_list('id', 'name')
+
+    return list(rows[:limit])
+
+
+def search(queryset, user, prefix, limit):
+    """Return up to limit (id, name) pairs of the user matching prefix."""
+    queryset = queryset.filter(user=user)
+    if not index_cache.maxsize:
+        return search_database(queryset, prefix, limit)
+
+    key = (queryset.model._meta.label_lower, user.id)
+    version = get_data_version(user.id)
+    index = index_cache.get(key, version)
+    if index is None:
+        index = PrefixIndex(
+            queryset.values_list('id', 'name', 'recipe_count').iterator(),
+        )
+        index_cache.set(key, version, index)
+
+    return index.search(prefix, limit)
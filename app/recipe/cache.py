@@ -0,0 +1,106 @@
+"""
+Per-user data versions for caching derived recipe data.
+
+Every write to a user's recipes, tags or ingredients bumps that user's data
+version. Cached results embed the version in their key, so stale entries
+are never read again and simply age out of the cache.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+
+def _version_key(user_id):
+    """Return the cache key holding the data version of a user."""
+    return f'recipe:data-version:{user_id}'
+
+
+def _initial_version():
+    """
+    Return a starting version for a user without one.
+
+    Seeding from the clock keeps a version that was evicted from the cache
+    from restarting at a number that older cached entries still use.
+    """
+    return time.time_ns() // 1000
+
+
+def get_data_version(user_id):
+    """Return the current data version for a user."""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_data_version(user_id):
+    """Invalidate cached data for a user and return the new version."""
+    key = _version_key(user_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The version was never read or has been evicted.
+        cache.add(key, _initial_version(), timeout=None)
+        return cache.incr(key)
+
+
+class LocalVersionedCache:
+    """
+    Thread-safe, per-process LRU cache of objects stamped with a version.
+
+    Used for in-memory indexes derived from a user's data. An entry is only
+    returned while its version matches the user's current data version.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key, version):
+        """Return the cached value for key if it matches version."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, version, value):
+        """Store a value, evicting the least recently used entries."""
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def advance(self, key, version, update):
+        """
+        Carry an entry forward to a new version by applying update to it.
+
+        This only happens when the entry is exactly one version behind, i.e.
+        the caller's write is the only change it has missed. Otherwise the
+        entry is dropped and rebuilt on the next read.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            if entry[0] != version - 1:
+                del self._entries[key]
+                return
+            update(entry[1])
+            self._entries[key] = (version, entry[1])
+
+    def clear(self):
+        """Remove all cached values."""
+        with self._lock:
+            self._entries.clear()
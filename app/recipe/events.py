@@ -0,0 +1,224 @@
+"""
+Change events for recipes, tags and ingredients.
+
+Writes publish small events ({"kind": "recipe", "action": "updated",
+"id": 5}) once their transaction commits. A transport carries them to
+every process, where the Broker fans them out to the subscriptions of the
+user, as used by the server-sent events stream in recipe.sse.
+
+Each subscription has a bounded queue. A subscriber that falls behind by
+more than its queue is evicted rather than buffering without limit or
+slowing down delivery to the others, and is expected to reconnect and
+catch up through the changes endpoint.
+
+The transport is set with RECIPE_EVENTS_TRANSPORT. LocalTransport only
+reaches subscribers in the publishing process; PostgresTransport goes
+through LISTEN/NOTIFY, so events written by WSGI workers reach ASGI
+processes holding the streams.
+"""
+import asyncio
+import json
+import select
+import threading
+
+from django.conf import settings
+from django.db import (
+    connection,
+    transaction,
+)
+from django.utils.module_loading import import_string
+
+from core import metrics
+
+CREATED = 'created'
+UPDATED = 'updated'
+DELETED = 'deleted'
+
+# Put in the queue of an evicted subscription, after which it is closed.
+EVICTED = object()
+
+
+class Subscription:
+    """Bounded queue of events for one subscriber, bound to its event loop."""
+
+    def __init__(self, broker, user_id, maxsize):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.evicted = False
+
+    def offer(self, event):
+        """Queue an event from any thread."""
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The event loop of the subscriber is closed.
+            self.broker.unsubscribe(self)
+
+    def _put(self, event):
+        if self.evicted:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.evicted = True
+            self.broker.unsubscribe(self)
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(EVICTED)
+            metrics.increment('events.evicted')
+
+    async def get(self):
+        """Return the next event, or EVICTED."""
+        return await self.queue.get()
+
+
+class Broker:
+    """In-process fan-out of events to the subscriptions of each user."""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def subscribe(self, user_id):
+        """Return a new subscription to the events of a user."""
+        subscription = Subscription(self, user_id, self.queue_size)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        metrics.set_gauge('events.subscribers', len(self))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Stop delivering events to a subscription."""
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.user_id, None)
+        metrics.set_gauge('events.subscribers', len(self))
+
+    def deliver(self, user_id, event):
+        """Queue an event for every subscription of a user."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.offer(event)
+
+
+class LocalTransport:
+    """Transport delivering events to subscribers in this process only."""
+
+    def __init__(self, deliver):
+        self.deliver = deliver
+
+    def publish(self, user_id, event):
+        self.deliver(user_id, event)
+
+    def start(self):
+        """Start receiving events from other processes (nothing to do)."""
+
+    def close(self):
+        """Stop receiving events."""
+
+
+class PostgresTransport:
+    """
+    Transport through PostgreSQL LISTEN/NOTIFY on the default database.
+
+    Publishing is a pg_notify() on the current connection. Processes with
+    subscribers run a listener thread on a dedicated connection, started
+    on the first subscription.
+    """
+    channel = 'recipe_events'
+    poll_timeout = 5
+
+    def __init__(self, deliver):
+        self.deliver = deliver
+        self._listener = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def publish(self, user_id, event):
+        payload = json.dumps({'user_id': user_id, 'event': event})
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, payload])
+
+    def start(self):
+        with self._lock:
+            if self._listener is None:
+                self._stopped.clear()
+                self._listener = threading.Thread(
+                    target=self._listen,
+                    name='recipe-events-listener',
+                    daemon=True,
+                )
+                self._listener.start()
+
+    def close(self):
+        self._stopped.set()
+
+    def _listen(self):
+        while not self._stopped.is_set():
+            try:
+                self._listen_once()
+            except (connection.Database.Error, OSError):
+                # Reconnect after a pause. Events sent meanwhile are lost,
+                # clients catch up through the changes endpoint.
+                self._stopped.wait(self.poll_timeout)
+        self._listener = None
+
+    def _listen_once(self):
+        # A connection outside of Django's management, which closes
+        # connections at the end of requests.
+        listen_connection = connection.get_new_connection(connection.get_connection_params())
+        listen_connection.autocommit = True
+        try:
+            with listen_connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {self.channel}')
+            while not self._stopped.is_set():
+                if not select.select([listen_connection], [], [], self.poll_timeout)[0]:
+                    continue
+                listen_connection.poll()
+                while listen_connection.notifies:
+                    notify = listen_connection.notifies.pop(0)
+                    message = json.loads(notify.payload)
+                    self.deliver(message['user_id'], message['event'])
+        finally:
+            listen_connection.close()
+
+
+broker = Broker(getattr(settings, 'RECIPE_EVENTS_QUEUE_SIZE', 100))
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """Return the transport configured with RECIPE_EVENTS_TRANSPORT."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            transport_class = import_string(getattr(
+                settings,
+                'RECIPE_EVENTS_TRANSPORT',
+                'recipe.events.LocalTransport',
+            ))
+            _transport = transport_class(broker.deliver)
+        return _transport
+
+
+def publish(user_id, kind, action, object_id):
+    """Publish an event once the current transaction commits."""
+    event = {'kind': kind, 'action': action, 'id': object_id}
+
+    def send():
+        get_transport().publish(user_id, event)
+        metrics.increment('events.published')
+
+    transaction.on_commit(send)
@@ -0,0 +1,187 @@
+"""
+Fast read-only serialization for list and retrieve responses.
+
+FastSerializer mirrors the output of a ModelSerializer instance, including
+the fields kept by SparseFieldsMixin, but builds plain dicts straight from
+values() rows and from one values_list() query per many-to-many relation.
+This skips model instantiation and the per-field machinery of DRF. Only
+field types with a known representation are supported; anything else is
+passed through the DRF field itself.
+"""
+import decimal
+
+from django.conf import settings
+from django.db import models
+
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+
+def enabled():
+    """Return whether read endpoints should use the fast path."""
+    return getattr(settings, 'RECIPE_FAST_SERIALIZATION', True)
+
+
+def _identity(value):
+    return value
+
+
+def _decimal_formatter(field):
+    """Return a formatter matching DecimalField.to_representation."""
+    coerce_to_string = getattr(
+        field,
+        'coerce_to_string',
+        api_settings.COERCE_DECIMAL_TO_STRING,
+    )
+    if field.localize or field.decimal_places is None:
+        return field.to_representation
+
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def format_decimal(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        quantized = value.quantize(exponent, rounding=rounding, context=context)
+        return '{:f}'.format(quantized) if coerce_to_string else quantized
+
+    return format_decimal
+
+
+def _formatter(field):
+    """Return a function turning a database value into the field output."""
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_formatter(field)
+    if isinstance(field, (
+        serializers.IntegerField,
+        serializers.CharField,
+        serializers.BooleanField,
+    )):
+        return _identity
+    return field.to_representation
+
+
+class FastSerializer:
+    """Build the representation of a ModelSerializer from values() rows."""
+
+    def __init__(self, serializer):
+        model = serializer.Meta.model
+        # Output fields in serializer order, as (name, source, formatter)
+        # where a None formatter marks a relation loaded separately.
+        self.fields = []
+        self.columns = []
+        self.relations = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            model_field = model._meta.get_field(field.source)
+            if isinstance(model_field, models.ManyToManyField):
+                self.relations.append(self._relation(name, model_field, field))
+                self.fields.append((name, name, None))
+            else:
+                column = (name, field.source, _formatter(field))
+                self.columns.append(column)
+                self.fields.append(column)
+
+    def _relation(self, name, model_field, field):
+        """Describe how to load and render a many-to-many field."""
+        through = model_field.remote_field.through
+        source = model_field.m2m_field_name()
+        target = model_field.m2m_reverse_field_name()
+        if isinstance(field, serializers.ListSerializer):
+            child = [
+                (child_name, _formatter(child_field))
+                for child_name, child_field in field.child.fields.items()
+                if not child_field.write_only
+            ]
+            lookups = [
+                f'{target}_id' if child_field.source == 'id'
+                else f'{target}__{child_field.source}'
+                for _, child_field in field.child.fields.items()
+                if not child_field.write_only
+            ]
+        else:
+            child = None
+            lookups = [f'{target}_id']
+        return {
+            'name': name,
+            'through': through,
+            'source': f'{source}_id',
+            'order': f'{target}_id',
+            'lookups': lookups,
+            'child': child,
+        }
+
+    def rows(self, queryset):
+        """
+        Return a values() queryset with the columns needed for rendering.
+
+        Ordering columns are included too, so keyset pagination can read
+        the cursor values from the rows.
+        """
+        names = ['id'] + [source for _, source, _ in self.columns]
+        names += [
+            name.lstrip('-') for name in queryset.query.order_by
+            if name.lstrip('-') not in queryset.query.annotations
+        ]
+        annotations = [
+            name.lstrip('-') for name in queryset.query.order_by
+            if name.lstrip('-') in queryset.query.annotations
+        ]
+        return queryset.prefetch_related(None).values(
+            *dict.fromkeys(names),
+            *annotations,
+        )
+
+    def load_relations(self, ids):
+        """Return {relation name: {row id: [items]}} for the given rows."""
+        loaded = {}
+        for relation in self.relations:
+            rows = relation['through'].objects.filter(**{
+                f"{relation['source']}__in": ids,
+            }).order_by(relation['order']).values_list(
+                relation['source'],
+                *relation['lookups'],
+            )
+            loaded[relation['name']] = self.group(relation, rows)
+        return loaded
+
+    @staticmethod
+    def group(relation, rows):
+        """Return {row id: [items]} from (row id, *related values) tuples."""
+        child = relation['child']
+        items = {}
+        for row in rows:
+            if child is None:
+                item = row[1]
+            else:
+                item = {
+                    name: None if value is None else format_value(value)
+                    for (name, format_value), value in zip(child, row[1:])
+                }
+            items.setdefault(row[0], []).append(item)
+        return items
+
+    def build(self, rows, relations):
+        """Return the representations of rows with preloaded relations."""
+        fields = self.fields
+        data = []
+        for row in rows:
+            item = {}
+            for name, source, format_value in fields:
+                if format_value is None:
+                    item[name] = relations[name].get(row['id'], [])
+                    continue
+                value = row[source]
+                item[name] = None if value is None else format_value(value)
+            data.append(item)
+        return data
+
+    def render(self, rows):
+        """Return the representations of the given values() rows."""
+        rows = list(rows)
+        relations = self.load_relations([row['id'] for row in rows]) if self.relations else {}
+        return self.build(rows, relations)
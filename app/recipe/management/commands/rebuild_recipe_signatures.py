@@ -0,0 +1,29 @@
+"""
+Django command to rebuild the MinHash signatures of recipes.
+"""
+from django.core.management.base import BaseCommand
+
+from core.models import Recipe
+from recipe import similarity
+
+
+class Command(BaseCommand):
+    """Django command to recompute recipe similarity signatures."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='Only rebuild the recipes of this user ID.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        recipes = Recipe.objects.all()
+        if options['user'] is not None:
+            recipes = recipes.filter(user_id=options['user'])
+
+        total = similarity.rebuild(recipes)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt signatures for {total} recipes!'))
@@ -0,0 +1,156 @@
+"""
+Keyset pagination for the recipe APIs.
+"""
+import base64
+import binascii
+import json
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opt-in keyset ("seek") pagination over the ordering of the queryset.
+
+    Lists are only paginated when the client passes page_size or cursor,
+    so existing clients keep receiving plain lists. The cursor holds the
+    ordering values of the last row of the page, and the next page is
+    selected by comparing the ordering columns against them one after the
+    other, as in (a > x) OR (a = x AND b > y). With a matching
+    (user_id, column, id) index every page is an index range scan, no
+    matter how deep into the list it is. Cursor values come from the
+    client, so they are converted and validated by their ordering fields.
+
+    The ordering of the queryset must end with a unique field (the ID).
+    Model instances and values() rows are both supported.
+    """
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    default_page_size = 50
+    max_page_size = 500
+    invalid_cursor_message = _('Invalid cursor')
+
+    def __init__(self):
+        self.next_url = None
+
+    def _get_page_size(self, request):
+        value = request.query_params.get(self.page_size_query_param)
+        if value is None:
+            return self.default_page_size
+        try:
+            page_size = int(value)
+        except ValueError:
+            raise ValidationError(
+                {self.page_size_query_param: _('A valid integer is required.')}
+            )
+        return max(1, min(page_size, self.max_page_size))
+
+    def encode_cursor(self, values):
+        """Return an opaque cursor for the given ordering values."""
+        values = [str(v) if isinstance(v, Decimal) else v for v in values]
+        data = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+    def decode_cursor(self, cursor, fields):
+        """Return the ordering values held by a cursor, converted by fields."""
+        padded = cursor + '=' * (-len(cursor) % 4)
+        try:
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (binascii.Error, ValueError):
+            raise ValidationError({self.cursor_query_param: self.invalid_cursor_message})
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise ValidationError({self.cursor_query_param: self.invalid_cursor_message})
+        try:
+            return [self._to_python(field, value) for field, value in zip(fields, values)]
+        except DjangoValidationError:
+            raise ValidationError({self.cursor_query_param: self.invalid_cursor_message})
+
+    @staticmethod
+    def _to_python(field, value):
+        """Convert and validate a cursor value of an ordering field."""
+        if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+            raise DjangoValidationError('Invalid cursor value.')
+        value = field.to_python(value)
+        field.run_validators(value)
+        # Not every backend reports integer ranges for the validators.
+        if isinstance(value, int) and not -2 ** 63 <= value < 2 ** 63:
+            raise DjangoValidationError('Invalid cursor value.')
+        return value
+
+    @staticmethod
+    def _ordering_field(queryset, name):
+        """Return the model field or annotation output field of an ordering."""
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        return queryset.model._meta.get_field(name)
+
+    def _after(self, ordering, values):
+        """Return a filter selecting rows after the given ordering values."""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.page_size_query_param not in params and self.cursor_query_param not in params:
+            return None
+
+        page_size = self._get_page_size(request)
+        ordering = list(queryset.query.order_by)
+        cursor = params.get(self.cursor_query_param)
+        if cursor:
+            fields = [
+                self._ordering_field(queryset, field.lstrip('-'))
+                for field in ordering
+            ]
+            values = self.decode_cursor(cursor, fields)
+            queryset = queryset.filter(self._after(ordering, values))
+
+        rows = list(queryset[:page_size + 1])
+        page = rows[:page_size]
+        self.next_url = None
+        if len(rows) > page_size:
+            last = page[-1]
+            names = [field.lstrip('-') for field in ordering]
+            if isinstance(last, dict):
+                values = [last[name] for name in names]
+            else:
+                values = [getattr(last, name) for name in names]
+            self.next_url = replace_query_param(
+                request.build_absolute_uri(),
+                self.cursor_query_param,
+                self.encode_cursor(values),
+            )
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.next_url,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                },
+                'results': schema,
+            },
+        }
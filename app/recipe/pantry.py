@@ -0,0 +1,160 @@
+"""
+"What can I cook" search ranking recipes by ingredient coverage.
+
+Each user's recipes are held in a per-process inverted index mapping every
+ingredient to a bitset of the recipes using it. Recipes get dense bit
+positions, so the bitsets stay small regardless of the global recipe IDs.
+"""
+import threading
+
+from django.conf import settings
+
+from core.models import Recipe
+from recipe.cache import (
+    LocalVersionedCache,
+    get_data_version,
+)
+
+
+class InvertedIndex:
+    """Ingredient -> recipe bitset index over one user's recipes."""
+
+    def __init__(self, memberships=()):
+        self.recipe_ids = []
+        self.positions = {}
+        self.members = []
+        self.postings = {}
+        self._free = []
+        self._lock = threading.Lock()
+
+        recipes = {}
+        for recipe_id, ingredient_id in memberships:
+            ingredients = recipes.setdefault(recipe_id, [])
+            if ingredient_id is not None:
+                ingredients.append(ingredient_id)
+        for recipe_id, ingredient_ids in recipes.items():
+            self._add(recipe_id, ingredient_ids)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _add(self, recipe_id, ingredient_ids):
+        """Index a recipe that is not in the index yet."""
+        members = tuple(set(ingredient_ids))
+        if self._free:
+            pos = self._free.pop()
+            self.recipe_ids[pos] = recipe_id
+            self.members[pos] = members
+        else:
+            pos = len(self.recipe_ids)
+            self.recipe_ids.append(recipe_id)
+            self.members.append(members)
+        self.positions[recipe_id] = pos
+
+        bit = 1 << pos
+        for ingredient_id in members:
+            self.postings[ingredient_id] = self.postings.get(ingredient_id, 0) | bit
+
+    def _remove(self, recipe_id):
+        """Drop a recipe from the index if present."""
+        pos = self.positions.pop(recipe_id, None)
+        if pos is None:
+            return
+        mask = ~(1 << pos)
+        for ingredient_id in self.members[pos]:
+            bits = self.postings[ingredient_id] & mask
+            if bits:
+                self.postings[ingredient_id] = bits
+            else:
+                del self.postings[ingredient_id]
+        self.recipe_ids[pos] = None
+        self.members[pos] = ()
+        self._free.append(pos)
+
+    def set_recipe(self, recipe_id, ingredient_ids):
+        """Add or replace the ingredients of a recipe."""
+        with self._lock:
+            self._remove(recipe_id)
+            self._add(recipe_id, ingredient_ids)
+
+    def remove_recipe(self, recipe_id):
+        """Remove a recipe."""
+        with self._lock:
+            self._remove(recipe_id)
+
+    def rank(self, ingredient_ids, max_missing=None):
+        """
+        Return (recipe_id, missing_ingredient_ids) pairs for the recipes using
+        any of the given ingredients.
+
+        Recipes with every ingredient on hand come first, followed by those
+        missing one, two and so on. Ties prefer recipes using more of the
+        ingredients on hand, then newer recipes.
+        """
+        on_hand = set(ingredient_ids)
+        with self._lock:
+            hits = {}
+            for ingredient_id in on_hand:
+                bits = self.postings.get(ingredient_id, 0)
+                while bits:
+                    low = bits & -bits
+                    pos = low.bit_length() - 1
+                    hits[pos] = hits.get(pos, 0) + 1
+                    bits ^= low
+
+            results = []
+            for pos, matched in hits.items():
+                members = self.members[pos]
+                missing = len(members) - matched
+                if max_missing is not None and missing > max_missing:
+                    continue
+                results.append((missing, -matched, -self.recipe_ids[pos], pos))
+            results.sort()
+
+            return [
+                (
+                    self.recipe_ids[pos],
+                    [i for i in self.members[pos] if i not in on_hand],
+                )
+                for _, _, _, pos in results
+            ]
+
+
+index_cache = LocalVersionedCache(
+    getattr(settings, 'RECIPE_PANTRY_CACHE_SIZE', 256),
+)
+
+
+def get_index(user):
+    """Return the inverted index of a user, loading it when stale."""
+    version = get_data_version(user.id)
+    index = index_cache.get(user.id, version)
+    if index is None:
+        memberships = Recipe.objects.filter(
+            user=user,
+        ).values_list('id', 'ingredients').iterator()
+        index = InvertedIndex(memberships)
+        index_cache.set(user.id, version, index)
+
+    return index
+
+
+def recipe_saved(recipe, version):
+    """Update a cached index after a recipe was created or updated."""
+    if recipe.user_id not in index_cache:
+        return
+    ingredient_ids = list(recipe.ingredients.values_list('id', flat=True))
+    index_cache.advance(
+        recipe.user_id,
+        version,
+        lambda index: index.set_recipe(recipe.id, ingredient_ids),
+    )
+
+
+def recipe_deleted(user_id, recipe_id, version):
+    """Update a cached index after a recipe was deleted."""
+    index_cache.advance(
+        user_id,
+        version,
+        lambda index: index.remove_recipe(recipe_id),
+    )
@@ -0,0 +1,59 @@
+"""
+Full-text search over recipe titles and descriptions.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import (
+    Case,
+    F,
+    FloatField,
+    Q,
+    Value,
+    When,
+)
+
+SEARCH_CONFIG = 'english'
+
+# Relative weights of a title and a description match in the portable
+# fallback, mirroring the 'A' and 'B' weights of the PostgreSQL document.
+TITLE_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.4
+
+
+def _search_postgresql(queryset, text):
+    """Match and rank against the trigger-maintained search_vector."""
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.filter(search_vector=query).annotate(
+        rank=SearchRank(F('search_vector'), query),
+    )
+
+
+def _search_fallback(queryset, text):
+    """Match every term with icontains and rank title matches higher."""
+    rank = Value(0.0, output_field=FloatField())
+    for term in text.split():
+        queryset = queryset.filter(
+            Q(title__icontains=term) | Q(description__icontains=term)
+        )
+        rank = rank + Case(
+            When(title__icontains=term, then=Value(TITLE_WEIGHT)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ) + Case(
+            When(description__icontains=term, then=Value(DESCRIPTION_WEIGHT)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    return queryset.annotate(rank=rank)
+
+
+def search_recipes(queryset, text):
+    """
+    Filter recipes matching text and annotate them with a 'rank'.
+
+    PostgreSQL uses the GIN-indexed search_vector; other databases fall
+    back to substring matching so the test suite runs anywhere.
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        return _search_postgresql(queryset, text)
+    return _search_fallback(queryset, text)
@@ -1,16 +1,47 @@
 """
 Serializers for recipe APIs
 """
+from django.db import transaction
+
 from rest_framework import serializers
 
+from core import identity
+from core.signals import deferred_recipe_attrs_changed
 from core.models import (
     Recipe,
     Tag,
     Ingredient,
 )
-
-
-class IngredientSerializer(serializers.ModelSerializer):
+from recipe import events
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin limiting the output to the requested fields.
+
+    `fields` lists the fields to keep. `expand` lists the relations to render
+    as nested objects; when it is given, other kept relations render as
+    lists of IDs instead. Both default to the full representation.
+    """
+    expandable_fields = ()
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            keep = set(fields) | set(expand or ())
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+        if expand is not None:
+            for name in self.expandable_fields:
+                if name in self.fields and name not in expand:
+                    self.fields[name] = serializers.PrimaryKeyRelatedField(
+                        many=True,
+                        read_only=True,
+                    )
+
+
+class IngredientSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for ingredients."""
 
     class Meta:
@@ -19,7 +50,7 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for tags."""
 
     class Meta:
@@ -28,17 +59,30 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for recipes."""
 
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
 
+    expandable_fields = ('tags', 'ingredients')
+
     class Meta:
         model = Recipe
         fields = ['id', 'title', 'time_minutes', 'price', 'link', 'tags', 'ingredients']
         read_only_fields = ['id']
 
+    def get_fields(self):
+        """Keep prices as Decimal for renderers that encode them natively."""
+        fields = super().get_fields()
+        request = self.context.get('request')
+        renderer = getattr(request, 'accepted_renderer', None)
+        if getattr(renderer, 'native_decimals', False):
+            for field in fields.values():
+                if isinstance(field, serializers.DecimalField):
+                    field.coerce_to_string = False
+        return fields
+
 
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for recipe detail view."""
@@ -50,46 +94,138 @@ class RecipeDetailSerializer(RecipeSerializer):
         """Handle getting or creating tags as needed."""
         auth_user = self.context['request'].user
         for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
+            tag_obj, created = identity.get_or_create(
+                Tag,
                 user=auth_user,
                 **tag,
             )
+            if created:
+                events.publish(auth_user.id, 'tag', events.CREATED, tag_obj.id)
             recipe.tags.add(tag_obj)
 
     def _get_or_create_ingredients(self, ingredients, recipe):
         """Handle getting or creating ingredients as needed."""
         auth_user = self.context['request'].user
         for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
+            ingredient_obj, created = identity.get_or_create(
+                Ingredient,
                 user=auth_user,
                 **ingredient,
             )
+            if created:
+                events.publish(auth_user.id, 'ingredient', events.CREATED, ingredient_obj.id)
             recipe.ingredients.add(ingredient_obj)
 
+    @transaction.atomic
     def create(self, validated_data):
         """Create a recipe."""
         tags = validated_data.pop('tags', [])
         ingredients = validated_data.pop('ingredients', [])
         recipe = Recipe.objects.create(**validated_data)
-        self._get_or_create_tags(tags, recipe)
-        self._get_or_create_ingredients(ingredients, recipe)
+        with deferred_recipe_attrs_changed():
+            self._get_or_create_tags(tags, recipe)
+            self._get_or_create_ingredients(ingredients, recipe)
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Update recipe."""
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
-        if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+        with deferred_recipe_attrs_changed():
+            if tags is not None:
+                instance.tags.clear()
+                self._get_or_create_tags(tags, instance)
 
-        if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            if ingredients is not None:
+                instance.ingredients.clear()
+                self._get_or_create_ingredients(ingredients, instance)
 
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
 
-        instance.save()
+            # Saved within the block, stamping the recipe for delta sync
+            # once for its fields, tags and ingredients.
+            instance.save()
         return instance
+
+
+class RecipeAttrCountSerializer(serializers.Serializer):
+    """Serializer for the number of recipes using a tag or ingredient."""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    count = serializers.IntegerField()
+
+
+class PriceStatsSerializer(serializers.Serializer):
+    """Serializer for recipe price aggregates."""
+    avg = serializers.DecimalField(max_digits=5, decimal_places=2)
+    min = serializers.DecimalField(max_digits=5, decimal_places=2)
+    max = serializers.DecimalField(max_digits=5, decimal_places=2)
+
+
+class TimeBucketSerializer(serializers.Serializer):
+    """Serializer for a bucket of the time_minutes histogram."""
+    min = serializers.IntegerField()
+    max = serializers.IntegerField(allow_null=True)
+    count = serializers.IntegerField()
+
+
+class TimeStatsSerializer(serializers.Serializer):
+    """Serializer for recipe time_minutes aggregates."""
+    avg = serializers.FloatField()
+    min = serializers.IntegerField()
+    max = serializers.IntegerField()
+    histogram = TimeBucketSerializer(many=True)
+
+
+class RecipeStatsSerializer(serializers.Serializer):
+    """Serializer documenting the recipe stats response."""
+    count = serializers.IntegerField()
+    price = PriceStatsSerializer()
+    time_minutes = TimeStatsSerializer()
+    tags = RecipeAttrCountSerializer(many=True)
+    ingredients = RecipeAttrCountSerializer(many=True)
+
+
+class RecipeFacetsSerializer(serializers.Serializer):
+    """Serializer documenting the recipe facets response."""
+    tags = RecipeAttrCountSerializer(many=True)
+    ingredients = RecipeAttrCountSerializer(many=True)
+
+
+class CookableRecipeSerializer(serializers.Serializer):
+    """Serializer for a recipe ranked by ingredients on hand."""
+    recipe = RecipeSerializer()
+    missing_ingredients = serializers.ListField(
+        child=serializers.IntegerField(),
+    )
+
+
+class SimilarRecipeSerializer(serializers.Serializer):
+    """Serializer for a recipe with its Jaccard similarity to another."""
+    recipe = RecipeSerializer()
+    similarity = serializers.FloatField()
+
+
+class RecipeBulkSerializer(serializers.Serializer):
+    """Serializer documenting the bulk retrieve response."""
+    results = RecipeDetailSerializer(many=True)
+    missing = serializers.ListField(child=serializers.IntegerField())
+
+
+class DeletedObjectsSerializer(serializers.Serializer):
+    """Serializer documenting the IDs of deleted objects."""
+    recipes = serializers.ListField(child=serializers.IntegerField())
+    tags = serializers.ListField(child=serializers.IntegerField())
+    ingredients = serializers.ListField(child=serializers.IntegerField())
+
+
+class ChangesSerializer(serializers.Serializer):
+    """Serializer documenting the delta sync response."""
+    token = serializers.CharField()
+    recipes = RecipeDetailSerializer(many=True)
+    tags = TagSerializer(many=True)
+    ingredients = IngredientSerializer(many=True)
+    deleted = DeletedObjectsSerializer()
@@ -0,0 +1,13 @@
+"""
+Signal handlers keeping recipe similarity signatures up to date.
+"""
+from django.dispatch import receiver
+
+from core.signals import recipe_attrs_changed
+from recipe import similarity
+
+
+@receiver(recipe_attrs_changed)
+def similarity_recipe_attrs_changed(sender, user_id, recipe_ids, **kwargs):
+    """Refresh the signatures of recipes whose tags or ingredients changed."""
+    similarity.refresh(recipe_ids)
@@ -0,0 +1,217 @@
+"""
+Recipe similarity from MinHash signatures with LSH banding.
+
+A recipe is described by the set of its tags and ingredients. Its MinHash
+signature estimates the Jaccard similarity with any other recipe as the
+fraction of equal signature slots. Signatures are split into bands and
+every band is hashed to a bucket; recipes sharing at least one bucket are
+candidates, so a lookup only compares a handful of signatures.
+
+Signatures are refreshed from recipe.signals whenever the tags or
+ingredients of a recipe change, including when a tag or ingredient is
+deleted, as sent by core.signals.recipe_attrs_changed.
+"""
+import hashlib
+import heapq
+import random
+from array import array
+
+from django.db import transaction
+from django.db.models import Q
+
+from core.models import (
+    Recipe,
+    RecipeBucket,
+    RecipeSignature,
+)
+
+NUM_HASHES = 64
+BANDS = 32
+ROWS = NUM_HASHES // BANDS
+
+# Signature estimates pick this many candidates per requested result, which
+# are then re-ranked by their exact Jaccard similarity.
+RERANK_FACTOR = 3
+
+# Mersenne prime modulus of the universal hash family.
+_PRIME = (1 << 61) - 1
+_MASK = 0xFFFFFFFF
+
+_rng = random.Random(0x5EED)
+_COEFFICIENTS = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME))
+    for _ in range(NUM_HASHES)
+]
+
+
+def features(tag_ids, ingredient_ids):
+    """Return the feature set of a recipe as integers."""
+    return {tag_id * 2 for tag_id in tag_ids} | {
+        ingredient_id * 2 + 1 for ingredient_id in ingredient_ids
+    }
+
+
+def signature(feature_set):
+    """Return the MinHash signature of a non-empty feature set."""
+    return array('I', [
+        min((a * x + b) % _PRIME for x in feature_set) & _MASK
+        for a, b in _COEFFICIENTS
+    ])
+
+
+def bands(minhash):
+    """Return the (band, bucket) pairs of a signature."""
+    result = []
+    for band in range(BANDS):
+        chunk = minhash[band * ROWS:(band + 1) * ROWS].tobytes()
+        digest = hashlib.blake2b(chunk, digest_size=8).digest()
+        result.append((band, int.from_bytes(digest, 'big', signed=True)))
+    return result
+
+
+def estimate(first, second):
+    """Estimate the Jaccard similarity of two signatures."""
+    equal = sum(1 for x, y in zip(first, second) if x == y)
+    return equal / NUM_HASHES
+
+
+def unpack(data):
+    """Return the signature stored in a RecipeSignature.minhash value."""
+    minhash = array('I')
+    minhash.frombytes(bytes(data))
+    return minhash
+
+
+def exact(first, second):
+    """Return the Jaccard similarity of two feature sets."""
+    union = len(first | second)
+    return len(first & second) / union if union else 0.0
+
+
+def _recipe_features(recipe):
+    """Return the feature set of a saved recipe."""
+    return features(
+        recipe.tags.values_list('id', flat=True),
+        recipe.ingredients.values_list('id', flat=True),
+    )
+
+
+def _feature_sets(recipe_ids):
+    """Return the feature sets of several recipes, read from the through tables."""
+    tags = Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids,
+    ).values_list('recipe_id', 'tag_id')
+    ingredients = Recipe.ingredients.through.objects.filter(
+        recipe_id__in=recipe_ids,
+    ).values_list('recipe_id', 'ingredient_id')
+
+    result = {recipe_id: set() for recipe_id in recipe_ids}
+    for recipe_id, tag_id in tags:
+        result[recipe_id].update(features([tag_id], []))
+    for recipe_id, ingredient_id in ingredients:
+        result[recipe_id].update(features([], [ingredient_id]))
+    return result
+
+
+@transaction.atomic
+def store_signature(recipe, feature_set=None):
+    """
+    Compute and store the signature and buckets of a recipe.
+
+    Recipes without tags or ingredients have nothing to compare and are
+    removed from the index.
+    """
+    if feature_set is None:
+        feature_set = _recipe_features(recipe)
+    RecipeBucket.objects.filter(recipe=recipe).delete()
+    if not feature_set:
+        RecipeSignature.objects.filter(recipe=recipe).delete()
+        return None
+
+    minhash = signature(feature_set)
+    RecipeSignature.objects.update_or_create(
+        recipe=recipe,
+        defaults={'minhash': minhash.tobytes()},
+    )
+    RecipeBucket.objects.bulk_create([
+        RecipeBucket(recipe=recipe, user_id=recipe.user_id, band=band, bucket=bucket)
+        for band, bucket in bands(minhash)
+    ])
+    return minhash
+
+
+def similar_recipes(recipe, limit):
+    """
+    Return up to limit (recipe_id, similarity) pairs for recipes similar to
+    the given one, most similar first.
+
+    Candidates come from shared LSH buckets and are narrowed down by their
+    estimated similarity; the reported similarity is the exact one.
+    """
+    stored = RecipeSignature.objects.filter(recipe=recipe).first()
+    if stored is None:
+        return []
+    minhash = unpack(stored.minhash)
+
+    shared_bucket = Q()
+    for band, bucket in bands(minhash):
+        shared_bucket |= Q(band=band, bucket=bucket)
+    candidate_ids = RecipeBucket.objects.filter(
+        shared_bucket,
+        user_id=recipe.user_id,
+    ).exclude(
+        recipe_id=recipe.id,
+    ).values('recipe_id')
+
+    candidates = RecipeSignature.objects.filter(
+        recipe_id__in=candidate_ids,
+    ).values_list('recipe_id', 'minhash')
+    scored = (
+        (estimate(minhash, unpack(data)), recipe_id)
+        for recipe_id, data in candidates.iterator()
+    )
+    shortlist = [
+        recipe_id
+        for _, recipe_id in heapq.nlargest(limit * RERANK_FACTOR, scored)
+    ]
+    if not shortlist:
+        return []
+
+    feature_sets = _feature_sets(shortlist + [recipe.id])
+    target = feature_sets.pop(recipe.id)
+    best = heapq.nlargest(limit, (
+        (exact(target, candidate), recipe_id)
+        for recipe_id, candidate in feature_sets.items()
+    ))
+
+    return [(recipe_id, similarity) for similarity, recipe_id in best]
+
+
+def rebuild(queryset=None, batch_size=500):
+    """Recompute signatures for all recipes in queryset and return a count."""
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    recipes = queryset.only('id', 'user_id').prefetch_related(
+        'tags',
+        'ingredients',
+    ).order_by('id')
+
+    total = 0
+    last_id = 0
+    while True:
+        batch = list(recipes.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return total
+        for recipe in batch:
+            store_signature(recipe, features(
+                [tag.id for tag in recipe.tags.all()],
+                [ingredient.id for ingredient in recipe.ingredients.all()],
+            ))
+        total += len(batch)
+        last_id = batch[-1].id
+
+
+def refresh(recipe_ids):
+    """Refresh the signatures of recipes whose tags or ingredients changed."""
+    if recipe_ids:
+        rebuild(Recipe.objects.filter(pk__in=recipe_ids))
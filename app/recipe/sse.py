@@ -0,0 +1,127 @@
+"""
+Server-sent events stream of a user's recipe changes, served on ASGI.
+
+Django 3.2 cannot stream from async views, so the stream is a plain ASGI
+application mounted next to Django in app.asgi. Clients authenticate with
+the API token, either in the Authorization header or, as EventSource
+cannot set headers, in the `token` query parameter.
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from rest_framework.authtoken.models import Token
+
+from recipe import events
+
+# Comment lines sent while idle keep proxies from closing the connection.
+HEARTBEAT_INTERVAL = getattr(settings, 'RECIPE_EVENTS_HEARTBEAT', 15)
+
+
+def _get_token(scope):
+    """Return the API token sent with a request, or None."""
+    for name, value in scope.get('headers', ()):
+        if name == b'authorization':
+            keyword, _, key = value.decode('latin-1').partition(' ')
+            if keyword.lower() == 'token' and key:
+                return key.strip()
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    return query.get('token', [None])[0]
+
+
+@sync_to_async
+def _authenticate(key):
+    """Return the ID of the active user owning a token, or None."""
+    close_old_connections()
+    try:
+        token = Token.objects.select_related('user').get(key=key)
+    except Token.DoesNotExist:
+        return None
+    finally:
+        close_old_connections()
+    return token.user_id if token.user.is_active else None
+
+
+def _format(event):
+    """Return an event in the text/event-stream format."""
+    return (
+        f'event: {event["kind"]}.{event["action"]}\n'
+        f'data: {json.dumps(event, separators=(",", ":"))}\n\n'
+    ).encode()
+
+
+async def _send_error(send, status, message):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({
+        'type': 'http.response.body',
+        'body': json.dumps({'detail': message}).encode(),
+    })
+
+
+async def _wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream(scope, receive, send):
+    """ASGI application streaming the change events of the authenticated user."""
+    if scope['method'] != 'GET':
+        await _send_error(send, 405, 'Method not allowed.')
+        return
+    key = _get_token(scope)
+    user_id = await _authenticate(key) if key else None
+    if user_id is None:
+        await _send_error(send, 401, 'Invalid or missing token.')
+        return
+
+    events.get_transport().start()
+    subscription = events.broker.subscribe(user_id)
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+    received = None
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': b': connected\n\n', 'more_body': True})
+        while True:
+            if received is None:
+                received = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait(
+                {received, disconnected},
+                timeout=HEARTBEAT_INTERVAL,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnected in done:
+                return
+            if received not in done:
+                body = b': heartbeat\n\n'
+            else:
+                event = received.result()
+                received = None
+                if event is events.EVICTED:
+                    await send({
+                        'type': 'http.response.body',
+                        'body': b'event: evicted\ndata: {}\n\n',
+                    })
+                    return
+                body = _format(event)
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        disconnected.cancel()
+        if received is not None:
+            received.cancel()
+        events.broker.unsubscribe(subscription)
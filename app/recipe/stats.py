@@ -0,0 +1,137 @@
+"""
+Aggregations over a user's recipes, computed in the database.
+"""
+from decimal import Decimal
+
+from django.db.models import (
+    Avg,
+    CharField,
+    Count,
+    Max,
+    Min,
+    Q,
+    Value,
+)
+
+from core.models import (
+    Tag,
+    Ingredient,
+)
+
+# Upper bounds (exclusive) of the time_minutes histogram buckets. The last
+# bucket collects everything from the final bound upwards.
+TIME_BUCKETS = (15, 30, 60)
+
+PRICE_PRECISION = Decimal('0.01')
+
+
+def _time_buckets():
+    """Return (key, lower, upper) tuples for the time histogram."""
+    bounds = (0,) + TIME_BUCKETS + (None,)
+    return [
+        (f'bucket_{index}', lower, upper)
+        for index, (lower, upper) in enumerate(zip(bounds, bounds[1:]))
+    ]
+
+
+def _format_price(value):
+    """Format a price the way DecimalField does in API responses."""
+    if value is None:
+        return None
+    return str(Decimal(value).quantize(PRICE_PRECISION))
+
+
+def _format_float(value):
+    """Round an average for the response payload."""
+    if value is None:
+        return None
+    return round(float(value), 2)
+
+
+def recipe_totals(recipes):
+    """
+    Return counts, price and time aggregates for a recipe queryset.
+
+    All values, including the histogram buckets, come from a single
+    aggregate query.
+    """
+    buckets = _time_buckets()
+    aggregates = {
+        'count': Count('id'),
+        'price_avg': Avg('price'),
+        'price_min': Min('price'),
+        'price_max': Max('price'),
+        'time_avg': Avg('time_minutes'),
+        'time_min': Min('time_minutes'),
+        'time_max': Max('time_minutes'),
+    }
+    for key, lower, upper in buckets:
+        condition = Q(time_minutes__gte=lower)
+        if upper is not None:
+            condition &= Q(time_minutes__lt=upper)
+        aggregates[key] = Count('id', filter=condition)
+
+    row = recipes.order_by().aggregate(**aggregates)
+
+    return {
+        'count': row['count'],
+        'price': {
+            'avg': _format_price(row['price_avg']),
+            'min': _format_price(row['price_min']),
+            'max': _format_price(row['price_max']),
+        },
+        'time_minutes': {
+            'avg': _format_float(row['time_avg']),
+            'min': row['time_min'],
+            'max': row['time_max'],
+            'histogram': [
+                {'min': lower, 'max': upper, 'count': row[key]}
+                for key, lower, upper in buckets
+            ],
+        },
+    }
+
+
+def attr_counts(recipes):
+    """
+    Return the number of recipes per tag and per ingredient.
+
+    Counts are grouped over both M2M through tables, limited to the recipes
+    in the given queryset, and combined with UNION ALL into one query.
+    Returns {'tags': [...], 'ingredients': [...]}.
+    """
+    recipe_ids = recipes.order_by().values('id')
+    kinds = {'tags': Tag, 'ingredients': Ingredient}
+    grouped = [
+        model.objects.filter(
+            recipe__in=recipe_ids,
+        ).values('id', 'name').annotate(
+            kind=Value(kind, output_field=CharField()),
+            count=Count('recipe'),
+        ).order_by()
+        for kind, model in kinds.items()
+    ]
+    rows = grouped[0].union(*grouped[1:], all=True).order_by('kind', '-count', 'name')
+
+    counts = {kind: [] for kind in kinds}
+    for row in rows:
+        counts[row.pop('kind')].append(row)
+    return counts
+
+
+def facet_counts(model, user, recipes):
+    """
+    Return every tag or ingredient of a user with its number of recipes.
+
+    Unlike attr_counts, entries without a matching recipe are kept with a
+    count of zero. The counts are a conditional aggregate over the through
+    table, so each facet takes one grouped query.
+    """
+    recipe_ids = recipes.order_by().values('id')
+    rows = model.objects.filter(
+        user=user,
+    ).values('id', 'name').annotate(
+        count=Count('recipe', filter=Q(recipe__in=recipe_ids)),
+    ).order_by('-count', 'name')
+
+    return list(rows)
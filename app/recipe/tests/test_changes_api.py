@@ -0,0 +1,214 @@
+"""
+Tests for the delta sync API.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from recipe import sync
+from recipe.serializers import (
+    RecipeDetailSerializer,
+    TagSerializer,
+)
+
+CHANGES_URL = reverse('recipe:changes')
+
+
+def create_user(email='user@example.com', password='testpass123'):
+    """Create and return a user."""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class PublicChangesApiTests(TestCase):
+    """Test unauthenticated API requests."""
+
+    def test_auth_required(self):
+        """Test auth is required to sync."""
+        res = APIClient().get(CHANGES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateChangesApiTests(TransactionTestCase):
+    """
+    Test authenticated API requests.
+
+    The changes of a transaction share a change sequence, so the writes of
+    these tests are committed rather than made in the transaction of a
+    TestCase.
+    """
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since=None):
+        params = {} if since is None else {'since': since}
+        res = self.client.get(CHANGES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.json()
+
+    def test_full_sync(self):
+        """Test syncing without a token returns every object."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = create_recipe(self.user)
+        recipe.tags.add(tag)
+        create_recipe(create_user('other@example.com'))
+
+        data = self.sync()
+
+        self.assertEqual(data['recipes'], [RecipeDetailSerializer(recipe).data])
+        self.assertEqual(data['tags'], [TagSerializer(tag).data])
+        self.assertEqual(data['ingredients'], [])
+        self.assertEqual(data['deleted'], {'recipes': [], 'tags': [], 'ingredients': []})
+
+    def test_delta_sync(self):
+        """Test syncing with a token returns only later changes."""
+        r1 = create_recipe(self.user, title='Soup')
+        r2 = create_recipe(self.user, title='Salad')
+        token = self.sync()['token']
+
+        self.assertEqual(self.sync(token)['recipes'], [])
+
+        r2.title = 'Green salad'
+        r2.save()
+        data = self.sync(token)
+
+        self.assertEqual([recipe['title'] for recipe in data['recipes']], ['Green salad'])
+        self.assertNotEqual(data['token'], token)
+        self.assertEqual(self.sync(data['token'])['recipes'], [])
+        r1.refresh_from_db()
+        self.assertLess(r1.updated_at, Recipe.objects.get(id=r2.id).updated_at)
+
+    def test_relation_changes(self):
+        """Test adding or removing tags and ingredients marks the recipe."""
+        recipe = create_recipe(self.user)
+        create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Tofu')
+        token = self.sync()['token']
+
+        recipe.tags.add(tag)
+        data = self.sync(token)
+        self.assertEqual([r['id'] for r in data['recipes']], [recipe.id])
+        self.assertEqual(data['recipes'][0]['tags'], [{'id': tag.id, 'name': 'Vegan'}])
+
+        token = data['token']
+        ingredient.recipe_set.add(recipe)
+        data = self.sync(token)
+        self.assertEqual([r['id'] for r in data['recipes']], [recipe.id])
+
+        token = data['token']
+        ingredient.recipe_set.clear()
+        data = self.sync(token)
+        self.assertEqual(data['recipes'][0]['ingredients'], [])
+
+    def test_deletes(self):
+        """Test deleted objects are reported by ID."""
+        recipe = create_recipe(self.user)
+        other = create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        other.tags.add(tag)
+        token = self.sync()['token']
+
+        recipe_id = recipe.id
+        recipe.delete()
+        tag_id = tag.id
+        tag.delete()
+        data = self.sync(token)
+
+        self.assertEqual(data['deleted'], {
+            'recipes': [recipe_id],
+            'tags': [tag_id],
+            'ingredients': [],
+        })
+        self.assertEqual([r['id'] for r in data['recipes']], [other.id])
+        self.assertEqual(data['recipes'][0]['tags'], [])
+
+    def test_api_writes(self):
+        """Test writes through the API are picked up."""
+        token = self.sync()['token']
+        payload = {
+            'title': 'Curry',
+            'time_minutes': 30,
+            'price': '7.50',
+            'tags': [{'name': 'Dinner'}],
+        }
+        res = self.client.post(reverse('recipe:recipe-list'), payload, format='json')
+        data = self.sync(token)
+
+        self.assertEqual([r['id'] for r in data['recipes']], [res.data['id']])
+        self.assertEqual([t['name'] for t in data['tags']], ['Dinner'])
+
+    def test_api_write_takes_one_change_seq(self):
+        """Test a recipe written with new tags and ingredients is stamped once."""
+        create_recipe(self.user)
+        payload = {
+            'title': 'Curry',
+            'time_minutes': 30,
+            'price': '7.50',
+            'tags': [{'name': 'Dinner'}, {'name': 'Spicy'}],
+            'ingredients': [{'name': 'Rice'}, {'name': 'Chili'}],
+        }
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(reverse('recipe:recipe-list'), payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        counter_queries = [q for q in queries.captured_queries if 'core_synccounter' in q['sql']]
+        recipe_updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "core_recipe"')]
+        self.assertEqual(len(counter_queries), 1)
+        self.assertEqual(recipe_updates, [])
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(
+            set(Tag.objects.filter(user=self.user).values_list('change_seq', flat=True)),
+            {recipe.change_seq},
+        )
+
+    def test_delta_sync_queries(self):
+        """Test the number of queries does not depend on the collection."""
+        for i in range(20):
+            create_recipe(self.user, title=f'Recipe {i}')
+        token = self.sync()['token']
+        create_recipe(self.user)
+
+        with self.assertNumQueries(7):
+            data = self.sync(token)
+
+        self.assertEqual(len(data['recipes']), 1)
+
+    def test_invalid_token(self):
+        """Test invalid tokens and tokens from the future are rejected."""
+        create_recipe(self.user)
+        future = sync.encode_token(sync.current_value(self.user) + 1)
+
+        for since in ('not-a-token', 'WyJ4Il0', future):
+            with self.subTest(since=since):
+                res = self.client.get(CHANGES_URL, {'since': since})
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,243 @@
+"""
+Tests for recipe change events and the event stream.
+"""
+import asyncio
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+)
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Tag
+from recipe import (
+    events,
+    sse,
+)
+
+
+def create_user(email='user@example.com', password='testpass123'):
+    """Create and return a user."""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+class BrokerTests(SimpleTestCase):
+    """Test the in-process broker."""
+
+    def test_fan_out(self):
+        """Test events reach every subscription of the user only."""
+        broker = events.Broker()
+
+        async def run():
+            first = broker.subscribe(1)
+            second = broker.subscribe(1)
+            other = broker.subscribe(2)
+            broker.deliver(1, {'id': 1})
+            received = [await first.get(), await second.get()]
+            return received, other.queue.qsize()
+
+        received, other_size = asyncio.run(run())
+
+        self.assertEqual(received, [{'id': 1}, {'id': 1}])
+        self.assertEqual(other_size, 0)
+
+    def test_slow_consumer_evicted(self):
+        """Test a subscription whose queue overflows is evicted."""
+        broker = events.Broker(queue_size=2)
+
+        async def run():
+            slow = broker.subscribe(1)
+            for i in range(3):
+                broker.deliver(1, {'id': i})
+            await asyncio.sleep(0)
+            return await slow.get(), len(broker)
+
+        event, subscribers = asyncio.run(run())
+
+        self.assertIs(event, events.EVICTED)
+        self.assertEqual(subscribers, 0)
+
+    def test_deliver_from_other_thread(self):
+        """Test events can be delivered from a worker thread."""
+        broker = events.Broker()
+
+        async def run():
+            subscription = broker.subscribe(1)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, broker.deliver, 1, {'id': 1})
+            return await asyncio.wait_for(subscription.get(), timeout=5)
+
+        self.assertEqual(asyncio.run(run()), {'id': 1})
+
+
+class PublishTests(TestCase):
+    """Test events published by API writes."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.published = []
+        transport = events.LocalTransport(
+            lambda user_id, event: self.published.append((user_id, event)),
+        )
+        patcher = patch.object(events, 'get_transport', return_value=transport)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_recipe_events(self):
+        """Test creating, updating and deleting a recipe publishes events."""
+        payload = {
+            'title': 'Curry',
+            'time_minutes': 30,
+            'price': Decimal('7.50'),
+            'tags': [{'name': 'Dinner'}],
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(reverse('recipe:recipe-list'), payload, format='json')
+        recipe_id = res.data['id']
+        tag_id = Tag.objects.get().id
+        url = reverse('recipe:recipe-detail', args=[recipe_id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {'title': 'Green curry'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(url)
+
+        self.assertEqual(self.published, [
+            (self.user.id, {'kind': 'tag', 'action': 'created', 'id': tag_id}),
+            (self.user.id, {'kind': 'recipe', 'action': 'created', 'id': recipe_id}),
+            (self.user.id, {'kind': 'recipe', 'action': 'updated', 'id': recipe_id}),
+            (self.user.id, {'kind': 'recipe', 'action': 'deleted', 'id': recipe_id}),
+        ])
+
+    def test_tag_events(self):
+        """Test updating and deleting a tag publishes events."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        url = reverse('recipe:tag-detail', args=[tag.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {'name': 'Vegetarian'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(url)
+
+        self.assertEqual(self.published, [
+            (self.user.id, {'kind': 'tag', 'action': 'updated', 'id': tag.id}),
+            (self.user.id, {'kind': 'tag', 'action': 'deleted', 'id': tag.id}),
+        ])
+
+    def test_not_published_on_rollback(self):
+        """Test nothing is published when the transaction does not commit."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        with self.captureOnCommitCallbacks(execute=False):
+            self.client.delete(reverse('recipe:tag-detail', args=[tag.id]))
+
+        self.assertEqual(self.published, [])
+
+
+class StreamTests(TestCase):
+    """Test the server-sent events stream."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.token = Token.objects.create(user=self.user)
+
+    def stream(self, on_message, headers=(), query_string=b''):
+        """Run the stream, calling on_message(messages) after every message."""
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': '/api/recipe/events/',
+            'headers': list(headers),
+            'query_string': query_string,
+        }
+        messages = []
+
+        async def run():
+            disconnect = asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                messages.append(message)
+                if on_message(messages):
+                    disconnect.set()
+
+            await sse.stream(scope, receive, send)
+
+        async_to_sync(run)()
+        return messages
+
+    def test_events_streamed(self):
+        """Test events of the user are sent in the event-stream format."""
+        def on_message(messages):
+            if len(messages) == 2:
+                events.broker.deliver(self.user.id, {'kind': 'recipe', 'action': 'created', 'id': 1})
+            return len(messages) == 3
+
+        authorization = f'Token {self.token.key}'.encode()
+        messages = self.stream(on_message, headers=[(b'authorization', authorization)])
+
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), messages[0]['headers'])
+        body = messages[2]['body'].decode()
+        self.assertTrue(body.startswith('event: recipe.created\ndata: '))
+        self.assertEqual(
+            json.loads(body.split('data: ')[1]),
+            {'kind': 'recipe', 'action': 'created', 'id': 1},
+        )
+        self.assertEqual(len(events.broker), 0)
+
+    def test_slow_consumer_evicted(self):
+        """Test the stream ends when the client falls too far behind."""
+        def on_message(messages):
+            if len(messages) == 2:
+                for i in range(3):
+                    events.broker.deliver(self.user.id, {'kind': 'tag', 'action': 'updated', 'id': i})
+            return False
+
+        with patch.object(events, 'broker', events.Broker(queue_size=2)):
+            messages = self.stream(
+                on_message,
+                query_string=f'token={self.token.key}'.encode(),
+            )
+
+        self.assertEqual(messages[-1]['body'], b'event: evicted\ndata: {}\n\n')
+        self.assertFalse(messages[-1].get('more_body'))
+
+    def test_auth_required(self):
+        """Test the stream requires a valid token."""
+        messages = self.stream(lambda messages: False, query_string=b'token=invalid')
+
+        self.assertEqual(messages[0]['status'], 401)
+
+    def test_mounted_on_asgi(self):
+        """Test the ASGI application routes the events path to the stream."""
+        from app.asgi import application
+
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': '/api/recipe/events/',
+            'headers': [],
+            'query_string': b'',
+        }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+
+        async_to_sync(application)(scope, receive, send)
+
+        self.assertEqual(messages[0]['status'], 401)
@@ -0,0 +1,112 @@
+"""
+Parity tests for the fast read serialization path.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL."""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class FastSerializationParityTests(TestCase):
+    """Test fast responses match the ModelSerializer output byte for byte."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Vegan', 'Quick', 'Café "special"')
+        ]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Tofu', 'Rice', 'Ünïcode ✓')
+        ]
+        samples = [
+            ('Tofu bowl', 15, Decimal('7.5'), 'https://example.com', 'Tasty'),
+            ('Plain rice', 20, Decimal('0.05'), '', ''),
+            ('Feast', 240, Decimal('999.99'), '', 'Line one\nline two'),
+            ('Snack', 1, Decimal('1.00'), 'x', '<b>bold</b>'),
+        ]
+        for index, (title, minutes, price, link, description) in enumerate(samples):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=title,
+                time_minutes=minutes,
+                price=price,
+                link=link,
+                description=description,
+            )
+            recipe.tags.add(*reversed(tags[:index]))
+            recipe.ingredients.add(*ingredients[index % 3:])
+        self.recipe = recipe
+
+    def assertParity(self, url, params=None):
+        """Assert a GET response is identical with and without the fast path."""
+        fast = self.client.get(url, params)
+        with override_settings(RECIPE_FAST_SERIALIZATION=False):
+            slow = self.client.get(url, params)
+
+        self.assertEqual(fast.status_code, slow.status_code)
+        self.assertEqual(fast.content, slow.content)
+
+    def test_recipe_list_parity(self):
+        """Test the recipe list matches."""
+        self.assertParity(RECIPES_URL)
+
+    def test_recipe_detail_parity(self):
+        """Test the recipe detail matches."""
+        self.assertParity(detail_url(self.recipe.id))
+
+    def test_recipe_detail_not_found_parity(self):
+        """Test missing and malformed recipe IDs match."""
+        self.assertParity(detail_url(self.recipe.id + 100))
+        self.assertParity(f'{RECIPES_URL}abc/')
+
+    def test_sparse_fields_parity(self):
+        """Test sparse fieldsets and expansion match."""
+        self.assertParity(RECIPES_URL, {'fields': 'id,title,time_minutes'})
+        self.assertParity(RECIPES_URL, {'fields': 'price,tags', 'expand': ''})
+        self.assertParity(detail_url(self.recipe.id), {'expand': 'ingredients'})
+
+    def test_filtered_and_ordered_parity(self):
+        """Test filtered, searched and ordered lists match."""
+        tag = Tag.objects.get(name='Quick')
+        self.assertParity(RECIPES_URL, {'tags': f'{tag.id}', 'ordering': 'price'})
+        self.assertParity(RECIPES_URL, {'search': 'rice', 'time_max': 100})
+
+    def test_paginated_parity(self):
+        """Test every page of a paginated list matches."""
+        params = {'ordering': '-price', 'page_size': 3}
+        self.assertParity(RECIPES_URL, params)
+        res = self.client.get(RECIPES_URL, params)
+        self.assertParity(res.data['next'])
+
+    def test_tag_and_ingredient_list_parity(self):
+        """Test the tag and ingredient lists match."""
+        self.assertParity(TAGS_URL)
+        self.assertParity(TAGS_URL, {'assigned_only': 1, 'fields': 'name'})
+        self.assertParity(INGREDIENTS_URL, {'ordering': '-recipe_count'})
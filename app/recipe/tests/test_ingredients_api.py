@@ -2,8 +2,10 @@
 Tests for the ingredients API.
 """
 from decimal import Decimal
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.urls import reverse
 from django.test import TestCase
 
@@ -15,10 +17,12 @@ from core.models import (
     Recipe,
 )
 
+from recipe import autocomplete
 from recipe.serializers import IngredientSerializer
 
 
 INGREDIENTS_URL = reverse('recipe:ingredient-list')
+AUTOCOMPLETE_URL = reverse('recipe:ingredient-autocomplete')
 
 
 def detail_url(ingredient_id):
@@ -48,6 +52,7 @@ class PrivateIngredientsApiTests(TestCase):
     """Test authenticated API requests."""
 
     def setUp(self):
+        cache.clear()
         self.user = create_user()
         self.client = APIClient()
         self.client.force_authenticate(self.user)
@@ -141,3 +146,55 @@ class PrivateIngredientsApiTests(TestCase):
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
         self.assertEqual(len(res.data), 1)
+
+    def test_autocomplete_ingredients(self):
+        """Test prefix matches are case-insensitive and ranked by use."""
+        garlic = Ingredient.objects.create(user=self.user, name='Garlic')
+        ginger = Ingredient.objects.create(user=self.user, name='ginger')
+        Ingredient.objects.create(user=self.user, name='Basil')
+        other_user = create_user(email='other@example.com')
+        Ingredient.objects.create(user=other_user, name='Gin')
+        recipe = Recipe.objects.create(
+            title='Stir Fry',
+            time_minutes=15,
+            price=Decimal('6.00'),
+            user=self.user,
+        )
+        recipe.ingredients.add(ginger)
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'G'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'id': ginger.id, 'name': 'ginger'},
+            {'id': garlic.id, 'name': 'Garlic'},
+        ])
+
+    def test_autocomplete_limit_and_refresh(self):
+        """Test autocomplete honours limit and sees updated names."""
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        Ingredient.objects.create(user=self.user, name='Saffron')
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'sa', 'limit': 1})
+        self.assertEqual(len(res.data), 1)
+
+        self.client.patch(detail_url(ingredient.id), {'name': 'Pepper'})
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'pep'})
+
+        self.assertEqual(res.data, [{'id': ingredient.id, 'name': 'Pepper'}])
+
+    def test_autocomplete_invalid_limit(self):
+        """Test a non-integer autocomplete limit is rejected."""
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'sa', 'limit': 'many'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch.object(autocomplete.index_cache, 'maxsize', 0)
+    def test_autocomplete_without_cache(self):
+        """Test autocomplete falls back to a database prefix query."""
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        Ingredient.objects.create(user=self.user, name='Pepper')
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'sA'})
+
+        self.assertEqual(res.data, [{'id': salt.id, 'name': 'Salt'}])
@@ -2,27 +2,40 @@
 Tests for recipe APIs.
 """
 from decimal import Decimal
+from io import StringIO
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from core import msgpack
 from core.models import (
     Recipe,
+    RecipeSignature,
     Tag,
     Ingredient,
 )
+from core.parsers import MessagePackParser
 
+from recipe import similarity
+from recipe.pagination import KeysetPagination
 from recipe.serializers import (
     RecipeSerializer,
     RecipeDetailSerializer,
 )
+from recipe.views import FILTER_MAX_IDS
 
 
 RECIPES_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk-retrieve')
+STATS_URL = reverse('recipe:recipe-stats')
+FACETS_URL = reverse('recipe:recipe-facets')
+COOKABLE_URL = reverse('recipe:recipe-cookable')
 
 
 def detail_url(recipe_id):
@@ -30,6 +43,11 @@ def detail_url(recipe_id):
     return reverse('recipe:recipe-detail', args=[recipe_id])
 
 
+def similar_url(recipe_id):
+    """Create and return a similar recipes URL."""
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
 def create_recipe(user, **params):
     """Create and return a sample recipe."""
     defaults = {
@@ -66,6 +84,7 @@ class PrivateRecipeApiTests(TestCase):
     """Test authenticated API requests."""
 
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.user = create_user(
             email='user@example.com',
@@ -126,6 +145,43 @@ class PrivateRecipeApiTests(TestCase):
             self.assertEqual(getattr(recipe, k), v)
         self.assertEqual(recipe.user, self.user)
 
+    def test_create_recipe_idempotent(self):
+        """Test retrying a create with an Idempotency-Key replays the response."""
+        payload = {
+            'title': 'Sample recipe',
+            'time_minutes': 30,
+            'price': Decimal('5.99'),
+        }
+        first = self.client.post(RECIPES_URL, payload, HTTP_IDEMPOTENCY_KEY='abc')
+        second = self.client.post(RECIPES_URL, payload, HTTP_IDEMPOTENCY_KEY='abc')
+
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertFalse(first.has_header('Idempotent-Replayed'))
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_create_recipe_idempotency_key_reused(self):
+        """Test reusing an Idempotency-Key for another payload is rejected."""
+        payload = {'title': 'Sample recipe', 'time_minutes': 30, 'price': Decimal('5.99')}
+        self.client.post(RECIPES_URL, payload, HTTP_IDEMPOTENCY_KEY='abc')
+        payload['title'] = 'Other recipe'
+        res = self.client.post(RECIPES_URL, payload, HTTP_IDEMPOTENCY_KEY='abc')
+
+        self.assertEqual(res.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_filter_ids_validated(self):
+        """Test invalid or too many filter IDs are rejected."""
+        res = self.client.get(RECIPES_URL, {'tags': '1,x'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('tags', res.data)
+
+        ids = ','.join(str(i) for i in range(FILTER_MAX_IDS + 1))
+        res = self.client.get(RECIPES_URL, {'ingredients': ids})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ingredients', res.data)
+
     def test_partial_update(self):
         """Test partial update of a recipe."""
         original_link = 'https://example.com/recipe.pdf'
@@ -414,3 +470,520 @@ class PrivateRecipeApiTests(TestCase):
         self.assertIn(s1.data, res.data)
         self.assertIn(s2.data, res.data)
         self.assertNotIn(s3.data, res.data)
+
+    def test_recipe_stats(self):
+        """Test retrieving aggregate statistics for recipes."""
+        tag = Tag.objects.create(user=self.user, name='Quick')
+        ingredient = Ingredient.objects.create(user=self.user, name='Egg')
+        r1 = create_recipe(user=self.user, time_minutes=10, price=Decimal('2.00'))
+        r2 = create_recipe(user=self.user, time_minutes=45, price=Decimal('5.00'))
+        r1.tags.add(tag)
+        r1.ingredients.add(ingredient)
+        r2.ingredients.add(ingredient)
+        other_user = create_user(email='other@example.com', password='test123')
+        create_recipe(user=other_user, price=Decimal('99.00'))
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 2)
+        self.assertEqual(res.data['price']['avg'], '3.50')
+        self.assertEqual(res.data['price']['max'], '5.00')
+        self.assertEqual(res.data['time_minutes']['min'], 10)
+        histogram = [bucket['count'] for bucket in res.data['time_minutes']['histogram']]
+        self.assertEqual(histogram, [1, 0, 1, 0])
+        self.assertEqual(
+            res.data['tags'],
+            [{'id': tag.id, 'name': 'Quick', 'count': 1}],
+        )
+        self.assertEqual(
+            res.data['ingredients'],
+            [{'id': ingredient.id, 'name': 'Egg', 'count': 2}],
+        )
+
+    def test_recipe_stats_bounded_queries(self):
+        """Test recipe statistics take two queries."""
+        tag = Tag.objects.create(user=self.user, name='Quick')
+        ingredient = Ingredient.objects.create(user=self.user, name='Egg')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+
+        with self.assertNumQueries(2):
+            res = self.client.get(STATS_URL)
+
+        self.assertEqual(len(res.data['tags']), 1)
+        self.assertEqual(len(res.data['ingredients']), 1)
+
+    def test_recipe_stats_filtered(self):
+        """Test recipe statistics honour the tag filter."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        r1 = create_recipe(user=self.user, price=Decimal('4.00'))
+        r1.tags.add(tag)
+        create_recipe(user=self.user, price=Decimal('8.00'))
+
+        res = self.client.get(STATS_URL, {'tags': f'{tag.id}'})
+
+        self.assertEqual(res.data['count'], 1)
+        self.assertEqual(res.data['price']['avg'], '4.00')
+
+    def test_recipe_stats_updated_after_write(self):
+        """Test cached recipe statistics are refreshed after a write."""
+        create_recipe(user=self.user)
+        res = self.client.get(STATS_URL)
+        self.assertEqual(res.data['count'], 1)
+
+        payload = {
+            'title': 'Sample recipe',
+            'time_minutes': 30,
+            'price': Decimal('5.99'),
+        }
+        self.client.post(RECIPES_URL, payload)
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['count'], 2)
+
+    def test_recipe_facets(self):
+        """Test facet counts for the filtered recipes."""
+        tag_vegan = Tag.objects.create(user=self.user, name='Vegan')
+        tag_dinner = Tag.objects.create(user=self.user, name='Dinner')
+        tag_unused = Tag.objects.create(user=self.user, name='Unused')
+        tofu = Ingredient.objects.create(user=self.user, name='Tofu')
+        r1 = create_recipe(user=self.user)
+        r2 = create_recipe(user=self.user)
+        r3 = create_recipe(user=self.user)
+        r1.tags.add(tag_vegan, tag_dinner)
+        r2.tags.add(tag_vegan)
+        r3.tags.add(tag_dinner)
+        r1.ingredients.add(tofu)
+
+        res = self.client.get(FACETS_URL, {'tags': f'{tag_vegan.id}'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'], [
+            {'id': tag_vegan.id, 'name': 'Vegan', 'count': 2},
+            {'id': tag_dinner.id, 'name': 'Dinner', 'count': 1},
+            {'id': tag_unused.id, 'name': 'Unused', 'count': 0},
+        ])
+        self.assertEqual(
+            res.data['ingredients'],
+            [{'id': tofu.id, 'name': 'Tofu', 'count': 1}],
+        )
+
+    def test_recipe_facets_bounded_queries(self):
+        """Test facet counts use a fixed number of queries."""
+        for name in ('One', 'Two', 'Three'):
+            tag = Tag.objects.create(user=self.user, name=name)
+            create_recipe(user=self.user).tags.add(tag)
+
+        with self.assertNumQueries(2):
+            res = self.client.get(FACETS_URL)
+
+        self.assertEqual(len(res.data['tags']), 3)
+
+    def test_search_recipes(self):
+        """Test searching recipes by title and description."""
+        r1 = create_recipe(user=self.user, title='Lemon Chicken')
+        r2 = create_recipe(
+            user=self.user,
+            title='Roast dinner',
+            description='Chicken with roast potatoes.',
+        )
+        r3 = create_recipe(user=self.user, title='Fruit salad')
+
+        res = self.client.get(RECIPES_URL, {'search': 'chicken'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([recipe['id'] for recipe in res.data], [r1.id, r2.id])
+        self.assertNotIn(RecipeSerializer(r3).data, res.data)
+
+    def test_search_ranks_title_matches_first(self):
+        """Test title matches rank above description matches."""
+        r1 = create_recipe(user=self.user, title='Soup', description='Tomato base')
+        r2 = create_recipe(user=self.user, title='Tomato soup')
+
+        res = self.client.get(RECIPES_URL, {'search': 'tomato soup'})
+
+        self.assertEqual([recipe['id'] for recipe in res.data], [r2.id, r1.id])
+
+    def test_search_combined_with_tags(self):
+        """Test search composes with the tag filter."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        r1 = create_recipe(user=self.user, title='Vegan curry')
+        r1.tags.add(tag)
+        create_recipe(user=self.user, title='Chicken curry')
+
+        params = {'search': 'curry', 'tags': f'{tag.id}'}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual([recipe['id'] for recipe in res.data], [r1.id])
+
+    def test_cookable_ranks_by_missing_ingredients(self):
+        """Test recipes are ranked by the number of missing ingredients."""
+        egg = Ingredient.objects.create(user=self.user, name='Egg')
+        flour = Ingredient.objects.create(user=self.user, name='Flour')
+        milk = Ingredient.objects.create(user=self.user, name='Milk')
+        sugar = Ingredient.objects.create(user=self.user, name='Sugar')
+        omelette = create_recipe(user=self.user, title='Omelette')
+        omelette.ingredients.add(egg)
+        pancakes = create_recipe(user=self.user, title='Pancakes')
+        pancakes.ingredients.add(egg, flour, milk)
+        cake = create_recipe(user=self.user, title='Cake')
+        cake.ingredients.add(egg, flour, milk, sugar)
+        toast = create_recipe(user=self.user, title='Toast')
+        toast.ingredients.add(flour)
+
+        params = {'ingredients': f'{egg.id}', 'names': 'milk'}
+        res = self.client.get(COOKABLE_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['recipe']['id'] for item in res.data],
+            [omelette.id, pancakes.id, cake.id],
+        )
+        self.assertEqual(res.data[1]['missing_ingredients'], [flour.id])
+        self.assertEqual(res.data[0]['recipe'], RecipeSerializer(omelette).data)
+
+    def test_cookable_max_missing(self):
+        """Test filtering cookable recipes by missing ingredients."""
+        egg = Ingredient.objects.create(user=self.user, name='Egg')
+        flour = Ingredient.objects.create(user=self.user, name='Flour')
+        omelette = create_recipe(user=self.user, title='Omelette')
+        omelette.ingredients.add(egg)
+        bread = create_recipe(user=self.user, title='Egg bread')
+        bread.ingredients.add(egg, flour)
+
+        params = {'ingredients': f'{egg.id}', 'max_missing': 0}
+        res = self.client.get(COOKABLE_URL, params)
+
+        self.assertEqual([item['recipe']['id'] for item in res.data], [omelette.id])
+
+    def test_cookable_invalid_params(self):
+        """Test non-integer cookable parameters are rejected."""
+        for params in ({'limit': 'all'}, {'max_missing': 'one'}):
+            res = self.client.get(COOKABLE_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cookable_follows_recipe_writes(self):
+        """Test the cookable index reflects created, updated and deleted recipes."""
+        egg = Ingredient.objects.create(user=self.user, name='Egg')
+        params = {'ingredients': f'{egg.id}'}
+        res = self.client.get(COOKABLE_URL, params)
+        self.assertEqual(res.data, [])
+
+        payload = {
+            'title': 'Omelette',
+            'time_minutes': 5,
+            'price': Decimal('1.50'),
+            'ingredients': [{'name': 'Egg'}],
+        }
+        res = self.client.post(RECIPES_URL, payload, format='json')
+        recipe_id = res.data['id']
+        res = self.client.get(COOKABLE_URL, params)
+        self.assertEqual([item['recipe']['id'] for item in res.data], [recipe_id])
+
+        payload = {'ingredients': [{'name': 'Egg'}, {'name': 'Cheese'}]}
+        self.client.patch(detail_url(recipe_id), payload, format='json')
+        res = self.client.get(COOKABLE_URL, params)
+        cheese = Ingredient.objects.get(user=self.user, name='Cheese')
+        self.assertEqual(res.data[0]['missing_ingredients'], [cheese.id])
+
+        self.client.delete(detail_url(recipe_id))
+        res = self.client.get(COOKABLE_URL, params)
+        self.assertEqual(res.data, [])
+
+    def test_similar_recipes(self):
+        """Test similar recipes are ranked by shared tags and ingredients."""
+        def create(title, ingredients):
+            payload = {
+                'title': title,
+                'time_minutes': 20,
+                'price': Decimal('3.00'),
+                'ingredients': [{'name': name} for name in ingredients],
+            }
+            res = self.client.post(RECIPES_URL, payload, format='json')
+            return res.data['id']
+
+        base = create('Pancakes', ['Egg', 'Flour', 'Milk', 'Butter'])
+        close = create('Crepes', ['Egg', 'Flour', 'Milk', 'Sugar'])
+        create('Omelette', ['Egg', 'Cheese', 'Ham', 'Chives'])
+        create('Salad', ['Lettuce', 'Tomato'])
+
+        res = self.client.get(similar_url(base))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]['recipe']['id'], close)
+        self.assertAlmostEqual(res.data[0]['similarity'], 3 / 5)
+
+    def test_similar_recipes_other_user(self):
+        """Test similar recipes of another user's recipe are not found."""
+        other_user = create_user(email='other@example.com', password='test123')
+        recipe = create_recipe(user=other_user)
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_similar_recipes_invalid_limit(self):
+        """Test a non-integer limit of similar recipes is rejected."""
+        recipe = create_recipe(user=self.user)
+
+        res = self.client.get(similar_url(recipe.id), {'limit': 'ten'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_signatures_follow_deleted_ingredients(self):
+        """Test deleting an ingredient refreshes the recipes using it."""
+        egg = Ingredient.objects.create(user=self.user, name='Egg')
+        flour = Ingredient.objects.create(user=self.user, name='Flour')
+        recipe = create_recipe(user=self.user)
+        recipe.ingredients.add(egg, flour)
+
+        self.client.delete(reverse('recipe:ingredient-detail', args=[flour.id]))
+
+        stored = RecipeSignature.objects.get(recipe=recipe)
+        self.assertEqual(
+            list(similarity.unpack(stored.minhash)),
+            list(similarity.signature(similarity.features([], [egg.id]))),
+        )
+
+        egg.delete()
+
+        self.assertFalse(RecipeSignature.objects.filter(recipe=recipe).exists())
+
+    def test_rebuild_recipe_signatures(self):
+        """Test the rebuild command recomputes recipe signatures."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag)
+        create_recipe(user=self.user)
+
+        call_command('rebuild_recipe_signatures', stdout=StringIO())
+
+        stored = RecipeSignature.objects.get(recipe=recipe)
+        self.assertEqual(
+            list(similarity.unpack(stored.minhash)),
+            list(similarity.signature(similarity.features([tag.id], []))),
+        )
+        self.assertEqual(RecipeSignature.objects.count(), 1)
+
+    def test_filter_by_price_and_time(self):
+        """Test filtering recipes by price range and maximum time."""
+        r1 = create_recipe(user=self.user, price=Decimal('4.00'), time_minutes=15)
+        create_recipe(user=self.user, price=Decimal('4.00'), time_minutes=40)
+        create_recipe(user=self.user, price=Decimal('9.00'), time_minutes=10)
+        create_recipe(user=self.user, price=Decimal('1.00'), time_minutes=10)
+
+        params = {'price_min': '2', 'price_max': '5.50', 'time_max': 20}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([recipe['id'] for recipe in res.data], [r1.id])
+
+    def test_invalid_range_filter(self):
+        """Test an invalid range filter returns a validation error."""
+        res = self.client.get(RECIPES_URL, {'price_min': 'cheap'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_out_of_range_filter(self):
+        """Test an integer filter out of the column range is rejected."""
+        res = self.client.get(RECIPES_URL, {'time_max': '99999999999999999999999'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_order_recipes(self):
+        """Test ordering recipes by price, cheapest first."""
+        r1 = create_recipe(user=self.user, price=Decimal('6.00'))
+        r2 = create_recipe(user=self.user, price=Decimal('2.00'))
+        r3 = create_recipe(user=self.user, price=Decimal('6.00'))
+
+        res = self.client.get(RECIPES_URL, {'ordering': 'price'})
+
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data],
+            [r2.id, r1.id, r3.id],
+        )
+
+    def test_keyset_pagination(self):
+        """Test paging through recipes with a cursor."""
+        recipes = [
+            create_recipe(user=self.user, time_minutes=minutes)
+            for minutes in (30, 10, 20, 10, 50)
+        ]
+        expected = [
+            recipe.id for recipe in
+            sorted(recipes, key=lambda r: (-r.time_minutes, -r.id))
+        ]
+
+        params = {'ordering': '-time_minutes', 'page_size': 2}
+        res = self.client.get(RECIPES_URL, params)
+        seen = [recipe['id'] for recipe in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            seen += [recipe['id'] for recipe in res.data['results']]
+
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor(self):
+        """Test an invalid cursor returns a validation error."""
+        res = self.client.get(RECIPES_URL, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_cursor_values(self):
+        """Test cursor values not matching the ordering are rejected."""
+        create_recipe(user=self.user)
+        encode = KeysetPagination().encode_cursor
+
+        for ordering, values in (
+            ('-id', ['abc']),
+            ('-id', [{}]),
+            ('-id', [None]),
+            ('-id', [10 ** 30]),
+            ('price', ['x', 1]),
+        ):
+            params = {'ordering': ordering, 'cursor': encode(values)}
+            res = self.client.get(RECIPES_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST, values)
+
+    def test_keyset_pagination_of_search_results(self):
+        """Test paging through search results ordered by relevance."""
+        r1 = create_recipe(user=self.user, title='Soup', description='Tomato')
+        r2 = create_recipe(user=self.user, title='Tomato soup')
+        r3 = create_recipe(user=self.user, title='Tomato salad')
+
+        res = self.client.get(RECIPES_URL, {'search': 'tomato', 'page_size': 1})
+        seen = [recipe['id'] for recipe in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            seen += [recipe['id'] for recipe in res.data['results']]
+
+        self.assertEqual(seen, [r3.id, r2.id, r1.id])
+
+    def test_sparse_fields(self):
+        """Test limiting the recipe list to requested fields."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = create_recipe(user=self.user, title='Curry', time_minutes=25)
+        recipe.tags.add(tag)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL, {'fields': 'id,title,time_minutes'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.json(),
+            [{'id': recipe.id, 'title': 'Curry', 'time_minutes': 25}],
+        )
+
+    def test_expand_relations(self):
+        """Test relations not listed in expand are rendered as IDs."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Tofu')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+
+        params = {'fields': 'id,tags,ingredients', 'expand': 'tags'}
+        res = self.client.get(detail_url(recipe.id), params)
+
+        self.assertEqual(res.json(), {
+            'id': recipe.id,
+            'tags': [{'id': tag.id, 'name': 'Vegan'}],
+            'ingredients': [ingredient.id],
+        })
+
+    def test_list_prefetches_relations(self):
+        """Test the recipe list loads relations in a fixed number of queries."""
+        for _ in range(3):
+            recipe = create_recipe(user=self.user)
+            recipe.tags.add(Tag.objects.create(user=self.user, name='Tag'))
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name='Ingredient'),
+            )
+
+        with self.assertNumQueries(3):
+            self.client.get(RECIPES_URL)
+
+    def test_sparse_fields_ignored_on_write(self):
+        """Test the fields parameter does not restrict writes."""
+        payload = {
+            'title': 'Sample recipe',
+            'time_minutes': 30,
+            'price': Decimal('5.99'),
+        }
+        url = f'{RECIPES_URL}?fields=id'
+        res = self.client.post(url, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['title'], payload['title'])
+
+    def test_list_recipes_msgpack(self):
+        """Test the recipe list negotiated as MessagePack."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = create_recipe(user=self.user, price=Decimal('12.05'))
+        recipe.tags.add(tag)
+
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+        data = msgpack.unpackb(res.content, ext_hook=MessagePackParser._ext_hook)
+        self.assertEqual(data, [{
+            'id': recipe.id,
+            'title': recipe.title,
+            'time_minutes': recipe.time_minutes,
+            'price': Decimal('12.05'),
+            'link': recipe.link,
+            'tags': [{'id': tag.id, 'name': 'Vegan'}],
+            'ingredients': [],
+        }])
+
+    def test_create_recipe_msgpack(self):
+        """Test creating a recipe from a MessagePack body."""
+        payload = {
+            'title': 'Sample recipe',
+            'time_minutes': 30,
+            'price': Decimal('5.99'),
+            'tags': [{'name': 'Dinner'}],
+        }
+        res = self.client.post(
+            RECIPES_URL,
+            msgpack.packb(payload, default=msgpack.pack_decimal),
+            content_type='application/msgpack',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.price, Decimal('5.99'))
+        self.assertEqual(recipe.tags.get().name, 'Dinner')
+
+    def test_bulk_retrieve(self):
+        """Test retrieving several recipes by ID in one request."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        r1 = create_recipe(user=self.user, title='Soup')
+        r2 = create_recipe(user=self.user, title='Salad')
+        r1.tags.add(tag)
+        other = create_recipe(user=create_user(email='other@example.com', password='pass123'))
+
+        ids = f'{r2.id},{other.id},{r1.id},999999,{r2.id}'
+        with self.assertNumQueries(3):
+            res = self.client.get(BULK_URL, {'ids': ids})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [
+            RecipeDetailSerializer(r2).data,
+            RecipeDetailSerializer(r1).data,
+        ])
+        self.assertEqual(res.data['missing'], [other.id, 999999])
+
+    def test_bulk_retrieve_invalid_ids(self):
+        """Test invalid, missing or too many IDs are rejected."""
+        too_many = ','.join(str(i) for i in range(1, 502))
+        for params in ({}, {'ids': 'a,b'}, {'ids': too_many}):
+            with self.subTest(params=params):
+                res = self.client.get(BULK_URL, params)
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -141,3 +141,36 @@ class PRivateTagsApiTests(TestCase):
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
         self.assertEqual(len(res.data), 1)
+
+    def test_order_tags_by_popularity(self):
+        """Test ordering tags by the number of recipes using them."""
+        rare = Tag.objects.create(user=self.user, name='Rare')
+        common = Tag.objects.create(user=self.user, name='Common')
+        for title in ('Pancakes', 'Porridge'):
+            recipe = Recipe.objects.create(
+                title=title,
+                time_minutes=5,
+                price=Decimal('2.00'),
+                user=self.user,
+            )
+            recipe.tags.add(common)
+        recipe.tags.add(rare)
+
+        res = self.client.get(TAGS_URL, {'ordering': '-recipe_count'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag['id'] for tag in res.data], [common.id, rare.id])
+
+    def test_invalid_ordering_rejected(self):
+        """Test an unknown tag ordering is rejected like a recipe one."""
+        res = self.client.get(TAGS_URL, {'ordering': 'colour'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tags_sparse_fields(self):
+        """Test limiting the tag list to requested fields."""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.get(TAGS_URL, {'fields': 'name'})
+
+        self.assertEqual(res.json(), [{'name': 'Vegan'}])
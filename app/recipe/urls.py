@@ -19,5 +19,6 @@ router.register('ingredients', views.IngredientViewSet)
 app_name = 'recipe'
 
 urlpatterns = [
+    path('changes/', views.ChangesView.as_view(), name='changes'),
     path('', include(router.urls)),
 ]
@@ -1,104 +1,731 @@
 """
 Views for the recipe APIs
 """
-from drf_spectacular.utils import (
-    extend_schema_view,
-    extend_schema,
-    OpenApiParameter,
-    OpenApiTypes,
-)
+import hashlib
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Prefetch
+from django.db.models.functions import Lower
+from django.http import Http404
+from django.utils.translation import gettext as _
+
 from rest_framework import (
     viewsets,
     mixins,
+    views,
 )
 from rest_framework.authentication import TokenAuthentication
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 
+from core.idempotency import (
+    HEADER_PARAMETER as IDEMPOTENCY_KEY_PARAMETER,
+    IdempotentCreateMixin,
+)
 from core.models import (
     Recipe,
     Tag,
     Ingredient,
 )
-from recipe import serializers
+from core.schema import (
+    OpenApiParameter,
+    OpenApiTypes,
+    extend_schema,
+    extend_schema_view,
+)
+from core.timeouts import StatementTimeoutMixin
+from recipe import (
+    autocomplete,
+    events,
+    fast,
+    pantry,
+    serializers,
+    similarity,
+    stats,
+    sync,
+)
+from recipe.pagination import KeysetPagination
+from recipe.search import search_recipes
+from recipe.cache import (
+    bump_data_version,
+    get_data_version,
+)
+
+# Cached stats are keyed by data version, so the timeout only bounds memory.
+STATS_CACHE_TIMEOUT = 60 * 60
+
+# Accepted values of the tag/ingredient 'ordering' parameter, mapped to
+# order_by() arguments.
+RECIPE_ATTR_ORDERINGS = {
+    '-name': ('-name',),
+    'name': ('name',),
+    '-recipe_count': ('-recipe_count', 'name'),
+    'recipe_count': ('recipe_count', 'name'),
+}
+
+COOKABLE_DEFAULT_LIMIT = 50
+COOKABLE_MAX_LIMIT = 200
+
+SIMILAR_DEFAULT_LIMIT = 10
+SIMILAR_MAX_LIMIT = 50
+
+# Most recipes returned by one bulk_retrieve request.
+BULK_RETRIEVE_MAX_IDS = 500
+
+# Most IDs accepted by the 'tags' and 'ingredients' filters.
+FILTER_MAX_IDS = 200
+
+# Range of the values of IntegerField columns.
+INTEGER_RANGE = (-2 ** 31, 2 ** 31 - 1)
+
+# Accepted values of the recipe 'ordering' parameter, mapped to order_by()
+# arguments. The ID tie-breaker makes every ordering usable for keyset
+# pagination and matches the (user_id, column, id) indexes.
+RECIPE_ORDERINGS = {
+    '-id': ('-id',),
+    'id': ('id',),
+    'price': ('price', 'id'),
+    '-price': ('-price', '-id'),
+    'time_minutes': ('time_minutes', 'id'),
+    '-time_minutes': ('-time_minutes', '-id'),
+    'title': ('title', 'id'),
+    '-title': ('-title', '-id'),
+}
+
+
+def _int_param(request, name, default=None, bounds=None):
+    """
+    Return a query parameter as an integer, or default if not given.
+
+    bounds is an optional (minimum, maximum) pair the value must be within.
+    """
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValidationError({name: _('A valid integer is required.')})
+    if bounds is not None and not bounds[0] <= number <= bounds[1]:
+        raise ValidationError({
+            name: _('Ensure this value is between %(min)d and %(max)d.') % {
+                'min': bounds[0],
+                'max': bounds[1],
+            },
+        })
+    return number
+
+
+RECIPE_FILTER_PARAMETERS = [
+    OpenApiParameter(
+        'tags',
+        OpenApiTypes.STR,
+        description=f'Comma separated list of up to {FILTER_MAX_IDS} tag IDs to filter',
+    ),
+    OpenApiParameter(
+        'ingredients',
+        OpenApiTypes.STR,
+        description=f'Comma separated list of up to {FILTER_MAX_IDS} ingredient IDs to filter',
+    ),
+    OpenApiParameter(
+        'search',
+        OpenApiTypes.STR,
+        description='Full-text search over recipe titles and descriptions',
+    ),
+    OpenApiParameter(
+        'price_min',
+        OpenApiTypes.DECIMAL,
+        description='Only include recipes costing at least this price',
+    ),
+    OpenApiParameter(
+        'price_max',
+        OpenApiTypes.DECIMAL,
+        description='Only include recipes costing at most this price',
+    ),
+    OpenApiParameter(
+        'time_max',
+        OpenApiTypes.INT,
+        description='Only include recipes taking at most this many minutes',
+    ),
+]
+
+
+SPARSE_FIELDS_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description='Comma separated list of fields to include',
+    ),
+]
+
+RECIPE_EXPAND_PARAMETERS = [
+    OpenApiParameter(
+        'expand',
+        OpenApiTypes.STR,
+        description=(
+            'Comma separated list of relations (tags, ingredients) to nest. '
+            'When given, other relations are returned as lists of IDs.'
+        ),
+    ),
+]
+
+
+class FastReadMixin:
+    """
+    Viewset mixin serving list and retrieve through recipe.fast.
+
+    Responses match the serializer of the action, but rows are read with
+    values() and turned into dicts without DRF field machinery.
+    """
+
+    def _fast_serializer(self):
+        return fast.FastSerializer(self.get_serializer())
+
+    def list(self, request, *args, **kwargs):
+        if not fast.enabled():
+            return super().list(request, *args, **kwargs)
+
+        builder = self._fast_serializer()
+        rows = builder.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(builder.render(page))
+
+        return Response(builder.render(rows))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not fast.enabled():
+            return super().retrieve(request, *args, **kwargs)
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        builder = self._fast_serializer()
+        try:
+            rows = builder.rows(self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]},
+            ))
+            data = builder.render(rows)
+        except (TypeError, ValueError, DjangoValidationError):
+            raise Http404
+        if not data:
+            raise Http404
+
+        return Response(data[0])
+
+
+class SparseFieldsMixin:
+    """
+    Viewset mixin passing ?fields= and ?expand= to the serializer.
+
+    Only read actions are affected, so writes always validate every field.
+    """
+    sparse_actions = ('list', 'retrieve')
+
+    def _split_param(self, name):
+        """Return a comma separated query parameter as a list, or None."""
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+        return [item.strip() for item in value.split(',') if item.strip()]
+
+    def get_sparse_fields(self):
+        """Return the (fields, expand) lists requested, None if absent."""
+        if self.action not in self.sparse_actions:
+            return None, None
+        return self._split_param('fields'), self._split_param('expand')
+
+    def get_serializer(self, *args, **kwargs):
+        """Return a serializer limited to the requested fields."""
+        fields, expand = self.get_sparse_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        if expand is not None:
+            kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
 
 
 @extend_schema_view(
     list=extend_schema(
-        parameters=[
+        parameters=RECIPE_FILTER_PARAMETERS + SPARSE_FIELDS_PARAMETERS + RECIPE_EXPAND_PARAMETERS + [
             OpenApiParameter(
-                'tags',
+                'ordering',
                 OpenApiTypes.STR,
-                description='Comma separated list of tag IDs to filter',
+                enum=list(RECIPE_ORDERINGS),
+                description='Sort order (default: -id, or relevance when searching)',
             ),
             OpenApiParameter(
-                'ingredients',
+                'page_size',
+                OpenApiTypes.INT,
+                description='Paginate the results with pages of this size',
+            ),
+            OpenApiParameter(
+                'cursor',
                 OpenApiTypes.STR,
-                description='Comma separated list of ingredient IDs to filter',
+                description='Cursor of the page to return, from a previous "next" link',
             ),
         ]
-    )
+    ),
+    create=extend_schema(parameters=[IDEMPOTENCY_KEY_PARAMETER]),
+    stats=extend_schema(
+        parameters=RECIPE_FILTER_PARAMETERS,
+        responses=serializers.RecipeStatsSerializer,
+    ),
+    facets=extend_schema(
+        parameters=RECIPE_FILTER_PARAMETERS,
+        responses=serializers.RecipeFacetsSerializer,
+    ),
+    cookable=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'ingredients',
+                OpenApiTypes.STR,
+                description='Comma separated list of ingredient IDs on hand',
+            ),
+            OpenApiParameter(
+                'names',
+                OpenApiTypes.STR,
+                description='Comma separated list of ingredient names on hand',
+            ),
+            OpenApiParameter(
+                'max_missing',
+                OpenApiTypes.INT,
+                description='Only include recipes missing at most this many ingredients',
+            ),
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description=f'Maximum number of recipes (at most {COOKABLE_MAX_LIMIT})',
+            ),
+        ],
+        responses=serializers.CookableRecipeSerializer(many=True),
+    ),
+    retrieve=extend_schema(
+        parameters=SPARSE_FIELDS_PARAMETERS + RECIPE_EXPAND_PARAMETERS,
+    ),
+    bulk_retrieve=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'ids',
+                OpenApiTypes.STR,
+                required=True,
+                description=f'Comma separated list of up to {BULK_RETRIEVE_MAX_IDS} recipe IDs',
+            ),
+        ],
+        responses=serializers.RecipeBulkSerializer,
+    ),
+    similar=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description=f'Maximum number of recipes (at most {SIMILAR_MAX_LIMIT})',
+            ),
+        ],
+        responses=serializers.SimilarRecipeSerializer(many=True),
+    ),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(IdempotentCreateMixin,
+                    StatementTimeoutMixin,
+                    FastReadMixin,
+                    SparseFieldsMixin,
+                    viewsets.ModelViewSet):
     """View for manage recipe APIs."""
     serializer_class = serializers.RecipeDetailSerializer
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.defer('search_vector')
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+    # Statement timeouts in milliseconds, see core.timeouts.
+    statement_timeouts = {
+        'retrieve': 1000,
+        'bulk_retrieve': 2000,
+        'stats': 10000,
+    }
 
-    def _params_to_ints(self, qs):
-        """Convert a list of strings to integers."""
-        return [int(str_id) for str_id in qs.split(',')]
+    def _params_to_ints(self, qs, name):
+        """Convert a comma separated list of IDs in parameter name to integers."""
+        try:
+            ids = list(dict.fromkeys(int(str_id) for str_id in qs.split(',')))
+        except ValueError:
+            raise ValidationError({name: _('A comma separated list of integers is required.')})
+        if len(ids) > FILTER_MAX_IDS:
+            raise ValidationError({
+                name: _('At most %(count)d IDs are allowed.') % {'count': FILTER_MAX_IDS},
+            })
+        return ids
+
+    def _param_to_decimal(self, name):
+        """Return a query parameter as a Decimal, or None if not given."""
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+        try:
+            number = Decimal(value)
+        except InvalidOperation:
+            number = None
+        if number is None or not number.is_finite():
+            raise ValidationError({name: _('A valid number is required.')})
+        return number
+
+    def _param_to_int(self, name):
+        """
+        Return a query parameter as an integer, or None if not given.
+
+        Values out of the range of integer columns are rejected, as the
+        database cannot compare them.
+        """
+        return _int_param(self.request, name, bounds=INTEGER_RANGE)
+
+    def _get_ordering(self):
+        """Return the order_by() arguments for the requested ordering."""
+        ordering = self.request.query_params.get('ordering')
+        if ordering is None:
+            return None
+        if ordering not in RECIPE_ORDERINGS:
+            raise ValidationError({'ordering': _('Invalid ordering.')})
+        return RECIPE_ORDERINGS[ordering]
 
     def get_queryset(self):
         """
         Retrieve recipes for the authenticated user, with optional filtering
-        by tags and ingredients.
+        by tags, ingredients, price, time and search text.
         """
 
-        # Retrieve query parameters for 'tags' and 'ingredients' from the request
+        # Retrieve query parameters for 'tags', 'ingredients' and 'search'
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
+        search = self.request.query_params.get('search', '').strip()
+        price_min = self._param_to_decimal('price_min')
+        price_max = self._param_to_decimal('price_max')
+        time_max = self._param_to_int('time_max')
 
         # Start with the default queryset (all recipes)
         queryset = self.queryset
 
-        # If 'tags' parameter is provided, filter the queryset by those tags
+        # If 'tags' parameter is provided, filter the queryset by those tags.
+        # A subquery on the through table avoids a join, so no DISTINCT is
+        # needed and ordered index scans stay possible.
         if tags:
-            tag_ids = self._params_to_ints(tags)  # Convert 'tags' to a list of integers
-            queryset = queryset.filter(tags__id__in=tag_ids)  # Filter by tag IDs
+            tag_ids = self._params_to_ints(tags, 'tags')  # Convert 'tags' to a list of integers
+            queryset = queryset.filter(id__in=Recipe.tags.through.objects.filter(
+                tag_id__in=tag_ids,
+            ).values('recipe_id'))  # Filter by tag IDs
 
         # If 'ingredients' parameter is provided, do the same for ingredients
         if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)  # Convert 'ingredients' to a list of integers
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)  # Filter by ingredient IDs
+            ingredient_ids = self._params_to_ints(ingredients, 'ingredients')
+            queryset = queryset.filter(id__in=Recipe.ingredients.through.objects.filter(
+                ingredient_id__in=ingredient_ids,
+            ).values('recipe_id'))  # Filter by ingredient IDs
+
+        # Range filters, served by the (user_id, column, id) indexes
+        if price_min is not None:
+            queryset = queryset.filter(price__gte=price_min)
+        if price_max is not None:
+            queryset = queryset.filter(price__lte=price_max)
+        if time_max is not None:
+            queryset = queryset.filter(time_minutes__lte=time_max)
+
+        # Search results are ordered by relevance unless an explicit
+        # ordering is requested, newest first among equals
+        ordering = self._get_ordering()
+        if search:
+            queryset = search_recipes(queryset, search)
+            ordering = ordering or ('-rank', '-id')
 
         # Finally, filter the queryset to only include recipes of the authenticated user
-        # Order by descending ID and remove duplicates
-        return queryset.filter(user=self.request.user).order_by('-id').distinct()
+        queryset = queryset.filter(user=self.request.user).order_by(*(ordering or ('-id',)))
+        return self._select_related_data(queryset)
+
+    def _select_related_data(self, queryset):
+        """
+        Load only the columns and relations the response will render.
+
+        Tags and ingredients are prefetched when included, as bare IDs when
+        they are not expanded, and skipped entirely when not requested.
+        """
+        if self.action not in self.sparse_actions:
+            return queryset
+        fields, expand = self.get_sparse_fields()
+        wanted = [
+            name for name in self.get_serializer_class().Meta.fields
+            if fields is None or name in fields or name in (expand or ())
+        ]
+        relations = {'tags': Tag, 'ingredients': Ingredient}
+
+        if fields is not None:
+            ordering = [
+                name.lstrip('-') for name in queryset.query.order_by
+                if name.lstrip('-') != 'rank'
+            ]
+            columns = [name for name in wanted if name not in relations]
+            queryset = queryset.only('id', *columns, *ordering)
+
+        for name, model in relations.items():
+            if name not in wanted:
+                continue
+            # Ordered by ID to match the fast serialization path
+            related = model.objects.order_by('id')
+            if expand is not None and name not in expand:
+                related = related.only('id')
+            queryset = queryset.prefetch_related(Prefetch(name, queryset=related))
+        return queryset
 
     def get_serializer_class(self):
         """Return the serializer class for request."""
         if self.action == 'list':
             return serializers.RecipeSerializer
+        if self.action == 'stats':
+            return serializers.RecipeStatsSerializer
+        if self.action == 'facets':
+            return serializers.RecipeFacetsSerializer
+        if self.action == 'cookable':
+            return serializers.CookableRecipeSerializer
+        if self.action == 'similar':
+            return serializers.SimilarRecipeSerializer
+        if self.action == 'bulk_retrieve':
+            return serializers.RecipeBulkSerializer
         return self.serializer_class
 
     def perform_create(self, serializer):
         """Create a new recipe."""
-        serializer.save(user=self.request.user)
+        recipe = serializer.save(user=self.request.user)
+        version = bump_data_version(self.request.user.id)
+        pantry.recipe_saved(recipe, version)
+        events.publish(self.request.user.id, 'recipe', events.CREATED, recipe.id)
+
+    def perform_update(self, serializer):
+        """Update a recipe."""
+        recipe = serializer.save()
+        version = bump_data_version(self.request.user.id)
+        pantry.recipe_saved(recipe, version)
+        events.publish(self.request.user.id, 'recipe', events.UPDATED, recipe.id)
+
+    def perform_destroy(self, instance):
+        """Delete a recipe."""
+        recipe_id = instance.id
+        instance.delete()
+        version = bump_data_version(self.request.user.id)
+        pantry.recipe_deleted(self.request.user.id, recipe_id, version)
+        events.publish(self.request.user.id, 'recipe', events.DELETED, recipe_id)
+
+    def _filter_cache_key(self, prefix):
+        """
+        Return a cache key for the filtered recipes of the current user.
+
+        The key includes the user's data version, the normalised filter
+        values and a digest of the search text, so equivalent requests share
+        an entry.
+        """
+        user_id = self.request.user.id
+        parts = [prefix, str(user_id), str(get_data_version(user_id))]
+        for param in ('tags', 'ingredients'):
+            value = self.request.query_params.get(param)
+            ids = sorted(set(self._params_to_ints(value, param))) if value else []
+            parts.append(','.join(str(i) for i in ids))
+        for value in (
+            self._param_to_decimal('price_min'),
+            self._param_to_decimal('price_max'),
+            self._param_to_int('time_max'),
+        ):
+            parts.append('' if value is None else str(value))
+        search = self.request.query_params.get('search', '').strip()
+        parts.append(hashlib.md5(search.encode()).hexdigest() if search else '')
+        return ':'.join(parts)
+
+    @action(detail=False, methods=['GET'])
+    def stats(self, request):
+        """Return aggregate statistics for the filtered recipes."""
+        key = self._filter_cache_key('recipe:stats')
+        data = cache.get(key)
+        if data is None:
+            recipes = self.get_queryset()
+            data = stats.recipe_totals(recipes)
+            data.update(stats.attr_counts(recipes))
+            cache.set(key, data, STATS_CACHE_TIMEOUT)
+
+        return Response(data)
+
+    def _on_hand_ingredient_ids(self):
+        """Return the IDs of the ingredients given as on hand."""
+        ids = set()
+        ingredients = self.request.query_params.get('ingredients')
+        if ingredients:
+            ids.update(self._params_to_ints(ingredients, 'ingredients'))
+        names = self.request.query_params.get('names')
+        if names:
+            lowered = [name.strip().lower() for name in names.split(',')]
+            ids.update(
+                Ingredient.objects.filter(
+                    user=self.request.user,
+                ).annotate(
+                    name_lower=Lower('name'),
+                ).filter(
+                    name_lower__in=lowered,
+                ).values_list('id', flat=True)
+            )
+        return ids
+
+    @action(detail=False, methods=['GET'])
+    def cookable(self, request):
+        """
+        Rank recipes by how many of their ingredients are on hand.
+
+        Recipes with all ingredients on hand come first, then those missing
+        one ingredient, two ingredients and so on.
+        """
+        max_missing = _int_param(request, 'max_missing')
+        limit = _int_param(request, 'limit', COOKABLE_DEFAULT_LIMIT)
+        limit = max(1, min(limit, COOKABLE_MAX_LIMIT))
+
+        index = pantry.get_index(request.user)
+        ranked = index.rank(self._on_hand_ingredient_ids(), max_missing)[:limit]
+
+        recipes = Recipe.objects.filter(
+            user=request.user,
+            id__in=[recipe_id for recipe_id, _ in ranked],
+        ).defer('search_vector').prefetch_related('tags', 'ingredients').in_bulk()
+        results = [
+            {'recipe': recipes[recipe_id], 'missing_ingredients': missing}
+            for recipe_id, missing in ranked
+            if recipe_id in recipes
+        ]
+        serializer = self.get_serializer(results, many=True)
+
+        return Response(serializer.data)
+
+    def _bulk_ids(self):
+        """Return the distinct recipe IDs requested with 'ids', in order."""
+        value = self.request.query_params.get('ids', '')
+        try:
+            ids = list(dict.fromkeys(int(str_id) for str_id in value.split(',') if str_id))
+        except ValueError:
+            raise ValidationError({'ids': _('A comma separated list of integers is required.')})
+        if not ids:
+            raise ValidationError({'ids': _('This parameter is required.')})
+        if len(ids) > BULK_RETRIEVE_MAX_IDS:
+            raise ValidationError({
+                'ids': _('At most %(count)d IDs are allowed.') % {'count': BULK_RETRIEVE_MAX_IDS},
+            })
+        return ids
+
+    @action(detail=False, methods=['GET'], url_path='bulk')
+    def bulk_retrieve(self, request):
+        """
+        Return the details of several recipes by ID.
+
+        Results follow the order of the requested IDs. IDs which do not
+        exist or belong to another user are listed as missing, the same way
+        the detail endpoint answers 404 for both.
+        """
+        ids = self._bulk_ids()
+        recipes = Recipe.objects.filter(
+            user=request.user,
+            id__in=ids,
+        ).defer('search_vector').order_by('id')
+        serializer = serializers.RecipeDetailSerializer(
+            context=self.get_serializer_context(),
+        )
+
+        if fast.enabled():
+            builder = fast.FastSerializer(serializer)
+            data = builder.render(builder.rows(recipes))
+        else:
+            recipes = recipes.prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.order_by('id')),
+                Prefetch('ingredients', queryset=Ingredient.objects.order_by('id')),
+            )
+            data = serializers.RecipeDetailSerializer(
+                recipes,
+                many=True,
+                context=self.get_serializer_context(),
+            ).data
+        found = {item['id']: item for item in data}
+
+        return Response({
+            'results': [found[recipe_id] for recipe_id in ids if recipe_id in found],
+            'missing': [recipe_id for recipe_id in ids if recipe_id not in found],
+        })
+
+    @action(detail=True, methods=['GET'])
+    def similar(self, request, pk=None):
+        """Return the recipes sharing the most tags and ingredients."""
+        limit = _int_param(request, 'limit', SIMILAR_DEFAULT_LIMIT)
+        limit = max(1, min(limit, SIMILAR_MAX_LIMIT))
+
+        ranked = similarity.similar_recipes(self.get_object(), limit)
+
+        recipes = Recipe.objects.filter(
+            id__in=[recipe_id for recipe_id, _ in ranked],
+        ).defer('search_vector').prefetch_related('tags', 'ingredients').in_bulk()
+        results = [
+            {'recipe': recipes[recipe_id], 'similarity': score}
+            for recipe_id, score in ranked
+            if recipe_id in recipes
+        ]
+        serializer = self.get_serializer(results, many=True)
+
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['GET'])
+    def facets(self, request):
+        """Return tags and ingredients with counts of the filtered recipes."""
+        key = self._filter_cache_key('recipe:facets')
+        data = cache.get(key)
+        if data is None:
+            recipes = self.get_queryset()
+            data = {
+                'tags': stats.facet_counts(Tag, request.user, recipes),
+                'ingredients': stats.facet_counts(
+                    Ingredient,
+                    request.user,
+                    recipes,
+                ),
+            }
+            cache.set(key, data, STATS_CACHE_TIMEOUT)
+
+        return Response(data)
 
 
 @extend_schema_view(
     list=extend_schema(
-        parameters=[
+        parameters=SPARSE_FIELDS_PARAMETERS + [
             OpenApiParameter(
                 'assigned_only',
                 OpenApiTypes.INT, enum=[0, 1],
                 description='Filter by items assigned to recipes.',
             ),
+            OpenApiParameter(
+                'ordering',
+                OpenApiTypes.STR,
+                enum=list(RECIPE_ATTR_ORDERINGS),
+                description='Sort by name or by number of recipes (popularity).',
+            ),
+        ]
+    ),
+    autocomplete=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'q',
+                OpenApiTypes.STR,
+                description='Case-insensitive name prefix to match.',
+            ),
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description=f'Maximum number of matches (at most {autocomplete.MAX_LIMIT}).',
+            ),
         ]
-    )
+    ),
 )
-class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
+class BaseRecipeAttrViewSet(StatementTimeoutMixin,
+                            FastReadMixin,
+                            SparseFieldsMixin,
+                            mixins.DestroyModelMixin,
                             mixins.UpdateModelMixin,
                             mixins.ListModelMixin,
                             viewsets.GenericViewSet):
@@ -108,6 +735,11 @@ class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
     # IsAuthenticated: Ensures only authenticated users access the API
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
+    # Statement timeouts in milliseconds, see core.timeouts.
+    statement_timeouts = {
+        'list': 2000,
+        'autocomplete': 500,
+    }
 
     def get_queryset(self):
         """
@@ -122,21 +754,60 @@ class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
         assigned_only = bool(
             int(self.request.query_params.get('assigned_only', 0))
         )
+        ordering = self.request.query_params.get('ordering', '-name')
+        if ordering not in RECIPE_ATTR_ORDERINGS:
+            raise ValidationError({'ordering': _('Invalid ordering.')})
 
         # Start with the default queryset as defined in the viewset.
         queryset = self.queryset
 
         # If 'assigned_only' is True, modify the queryset to include only those
-        # tags that are assigned to a recipe (i.e., filter out tags not assigned to any recipe).
+        # tags that are assigned to a recipe. The maintained recipe_count
+        # avoids joining the recipe through table.
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            queryset = queryset.filter(recipe_count__gt=0)
 
         # Further filter the queryset to include only tags that belong to the
-        # currently authenticated user. Then order the results by the tag name
-        # in descending order and remove any duplicates.
+        # currently authenticated user, then apply the requested ordering.
         return queryset.filter(
             user=self.request.user
-        ).order_by('-name').distinct()
+        ).order_by(*RECIPE_ATTR_ORDERINGS[ordering])
+
+    @action(detail=False, methods=['GET'])
+    def autocomplete(self, request):
+        """Return the most used names starting with the given prefix."""
+        prefix = request.query_params.get('q', '')
+        limit = _int_param(request, 'limit', autocomplete.DEFAULT_LIMIT)
+        limit = max(1, min(limit, autocomplete.MAX_LIMIT))
+
+        matches = autocomplete.search(self.queryset, request.user, prefix, limit)
+
+        return Response([{'id': pk, 'name': name} for pk, name in matches])
+
+    def perform_update(self, serializer):
+        """Update a tag or ingredient."""
+        # Atomic so the change sequence is committed with the row
+        with transaction.atomic():
+            instance = serializer.save()
+        bump_data_version(self.request.user.id)
+        events.publish(
+            self.request.user.id,
+            instance._meta.model_name,
+            events.UPDATED,
+            instance.id,
+        )
+
+    def perform_destroy(self, instance):
+        """Delete a tag or ingredient."""
+        instance_id = instance.id
+        instance.delete()
+        bump_data_version(self.request.user.id)
+        events.publish(
+            self.request.user.id,
+            instance._meta.model_name,
+            events.DELETED,
+            instance_id,
+        )
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
@@ -155,3 +826,68 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
     """Manage ingredients in the database."""
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            'since',
+            OpenApiTypes.STR,
+            description='Token of the last sync; omit for a full sync',
+        ),
+    ],
+    responses=serializers.ChangesSerializer,
+)
+class ChangesView(StatementTimeoutMixin, views.APIView):
+    """
+    Return the recipes, tags and ingredients changed since a sync token.
+
+    The response holds the changed objects, the IDs of deleted ones and the
+    token to pass as `since` next time. Without `since` every object is
+    returned.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_classes = {
+        'recipes': serializers.RecipeDetailSerializer,
+        'tags': serializers.TagSerializer,
+        'ingredients': serializers.IngredientSerializer,
+    }
+
+    def get(self, request):
+        # Read first: every change up to this value is committed
+        until = sync.current_value(request.user)
+        since = self._get_since(until)
+
+        data = {'token': sync.encode_token(until)}
+        for name, (model, _kind) in sync.SYNCED.items():
+            queryset = sync.changed(model, request.user, since, until)
+            data[name] = self._serialize(self.serializer_classes[name], queryset)
+        data['deleted'] = sync.deleted(request.user, since, until)
+        return Response(data)
+
+    def _get_since(self, until):
+        """Return the counter value of the 'since' token, or None if not given."""
+        token = self.request.query_params.get('since')
+        if token is None:
+            return None
+        try:
+            since = sync.decode_token(token)
+        except ValueError:
+            since = None
+        if since is None or since > until:
+            raise ValidationError({'since': _('Invalid sync token.')})
+        return since
+
+    def _serialize(self, serializer_class, queryset):
+        """Return the representation of the objects in queryset."""
+        context = {'request': self.request, 'view': self}
+        if fast.enabled():
+            builder = fast.FastSerializer(serializer_class(context=context))
+            return builder.render(builder.rows(queryset))
+        if queryset.model is Recipe:
+            queryset = queryset.defer('search_vector').prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.order_by('id')),
+                Prefetch('ingredients', queryset=Ingredient.objects.order_by('id')),
+            )
+        return serializer_class(queryset, many=True, context=context).data
@@ -1,6 +1,7 @@
 """
 Tests for the user API.
 """
+from django.core.cache import cache
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
@@ -8,6 +9,8 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core import msgpack
+
 # Not used for now
 # import logging
 
@@ -62,6 +65,36 @@ class PublicUserApiTests(TestCase):
         # Assert that the response data does not contain the password's value
         self.assertNotIn('testpass123', res.data)
 
+    def test_create_user_idempotent(self):
+        """Test a retried signup with an Idempotency-Key is replayed."""
+        cache.clear()
+        payload = {
+            'email': 'test@example.com',
+            'password': 'testpass123',
+            'name': 'Test Name',
+        }
+        first = self.client.post(CREATE_USER_URL, payload, HTTP_IDEMPOTENCY_KEY='signup-1')
+        second = self.client.post(CREATE_USER_URL, payload, HTTP_IDEMPOTENCY_KEY='signup-1')
+
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(get_user_model().objects.count(), 1)
+
+    def test_create_user_idempotency_key_per_client(self):
+        """Test anonymous clients at other addresses do not share keys."""
+        cache.clear()
+        payload = {'email': 'test@example.com', 'password': 'testpass123', 'name': 'Test Name'}
+        other = {'email': 'other@example.com', 'password': 'testpass123', 'name': 'Other'}
+        self.client.post(CREATE_USER_URL, payload, HTTP_IDEMPOTENCY_KEY='signup-1')
+        res = self.client.post(
+            CREATE_USER_URL, other, HTTP_IDEMPOTENCY_KEY='signup-1', REMOTE_ADDR='192.0.2.1',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', res)
+        self.assertEqual(get_user_model().objects.count(), 2)
+
     def test_user_with_email_exists_error(self):
         """Test error returned if user with email exists."""
         # Create a user with the specified email
@@ -185,6 +218,16 @@ class PrivateUserApiTests(TestCase):
             'email': self.user.email,
         })
 
+    def test_retrieve_profile_msgpack(self):
+        """Test retrieving profile negotiated as MessagePack."""
+        res = self.client.get(ME_URL, HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(msgpack.unpackb(res.content), {
+            'name': self.user.name,
+            'email': self.user.email,
+        })
+
     def test_post_me_not_allowed(self):
         """Test POST is not allowed for the me endpoint."""
         res = self.client.post(ME_URL, {})
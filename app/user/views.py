@@ -1,18 +1,30 @@
 """
 Views for the user API.
 """
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
+from rest_framework.authentication import TokenAuthentication
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 
 # Create your views here.
+from core.idempotency import (
+    HEADER_PARAMETER as IDEMPOTENCY_KEY_PARAMETER,
+    IdempotentCreateMixin,
+)
+from core.schema import (
+    extend_schema,
+    extend_schema_view,
+)
 from user.serializers import (
     UserSerializer,
     AuthTokenSerializer,
 )
 
 
-class CreateUserView(generics.CreateAPIView):
+@extend_schema_view(
+    post=extend_schema(parameters=[IDEMPOTENCY_KEY_PARAMETER]),
+)
+class CreateUserView(IdempotentCreateMixin, generics.CreateAPIView):
     """Create a new user in the system."""
     serializer_class = UserSerializer
 
@@ -20,6 +32,8 @@ class CreateUserView(generics.CreateAPIView):
 class CreateTokenView(ObtainAuthToken):
     """Create a new auth token for user."""
     serializer_class = AuthTokenSerializer
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    throttle_scope = 'login'
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
 
@@ -30,7 +44,7 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
     It requires TokenAuthentication for authentication and IsAuthenticated for permission.
     """
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [TokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):